@@ -14,5 +14,13 @@ __all__ = [
     "metadata",
     "protocols",
     "utils",
-    "storage"
+    "storage",
+    "workers",
+    "hashing",
+    "cache",
+    "archive",
+    "locking",
+    "journal",
+    "planning","budget","executors","localdrmaa","logs",
+    "tracing","watch","invalidation","linkstore","linkgraph"
 ]
@@ -0,0 +1,317 @@
+'''
+Deduplicated archive of superseded versions of created files.
+
+When an operation re-creates a file or directory, the previous version is
+archived here rather than copied wholesale: the contents of its files are kept
+once each in a content-addressed blob store, and the version itself is just an
+entry in the target's version index recording its manifest (see
+starflow.hashing).  Versions that share most of their files -- the usual case
+for large directory outputs -- therefore cost only what changed.
+
+Layout, inside the data environment's archive_dir:
+
+    Blobs/<dd>/<digest>     contents of archived files, by content digest
+    Index/<name>            pickled list of archived versions of the target
+                            whose utils.PathFileName is name, oldest
+                            first, each a dictionary with keys 'Target',
+                            'Time' (mtime of the version),
+                            'Archived', 'Kind' ('Superseded' or 'Garbage'),
+                            'Manifest', 'Modes' (permission bits of each
+                            path in the manifest) and 'Size'
+
+Retention is enforced whenever a version is archived: each target keeps at most
+archive_keep_versions versions (0 keeps them all), and if the blobs referenced
+by all versions exceed archive_max_bytes (0 means no bound) the oldest versions
+across all targets are dropped until they fit.   Blobs no longer referenced by
+any version are then removed.
+
+Any archived version can be rebuilt with Restore (or "starflow restore"), with
+the mtimes and permission bits its files had.   Symbolic links in a version are
+archived, and so restored, as the contents they lead to.
+
+Version indexes are only changed with the archive lock held (see
+starflow.locking), so concurrent update sessions can archive at once.
+'''
+
+import os
+import time
+import errno
+import stat
+import shutil
+import cPickle as pickle
+
+import starflow.de as de
+import starflow.hashing as hashing
+import starflow.locking as locking
+from starflow.utils import PathExists, PathFileName, delete, uniqify, ListUnion
+
+DE_MANAGER = de.DataEnvironmentManager()
+WORKING_DE = DE_MANAGER.working_de
+KEEP_VERSIONS = DE_MANAGER.archive_keep_versions
+MAX_BYTES = DE_MANAGER.archive_max_bytes
+BLOBDIR = 'Blobs'
+INDEXDIR = 'Index'
+ARCHIVELOCK = 'archive'
+BLOB_GRACE = 60*60          # seconds an unreferenced blob is kept, so that a version being archived concurrently isn't robbed
+
+
+def GetBlobPath(Digest):
+    return os.path.join(WORKING_DE.archive_dir,BLOBDIR,Digest[:2],Digest)
+
+
+def GetIndexFile(f):
+    return os.path.join(WORKING_DE.archive_dir,INDEXDIR,PathFileName(f))
+
+
+def GetLegacyIndexFile(f):
+    '''
+    Where the version index of f was kept before index names were made 
+    distinct for distinct targets (see utils.PathFileName).   Such an index 
+    may hold the versions of several targets.
+    '''
+    return os.path.join(WORKING_DE.archive_dir,INDEXDIR,f[3:].strip('/').replace('/','__'))
+
+
+def LoadIndex(IndexFile):
+    if PathExists(IndexFile):
+        return pickle.load(open(IndexFile,'rb'))
+    else:
+        return []
+
+
+def WriteIndex(IndexFile,Versions):
+    if not Versions:
+        if PathExists(IndexFile):
+            os.remove(IndexFile)
+        return
+    if not PathExists(os.path.dirname(IndexFile)):
+        os.makedirs(os.path.dirname(IndexFile))
+    TempFile = IndexFile + '.tmp.' + str(os.getpid())
+    F = open(TempFile,'wb')
+    pickle.dump(Versions,F,pickle.HIGHEST_PROTOCOL)
+    F.close()
+    os.rename(TempFile,IndexFile)
+
+
+def IsVersionOf(v,f):
+    return os.path.normpath(v['Target']) == os.path.normpath(f)
+
+
+def GetVersions(f):
+    '''
+    Archived versions of the target f, oldest first.
+    '''
+    IndexFile = GetIndexFile(f)
+    if PathExists(IndexFile):
+        return LoadIndex(IndexFile)
+    else:
+        return [v for v in LoadIndex(GetLegacyIndexFile(f)) if IsVersionOf(v,f)]
+
+
+def SaveVersions(f,Versions):
+    '''
+    Makes Versions the archived versions of the target f, moving them out of 
+    its legacy index (see GetLegacyIndexFile) if they were there.
+    '''
+    WriteIndex(GetIndexFile(f),Versions)
+    LegacyFile = GetLegacyIndexFile(f)
+    if PathExists(LegacyFile):
+        WriteIndex(LegacyFile,[v for v in LoadIndex(LegacyFile) if not IsVersionOf(v,f)])
+
+
+def ArchiveVersion(f,path,Manifest = None,Kind = 'Superseded',creates = WORKING_DE.relative_root_dir):
+    '''
+    Archives the version of target f that is at path, consuming path.
+
+    ARGUMENTS:
+    --f = the target (as a path relative to Temp, e.g. '../Data/x.txt')
+    --path = where the version to archive is now (f itself, or e.g. its place
+        in an update session's runtime storage)
+    --Manifest = manifest of the version, if known; if not, the stored manifest
+        of f is used when it still describes path, and otherwise path is hashed.
+    --Kind = 'Superseded' for previous versions, 'Garbage' for partial outputs
+        of failed operations.
+    '''
+    if Manifest is None:
+        Manifest = hashing.LoadManifest(hashing.GetManifestFile(f))
+        if not hashing.ManifestIsCurrent(Manifest,path):
+            Manifest = hashing.MakeManifest(path)
+    Time = os.path.getmtime(path)
+
+    #symbolic links are archived as the contents they lead to
+    Root = os.path.realpath(path)
+    Linked = os.path.islink(path)
+    Modes = {}
+    for r in Manifest.keys():
+        p = os.path.join(path,r) if r else path
+        Modes[r] = stat.S_IMODE(os.stat(p).st_mode)
+        if Manifest[r] is not None:
+            StoreBlob(p,Manifest[r][2],Copy = Linked or os.path.realpath(p) != os.path.join(Root,r))
+    if Linked:
+        os.remove(path)
+    else:
+        delete(path)
+
+    Lock = locking.LockSet(Exclusive = [ARCHIVELOCK])
+    Lock.Acquire()
+    try:
+        Versions = GetVersions(f)
+        if Versions and Versions[-1]['Kind'] == Kind and hashing.SameContents(Versions[-1]['Manifest'],Manifest):
+            return
+        Size = sum([v[0] for v in Manifest.values() if v is not None])
+        Versions.append({'Target':f,'Time':Time,'Archived':time.time(),'Kind':Kind,'Manifest':Manifest,'Modes':Modes,'Size':Size})
+        SaveVersions(f,Versions)
+        EnforceRetention(f)
+    finally:
+        Lock.Release()
+
+
+def StoreBlob(FilePath,Digest,Copy = False):
+    '''
+    Moves the file at FilePath into the blob store, unless its contents are
+    already there -- or, if Copy, copies its contents there, leaving it be 
+    (for files reached through a symbolic link, which live outside the 
+    version being archived).
+    '''
+    BlobPath = GetBlobPath(Digest)
+    if PathExists(BlobPath):
+        os.utime(BlobPath,None)
+        if not Copy:
+            os.remove(FilePath)
+        return
+    if not PathExists(os.path.dirname(BlobPath)):
+        try:
+            os.makedirs(os.path.dirname(BlobPath))
+        except OSError:
+            pass
+    if Copy:
+        shutil.copyfile(FilePath,BlobPath + '.' + str(os.getpid()))
+        os.rename(BlobPath + '.' + str(os.getpid()),BlobPath)
+        return
+    try:
+        os.rename(FilePath,BlobPath)
+    except OSError, e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.copy2(FilePath,BlobPath + '.' + str(os.getpid()))
+        os.rename(BlobPath + '.' + str(os.getpid()),BlobPath)
+        os.remove(FilePath)
+    os.utime(BlobPath,None)
+
+
+def EnforceRetention(f = None):
+    '''
+    Drops versions beyond archive_keep_versions (for target f, or all targets
+    if f is None) and then the oldest versions overall while the archive holds
+    more than archive_max_bytes; then removes unreferenced blobs.   Must be
+    called with the archive lock held.
+    '''
+    Dropped = False
+    if KEEP_VERSIONS > 0:
+        for g in ([f] if f is not None else ListTargets()):
+            Versions = GetVersions(g)
+            if len(Versions) > KEEP_VERSIONS:
+                SaveVersions(g,Versions[-KEEP_VERSIONS:])
+                Dropped = True
+    if MAX_BYTES > 0:
+        AllVersions = dict([(g,GetVersions(g)) for g in ListTargets()])
+        Blobs = GetReferencedBlobs(AllVersions)
+        Total = sum(Blobs.values())
+        Oldest = sorted([(v['Archived'],g) for g in AllVersions.keys() for v in AllVersions[g]])
+        while Total > MAX_BYTES and Oldest:
+            (t,g) = Oldest.pop(0)
+            AllVersions[g] = AllVersions[g][1:]
+            NewBlobs = GetReferencedBlobs(AllVersions)
+            Total = sum(NewBlobs.values())
+            SaveVersions(g,AllVersions[g])
+            Dropped = True
+    if Dropped:
+        CollectGarbage()
+
+
+def ListTargets():
+    IndexDir = os.path.join(WORKING_DE.archive_dir,INDEXDIR)
+    if not PathExists(IndexDir):
+        return []
+    return uniqify(ListUnion([[v['Target'] for v in LoadIndex(os.path.join(IndexDir,l))] for l in os.listdir(IndexDir) if '.tmp.' not in l]))
+
+
+def GetReferencedBlobs(AllVersions):
+    '''
+    Dictionary of digest -> size of the blobs referenced by the given versions.
+    '''
+    Blobs = {}
+    for Versions in AllVersions.values():
+        for v in Versions:
+            for e in v['Manifest'].values():
+                if e is not None:
+                    Blobs[e[2]] = e[0]
+    return Blobs
+
+
+def CollectGarbage():
+    '''
+    Removes blobs that no archived version references (other than ones touched
+    within the last BLOB_GRACE seconds).
+    '''
+    Referenced = GetReferencedBlobs(dict([(g,GetVersions(g)) for g in ListTargets()]))
+    BlobDir = os.path.join(WORKING_DE.archive_dir,BLOBDIR)
+    Now = time.time()
+    for (root,dirs,files) in os.walk(BlobDir):
+        for b in files:
+            p = os.path.join(root,b)
+            if b not in Referenced and Now - os.path.getmtime(p) > BLOB_GRACE:
+                try:
+                    os.remove(p)
+                except OSError:
+                    pass
+
+
+def Restore(f,Version = -1,To = None,creates = WORKING_DE.relative_root_dir):
+    '''
+    Rebuilds an archived version of target f.
+
+    ARGUMENTS:
+    --f = the target
+    --Version = index of the version in GetVersions(f) (default: the most recent)
+    --To = where to rebuild it (default: f itself, in which case the current
+        version of f, if any, is archived first so nothing is lost)
+
+    Returns the path rebuilt to.
+    '''
+    Versions = GetVersions(f)
+    if not Versions:
+        raise ValueError('No archived versions of ' + f)
+    V = Versions[Version]
+    if To is None:
+        To = f
+    #an in-place restore waits for any update session making f 
+    Locks = locking.TargetLocks([f] if To == f else [])
+    Locks.Acquire()
+    try:
+        if PathExists(To):
+            if To == f:
+                ArchiveVersion(f,f)
+            else:
+                delete(To)
+        Manifest = V['Manifest']
+        Modes = V.get('Modes',{})
+        for r in sorted(Manifest.keys()):
+            p = os.path.join(To,r) if r else To
+            if Manifest[r] is None:
+                if not PathExists(p):
+                    os.makedirs(p)
+            else:
+                if not PathExists(os.path.dirname(p)):
+                    os.makedirs(os.path.dirname(p))
+                shutil.copy2(GetBlobPath(Manifest[r][2]),p)
+                os.utime(p,(Manifest[r][1],Manifest[r][1]))
+                if r in Modes:
+                    os.chmod(p,Modes[r])
+        #directories last (deepest first), so that their modes don't keep their contents from being written
+        for r in sorted([r for r in Manifest.keys() if Manifest[r] is None and r in Modes],reverse = True):
+            os.chmod(os.path.join(To,r) if r else To,Modes[r])
+        os.utime(To,(V['Time'],V['Time']))
+    finally:
+        Locks.Release()
+    return To
@@ -0,0 +1,270 @@
+'''
+Resource requests of operations, and the budget they're scheduled within.
+
+An operation can declare what it needs while it runs, next to what it depends
+on and creates -- either as a default argument:
+
+    def MakeIndex(depends_on = '../Data/raw/',creates = '../Data/index/',
+                  resources = {'threads':4,'memory':'8G','scratch':'20G'}):
+
+or with the decorator of the same name from starflow.utils:
+
+    @resources(threads = 4,memory = '8G',io = True)
+
+The requests understood are
+
+    threads     number of threads the operation computes with (default: none
+                declared, see below)
+    memory      its peak memory, in bytes or as e.g. '512M' or '8G' (default 0)
+    scratch     temporary disk space it needs while it runs (default 0)
+    io          whether it is i/o heavy (default False)
+    timeout     how long it may run before it is stopped and counts as failed,
+                in seconds or as e.g. '90s', '30m' or '2h' (default:  none
+                declared, see planning.GetTimeout)
+
+In 'LOCAL_PARALLEL' mode the updater loads an operation into the pool only if
+the requests of the running operations and its own together fit the budget of
+the machine:  max_threads threads (0: one per cpu), max_memory bytes (empty:
+the machine's physical memory), the free disk space of the data environment,
+and max_io_ops i/o heavy operations at once.   An operation asking for more
+than the whole budget is run when nothing else is running.
+
+Each operation is also told how many threads to use, through the thread count
+variables of the common numerical libraries (THREAD_ENV_VARS):  its declared
+number of threads or, if it declares none, its share of max_threads among the
+workers of the pool ('LOCAL_PARALLEL' mode) or 1 ('DRMAA' mode, which is what
+a grid job gets unless it asks for more).   Operations that declare no threads
+are left alone in 'DIRECT' mode.
+
+In 'DRMAA' mode the requests are passed on to the grid in the native
+specification of the job template (see NativeSpecification).
+'''
+
+import os
+import re
+import sys
+import ctypes
+import multiprocessing
+
+import starflow.de as de
+from starflow.storage import GetStoredModule
+from starflow.linkmanagement import GetStoredDefaultVal, GetStoredAttributes
+from starflow.utils import IsFile
+
+DE_MANAGER = de.DataEnvironmentManager()
+WORKING_DE = DE_MANAGER.working_de
+MAX_THREADS = DE_MANAGER.max_threads
+MAX_MEMORY = DE_MANAGER.max_memory
+MAX_IO_OPS = DE_MANAGER.max_io_ops
+DRMAA_SPECS = [('threads',DE_MANAGER.drmaa_threads_spec),
+               ('memory',DE_MANAGER.drmaa_memory_spec),
+               ('scratch',DE_MANAGER.drmaa_scratch_spec)]
+
+DEFAULT_RESOURCES = {'threads':None,'memory':0,'scratch':0,'io':False,'timeout':None}
+SIZE_UNITS = {'':1,'K':2**10,'M':2**20,'G':2**30,'T':2**40}
+DURATION_UNITS = {'':1,'S':1,'M':60,'H':60*60,'D':60*60*24}
+THREAD_ENV_VARS = ['OMP_NUM_THREADS','MKL_NUM_THREADS','OPENBLAS_NUM_THREADS','VECLIB_MAXIMUM_THREADS','NUMEXPR_NUM_THREADS']
+THREAD_POOL_SETTERS = [('openblas',['openblas_set_num_threads','openblas_set_num_threads64_']),
+                       ('mkl_rt',['MKL_Set_Num_Threads']),
+                       ('gomp',['omp_set_num_threads']),
+                       ('iomp',['omp_set_num_threads'])]   # (library name, thread count setters) for libraries loaded before an op runs
+
+
+def GetResources(j):
+    '''
+    Resource requests declared by operation j (see ParseResources).
+    '''
+    Declared = {}
+    ModPath = '../' + '/'.join(j.split('.')[:-1]) + '.py'
+    if IsFile(ModPath):
+        StoredModule = GetStoredModule(ModPath)
+        if StoredModule and j.split('.')[-1] in StoredModule.keys():
+            Part = StoredModule[j.split('.')[-1]]
+            if Part.descr == 'Internal Function':
+                opn = Part.reconstitute()
+                Declared.update(GetStoredDefaultVal(opn,'resources',NoVal = None) or {})
+                Declared.update(GetStoredAttributes(opn,'__resources__',NoVal = None) or {})
+    return ParseResources(Declared,j)
+
+
+def ParseResources(Declared,j = None):
+    '''
+    Requests in Declared, with defaults for the ones missing, sizes in bytes,
+    the timeout in seconds, and 'threads' and 'timeout' None if they aren't
+    declared.
+    '''
+    for k in Declared.keys():
+        if k not in DEFAULT_RESOURCES:
+            print 'Ignoring unknown resource request', repr(k) + (' of ' + j if j else '')
+    Resources = dict(DEFAULT_RESOURCES)
+    if Declared.get('threads') is not None:
+        Resources['threads'] = max(int(Declared['threads']),1)
+    Resources['memory'] = ParseSize(Declared.get('memory',0))
+    Resources['scratch'] = ParseSize(Declared.get('scratch',0))
+    Resources['io'] = bool(Declared.get('io',False))
+    if Declared.get('timeout') is not None:
+        Resources['timeout'] = ParseDuration(Declared['timeout'])
+    return Resources
+
+
+def ParseSize(s):
+    '''
+    Number of bytes in a size given as a number, or a string like '512M',
+    '8G' or '1.5GB'.
+    '''
+    if isinstance(s,(int,long,float)):
+        return int(s)
+    m = re.match('^([0-9.]+)([KMGT]?)I?B?$',str(s).upper().replace(' ',''))
+    if m is None:
+        raise ValueError('Cannot parse size ' + repr(s))
+    return int(float(m.group(1)) * SIZE_UNITS[m.group(2)])
+
+
+def ParseDuration(s):
+    '''
+    Number of seconds in a duration given as a number, or a string like
+    '90s', '30m', '2h' or '1d'.
+    '''
+    if isinstance(s,(int,long,float)):
+        return float(s)
+    m = re.match('^([0-9.]+)([SMHD]?)$',str(s).upper().replace(' ',''))
+    if m is None:
+        raise ValueError('Cannot parse duration ' + repr(s))
+    return float(m.group(1)) * DURATION_UNITS[m.group(2)]
+
+
+def GetBudget(Workers = 0):
+    '''
+    Resources of the machine the operations of a local update may use at once,
+    with at least one thread for each of the Workers asked for.
+    '''
+    return {'threads':max(MAX_THREADS if MAX_THREADS > 0 else multiprocessing.cpu_count(),Workers),
+            'memory':ParseSize(MAX_MEMORY) if MAX_MEMORY.strip() else GetPhysicalMemory(),
+            'scratch':GetFreeDisk(WORKING_DE.root_dir),
+            'io':MAX_IO_OPS if MAX_IO_OPS > 0 else sys.maxint}
+
+
+def GetPhysicalMemory():
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (ValueError,OSError,AttributeError):
+        return sys.maxint
+
+
+def GetFreeDisk(Path):
+    try:
+        st = os.statvfs(Path)
+    except (OSError,AttributeError):
+        return sys.maxint
+    return st.f_bavail * st.f_frsize
+
+
+def GetDefaultThreads(Budget,Workers):
+    '''
+    Threads given to each operation that declares none when Workers of them
+    share the budget.
+    '''
+    return max(Budget['threads'] / max(Workers,1),1)
+
+
+def GetNeeds(Resources,DefaultThreads):
+    '''
+    What an operation with the given requests takes from the budget while it
+    runs.
+    '''
+    return {'threads':Resources['threads'] or DefaultThreads,
+            'memory':Resources['memory'],
+            'scratch':Resources['scratch'],
+            'io':1 if Resources['io'] else 0}
+
+
+def Fits(Needs,Free):
+    return all([Needs[k] <= Free[k] for k in Needs.keys()])
+
+
+def Take(Free,Needs):
+    for k in Needs.keys():
+        Free[k] -= Needs[k]
+
+
+def Give(Free,Needs):
+    for k in Needs.keys():
+        Free[k] += Needs[k]
+
+
+def GetThreadEnv(Resources,DefaultThreads = None):
+    '''
+    Thread count variables to run an operation with the given requests with:
+    its declared number of threads or DefaultThreads, or none if neither is
+    given.
+    '''
+    Threads = Resources['threads'] or DefaultThreads
+    if Threads is None:
+        return {}
+    return dict([(v,str(Threads)) for v in THREAD_ENV_VARS])
+
+
+def ApplyThreadEnv(Env):
+    '''
+    Puts the thread count variables of Env into effect in this process:  sets
+    them, and since the numerical libraries already loaded (e.g. numpy in a
+    warm worker) read them only when they were loaded, also sets their thread
+    counts directly.   The latter is done for the libraries found in
+    /proc/self/maps, so only on linux.
+    '''
+    os.environ.update(Env)
+    if THREAD_ENV_VARS[0] not in Env:
+        return
+    Threads = int(Env[THREAD_ENV_VARS[0]])
+    try:
+        fd = os.open('/proc/self/maps',os.O_RDONLY)
+    except OSError:
+        return
+    Maps = ''
+    while True:
+        Chunk = os.read(fd,2**16)
+        if not Chunk:
+            break
+        Maps += Chunk
+    os.close(fd)
+    Libraries = set([l.split()[-1] for l in Maps.split('\n') if len(l.split()) >= 6 and '.so' in l.split()[-1]])
+    for Lib in Libraries:
+        for (Name,Setters) in THREAD_POOL_SETTERS:
+            if Name in os.path.basename(Lib):
+                try:
+                    L = ctypes.CDLL(Lib)
+                except OSError:
+                    continue
+                for s in Setters:
+                    if hasattr(L,s):
+                        getattr(L,s)(Threads)
+                        break
+
+
+def NativeSpecification(Resources):
+    '''
+    DRMAA native specification asking the grid for an operation's declared
+    resources.   It is made from the drmaa_threads_spec, drmaa_memory_spec
+    and drmaa_scratch_spec settings, each used only if the operation declares
+    that resource (more than one thread, or a nonzero size), in which
+
+        {threads}               is the number of threads,
+        {memory_mb}             the memory in megabytes,
+        {memory_per_thread_mb}  the same divided among the threads,
+        {scratch_mb}            the scratch disk in megabytes.
+
+    The defaults are for Sun Grid Engine, whose h_vmem is per slot;  scratch
+    disk resources have site-specific names, so no scratch request is made
+    unless drmaa_scratch_spec is set.
+    '''
+    Threads = Resources['threads'] or 1
+    Values = {'threads':Threads,
+              'memory_mb':Megabytes(Resources['memory']),
+              'memory_per_thread_mb':Megabytes((Resources['memory'] + Threads - 1) / Threads),
+              'scratch_mb':Megabytes(Resources['scratch'])}
+    Declared = {'threads':Threads > 1,'memory':Resources['memory'] > 0,'scratch':Resources['scratch'] > 0}
+    return ' '.join([Spec.format(**Values) for (k,Spec) in DRMAA_SPECS if Declared[k] and Spec.strip()])
+
+
+def Megabytes(n):
+    return (n + 2**20 - 1) / 2**20
@@ -0,0 +1,272 @@
+'''
+Content-addressed cache of operation results.
+
+An operation's outputs are determined by its code, the contents of its inputs
+and its declared arguments.  When an operation succeeds, its created files and
+its pickled return value are stored here under a key made from exactly those
+three things:
+
+    -- the code fingerprint of the operation and, transitively, of everything
+    it uses (computed from the stored module parts kept by starflow.storage,
+    and from the same "uses" information the Uses links are made from),
+    -- the content manifests of its depends_on inputs (see starflow.hashing),
+    -- its declared default arguments and attributes (depends_on, creates, ...),
+
+so that if the updater is about to call an operation whose key is already in
+the cache -- e.g. after a checkout round trip or a revert -- the outputs are
+restored from the cache instead of being recomputed.
+
+The cache lives in the data environment's cache_dir, one directory per key:
+
+    <key>/Outputs/<n>               copy of the n-th created file or directory
+    <key>/RuntimeOutput.pickle      pickled return value of the operation
+    <key>/Entry.pickle              operation, creates, manifests and size
+
+and is kept under op_cache_max_bytes by evicting the least recently used
+entries (the mtime of Entry.pickle is the time of last use).
+'''
+
+import os
+import shutil
+import hashlib
+import types
+import cPickle as pickle
+
+import starflow.de as de
+import starflow.hashing as hashing
+import starflow.locking as locking
+from starflow.storage import GetStoredModule, StoredModulePart
+from starflow.linkmanagement import GetStoredDefaultVal, GetStoredAttributes
+from starflow.utils import MakeT, PathExists, IsFile, strongcopy, delete
+
+DE_MANAGER = de.DataEnvironmentManager()
+WORKING_DE = DE_MANAGER.working_de
+CACHE_MAX_BYTES = DE_MANAGER.op_cache_max_bytes
+ENTRYFILE = 'Entry.pickle'
+OUTPUTDIR = 'Outputs'
+RUNTIMEOUTPUTFILE = 'RuntimeOutput.pickle'
+CACHELOCK = 'cache'
+
+
+def CacheEnabled():
+    return CACHE_MAX_BYTES > 0
+
+
+def GetCacheKey(j):
+    '''
+    Cache key of operation j given the current state of its code and inputs,
+    or None if the operation can't be fingerprinted.
+    '''
+    ModPath = '../' + '/'.join(j.split('.')[:-1]) + '.py'
+    if not IsFile(ModPath):
+        return None
+    StoredModule = GetStoredModule(ModPath)
+    if not StoredModule or j.split('.')[-1] not in StoredModule.keys():
+        return None
+    Part = StoredModule[j.split('.')[-1]]
+    if Part.descr != 'Internal Function':
+        return None
+
+    h = hashlib.sha1()
+    h.update(j)
+    h.update(CodeFingerprint(ModPath,j.split('.')[-1]))
+    opn = Part.reconstitute()
+    DependsOn = MakeT(GetStoredDefaultVal(opn,'depends_on',NoVal = ())) + MakeT(GetStoredAttributes(opn,'__depends_on__',NoVal = ()))
+    for d in sorted(set(DependsOn)):
+        if not PathExists(d):
+            return None
+        h.update(repr((d,ManifestDigest(hashing.GetCurrentManifest(d)))))
+    return h.hexdigest()
+
+
+def CodeFingerprint(ModPath,Name,Seen = None):
+    '''
+    Fingerprint of the stored module part Name of the module at ModPath, and of
+    the parts it uses, transitively.
+    '''
+    if Seen is None:
+        Seen = set([])
+    if (ModPath,Name) in Seen:
+        return ''
+    Seen.add((ModPath,Name))
+    StoredModule = GetStoredModule(ModPath) if IsFile(ModPath) else None
+    if not StoredModule:
+        return repr((ModPath,Name))
+    if Name not in StoredModule.keys():
+        Name = Name.split('.')[0]
+        if Name not in StoredModule.keys():
+            return repr((ModPath,Name))
+    Part = StoredModule[Name]
+    F = [PartFingerprint(Part)]
+    for (u,upath) in GetUses(Part):
+        umod = upath[3:-3].replace('/','.')
+        if u.startswith(umod + '.'):
+            F.append(CodeFingerprint(upath,u[len(umod)+1:],Seen))
+        else:
+            F.append(repr(u))
+    return hashlib.sha1('\n'.join(F)).hexdigest()
+
+
+def GetUses(Part):
+    '''
+    (name, module path) pairs of what a stored part uses, as in the Uses links
+    computed by linkmanagement.GutsComputeLinks.
+    '''
+    Uses = []
+    if Part.descr == 'Internal Function':
+        opn = Part.reconstitute()
+        Specified = MakeT(GetStoredDefaultVal(opn,'uses',NoVal = ())) + MakeT(GetStoredAttributes(opn,'__uses__',NoVal = ()))
+        Uses += [(u,'../' + '/'.join(u.split('.')[:-1]) + '.py') if isinstance(u,str) else tuple(u[:2]) for u in Specified]
+    if Part.static != None:
+        Uses += [tuple(u[:2]) for u in Part.static[0]]
+    return Uses
+
+
+def PartFingerprint(Part):
+    '''
+    String that's the same for two stored module parts exactly when they're the
+    same in the sense of StoredModulePart.__eq__ (code is compared as by
+    storage.CodeEquals, but also by the global names it refers to).
+    '''
+    if isinstance(Part,StoredModulePart):
+        if Part.loadmethod == 'marshal':
+            return CodeObjectFingerprint(Part.reconstitute())
+        else:
+            return repr(Part.descr) + ':' + PartFingerprint(Part.content)
+    elif isinstance(Part,dict):
+        return '{' + ','.join([repr(k) + ':' + PartFingerprint(Part[k]) for k in sorted(Part.keys())]) + '}'
+    else:
+        return repr(Part)
+
+
+def CodeObjectFingerprint(c):
+    if isinstance(c,types.CodeType):
+        return repr((c.co_code,c.co_flags,c.co_varnames,c.co_names,[CodeObjectFingerprint(a) for a in c.co_consts[1:]]))
+    else:
+        return repr(c)
+
+
+def ManifestDigest(Manifest):
+    return hashlib.sha1(repr(sorted([(r,None if Manifest[r] is None else (Manifest[r][0],Manifest[r][2])) for r in Manifest.keys()]))).hexdigest()
+
+
+def Restore(Key,Creates,TempOutput):
+    '''
+    Restores the created files and return value stored under Key.  Returns True
+    if the entry was there and restored intact; otherwise, removes whatever was
+    partially restored (and the entry, if it was damaged) and returns False.
+    '''
+    EntryDir = os.path.join(WORKING_DE.cache_dir,Key)
+    Entry = LoadEntry(EntryDir)
+    if Entry is None or sorted(Entry['Creates']) != sorted(Creates):
+        return False
+    try:
+        for (n,f) in enumerate(Entry['Creates']):
+            strongcopy(os.path.join(EntryDir,OUTPUTDIR,str(n)),f,use2 = True)
+            if not hashing.SameContents(hashing.MakeManifest(f),Entry['Manifests'][f]):
+                raise ValueError('Cached copy of ' + f + ' is damaged.')
+        if PathExists(os.path.join(EntryDir,RUNTIMEOUTPUTFILE)):
+            strongcopy(os.path.join(EntryDir,RUNTIMEOUTPUTFILE),TempOutput)
+    except Exception, e:
+        print 'Could not restore from op result cache:', e
+        for f in Creates:
+            if PathExists(f):
+                delete(f)
+        shutil.rmtree(EntryDir,ignore_errors = True)
+        return False
+    os.utime(os.path.join(EntryDir,ENTRYFILE),None)
+    return True
+
+
+def Store(Key,j,Creates,TempOutput):
+    '''
+    Stores the created files and return value of operation j under Key, then
+    evicts least recently used entries to keep the cache under its size bound.
+    '''
+    EntryDir = os.path.join(WORKING_DE.cache_dir,Key)
+    if PathExists(EntryDir):
+        os.utime(os.path.join(EntryDir,ENTRYFILE),None)
+        return
+    TempDir = EntryDir + '.tmp.' + str(os.getpid())
+    try:
+        os.makedirs(os.path.join(TempDir,OUTPUTDIR))
+        Manifests = {}
+        for (n,f) in enumerate(Creates):
+            Manifests[f] = hashing.MakeManifest(f)
+            strongcopy(f,os.path.join(TempDir,OUTPUTDIR,str(n)),use2 = True)
+        if PathExists(TempOutput):
+            strongcopy(TempOutput,os.path.join(TempDir,RUNTIMEOUTPUTFILE))
+        Size = sum([sum([v[0] for v in M.values() if v is not None]) for M in Manifests.values()])
+        Size += os.path.getsize(TempOutput) if PathExists(TempOutput) else 0
+        F = open(os.path.join(TempDir,ENTRYFILE),'wb')
+        pickle.dump({'Op':j,'Creates':Creates,'Manifests':Manifests,'Size':Size},F)
+        F.close()
+        if Size > CACHE_MAX_BYTES:
+            shutil.rmtree(TempDir,ignore_errors = True)
+            return
+        os.rename(TempDir,EntryDir)
+    except (IOError,OSError), e:
+        print 'Could not store outputs of', j, 'in op result cache:', e
+        shutil.rmtree(TempDir,ignore_errors = True)
+        return
+    Evict(CACHE_MAX_BYTES)
+
+
+def LoadEntry(EntryDir):
+    try:
+        return pickle.load(open(os.path.join(EntryDir,ENTRYFILE),'rb'))
+    except Exception:
+        return None
+
+
+def Evict(MaxBytes):
+    '''
+    Removes least recently used entries until the cache holds at most MaxBytes.
+    '''
+    Lock = locking.LockSet(Exclusive = [CACHELOCK])
+    Lock.Acquire()
+    try:
+        GutsEvict(MaxBytes)
+    finally:
+        Lock.Release()
+
+
+def GutsEvict(MaxBytes):
+    Entries = []
+    for k in os.listdir(WORKING_DE.cache_dir):
+        EntryDir = os.path.join(WORKING_DE.cache_dir,k)
+        if '.tmp.' in k:
+            continue
+        Entry = LoadEntry(EntryDir)
+        if Entry is None:
+            continue
+        try:
+            Entries.append((os.path.getmtime(os.path.join(EntryDir,ENTRYFILE)),Entry['Size'],EntryDir))
+        except OSError:
+            pass
+    Entries.sort()
+    Total = sum([e[1] for e in Entries])
+    while Total > MaxBytes and Entries:
+        (t,Size,EntryDir) = Entries.pop(0)
+        shutil.rmtree(EntryDir,ignore_errors = True)
+        Total -= Size
+
+
+def RecordStat(StatsFile,j,Outcome):
+    '''
+    Appends the cache outcome ('hit' or 'miss') of a call to j to a run's stats file.
+    '''
+    F = open(StatsFile,'a')
+    F.write(Outcome + ' ' + j + '\n')
+    F.close()
+
+
+def SummarizeStats(StatsFile):
+    '''
+    One-line summary of a run's cache hits and misses, or None if there were none.
+    '''
+    if not PathExists(StatsFile):
+        return None
+    Outcomes = [l.split(' ')[0] for l in open(StatsFile,'r').read().split('\n') if l]
+    Hits = Outcomes.count('hit')
+    return 'Op result cache: ' + str(Hits) + ' hit(s), ' + str(len(Outcomes) - Hits) + ' miss(es).'
@@ -6,6 +6,10 @@ from listDEs import CmdListDEs
 from makeDE import CmdMakeDE
 from register import CmdRegister
 from clean_registry import CmdClean_Registry
+from update import CmdUpdate
+from restore import CmdRestore
+from tail import CmdTail
+from watch import CmdWatch
 
 all_cmds = [
 	CmdInit(),
@@ -14,5 +18,9 @@ all_cmds = [
 	CmdListDEs(),
 	CmdMakeDE(),
 	CmdRegister(),
-	CmdClean_Registry()
+	CmdClean_Registry(),
+	CmdUpdate(),
+	CmdRestore(),
+	CmdTail(),
+	CmdWatch()
 ]
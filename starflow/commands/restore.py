@@ -0,0 +1,78 @@
+import sys
+import optparse
+import os
+import time
+
+import starflow
+from starflow.logger import log
+from starflow import de
+
+from base import CmdBase
+
+class CmdRestore(CmdBase):
+    """
+    restore <target>
+
+    Rebuild an archived version of a created file or directory
+
+    By default the most recent archived version is rebuilt in place (the
+    current version, if any, is archived first).
+
+    Example:
+
+        $ starflow restore Data/results/ -l
+        $ starflow restore Data/results/ -v 2 -o /tmp/results_v2
+    """
+    names = ['restore']
+
+    def addopts(self, parser):
+        opt = parser.add_option("-n","--local-name", dest="local_name",
+        action="store", default=None, help="local name of the data environment")
+        opt = parser.add_option("-l","--list", dest="list_versions",
+        action="store_true", default=False, help="list the archived versions of the target instead")
+        opt = parser.add_option("-v","--version", dest="version", type="int",
+        action="store", default=-1, help="index of the version to restore, as listed by -l (default: most recent)")
+        opt = parser.add_option("-o","--output", dest="output",
+        action="store", default=None, help="rebuild the version here instead of in place")
+
+    def execute(self,args):
+
+        if len(args) != 1:
+            log.error("Please give exactly one target to restore.")
+            return
+
+        DE_MANAGER = de.DataEnvironmentManager()
+        if self.opts.local_name:
+            reg_info = DE_MANAGER.get_registry_info(local_name = self.opts.local_name)
+            os.environ["WORKING_DE_PATH"] = reg_info["root_dir"]
+
+        WORKING_DE = DE_MANAGER.working_de
+
+        target = os.path.abspath(args[0])
+        if not target.startswith(WORKING_DE.root_dir + os.sep):
+            target = os.path.join(WORKING_DE.root_dir,args[0])
+        target = '../' + os.path.relpath(target,WORKING_DE.root_dir)
+        output = os.path.abspath(self.opts.output) if self.opts.output else None
+
+        os.chdir(WORKING_DE.temp_dir)
+
+        from starflow import archive
+
+        versions = archive.GetVersions(target)
+        if not versions:
+            log.error("No archived versions of %s" % target)
+            return
+
+        if self.opts.list_versions:
+            for (i,v) in enumerate(versions):
+                print '%3d  %-10s  made %s  archived %s  %d file(s), %d bytes' % (i,v['Kind'],
+                    time.ctime(v['Time']),time.ctime(v['Archived']),
+                    len([e for e in v['Manifest'].values() if e is not None]),v['Size'])
+            return
+
+        try:
+            path = archive.Restore(target,Version = self.opts.version,To = output)
+        except IndexError:
+            log.error("No version %d of %s (see -l)" % (self.opts.version,target))
+        else:
+            log.info("Restored version %d of %s to %s" % (self.opts.version,target,path))
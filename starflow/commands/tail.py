@@ -0,0 +1,71 @@
+import sys
+import optparse
+import os
+
+import starflow
+from starflow.logger import log
+from starflow import de
+
+from base import CmdBase
+
+class CmdTail(CmdBase):
+    """
+    tail [session]
+
+    Follow the output of the operations of an update session as they run
+
+    Each line is prefixed with the operation that printed it, and the
+    starts and ends of operations are shown as they happen.   The session
+    defaults to the one started last.
+
+    Example:
+
+        $ starflow tail
+        $ starflow tail 3 -l 50
+    """
+    names = ['tail']
+
+    def addopts(self, parser):
+        opt = parser.add_option("-n","--local-name", dest="local_name",
+        action="store", default=None, help="local name of the data environment")
+        opt = parser.add_option("-l","--lines", dest="lines", type="int",
+        action="store", default=10, help="number of lines of output of each running operation to start with")
+        opt = parser.add_option("-1","--once", dest="once",
+        action="store_true", default=False, help="print the recent output and exit instead of following it")
+
+    def execute(self,args):
+
+        if len(args) > 1:
+            log.error("Please give at most one session to follow.")
+            return
+
+        DE_MANAGER = de.DataEnvironmentManager()
+        if self.opts.local_name:
+            reg_info = DE_MANAGER.get_registry_info(local_name = self.opts.local_name)
+            os.environ["WORKING_DE_PATH"] = reg_info["root_dir"]
+
+        WORKING_DE = DE_MANAGER.working_de
+
+        os.chdir(WORKING_DE.temp_dir)
+
+        from starflow import update, logs, journal
+
+        if args:
+            session = args[0]
+        else:
+            sessions = [s for s in os.listdir(update.TEMPFOLDER) if s.isdigit() and os.path.exists(os.path.join(update.TEMPFOLDER,s,journal.JOURNALFILE))]
+            if not sessions:
+                log.error("No update sessions to follow in %s" % WORKING_DE.name)
+                return
+            session = max(sessions,key = lambda s : os.path.getmtime(os.path.join(update.TEMPFOLDER,s,journal.JOURNALFILE)))
+
+        SsTemp = os.path.join(update.TEMPFOLDER,session)
+        if not os.path.isdir(SsTemp):
+            log.error("No update session %s in %s" % (session,WORKING_DE.name))
+            return
+
+        log.info("Following update session %s of %s" % (session,WORKING_DE.name))
+        try:
+            logs.FollowSession(SsTemp,update.RUNSTDOUTINSESSION + '_',Lines = self.opts.lines,Follow = not self.opts.once)
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,80 @@
+import sys
+import optparse
+import os
+
+import starflow
+from starflow.logger import log
+from starflow import de
+
+from base import CmdBase
+
+class CmdUpdate(CmdBase):
+    """
+    update [seed ...]
+
+    Propagate changes downstream through the working data environment
+
+    Seeds default to the whole data environment.
+
+    An update that was interrupted can be resumed with --resume, giving the
+    id of its session (printed at the start of the run as the directory
+    its output is stored in):  operations it completed are not called again.
+
+    Example:
+
+        $ starflow update -m LOCAL_PARALLEL -j 8 ../Data/
+        $ starflow update --resume 3
+        $ starflow update -w -j 8 ../Data/
+    """
+    names = ['update']
+
+    def addopts(self, parser):
+        opt = parser.add_option("-n","--local-name", dest="local_name",
+        action="store", default=None, help="local name of the data environment to update")
+        opt = parser.add_option("-m","--callmode", dest="callmode",
+        action="store", default=None, help="how operations are called: DIRECT, LOCAL_PARALLEL, DRMAA or LOCAL_DRMAA")
+        opt = parser.add_option("-j","--jobs", dest="jobs", type="int",
+        action="store", default=None, help="number of operations to run at once in LOCAL_PARALLEL and LOCAL_DRMAA modes (0 means one per cpu)")
+        opt = parser.add_option("-f","--forced", dest="forced",
+        action="store_true", default=False, help="rebuild everything downstream of the seeds")
+        opt = parser.add_option("-e","--email", dest="email",
+        action="store", default=None, help="comma-separated addresses to email the run report to")
+        opt = parser.add_option("-w","--what", dest="what",
+        action="store_true", default=False, help="only show what would be called, with predicted runtimes, critical path and wall times")
+        opt = parser.add_option("-r","--resume", dest="resume", type="int",
+        action="store", default=None, help="resume the interrupted update session with this id")
+
+    def execute(self,args):
+
+        DE_MANAGER = de.DataEnvironmentManager()
+        if self.opts.local_name:
+            reg_info = DE_MANAGER.get_registry_info(local_name = self.opts.local_name)
+            os.environ["WORKING_DE_PATH"] = reg_info["root_dir"]
+
+        WORKING_DE = DE_MANAGER.working_de
+
+        from starflow.system_io_override import io_override
+        io_override(WORKING_DE)
+
+        os.chdir(WORKING_DE.temp_dir)
+
+        from starflow import update
+
+        if self.opts.resume is not None:
+            if args or self.opts.forced:
+                log.error("Seeds and --forced can't be given when resuming a session.")
+                return
+            log.info("Resuming update session %d of %s" % (self.opts.resume,WORKING_DE.name))
+            update.ResumeUpdate(self.opts.resume,EmailWhenDone=self.opts.email,CallMode=self.opts.callmode,Jobs=self.opts.jobs)
+            return
+
+        Seed = args if args else ['../']
+        CallMode = self.opts.callmode or update.DEFAULT_CALLMODE
+        Jobs = self.opts.jobs if self.opts.jobs is not None else update.DEFAULT_JOBS
+
+        if self.opts.what:
+            update.FindOutWhatWillUpdate(Seed=Seed,Forced=self.opts.forced,Jobs=Jobs)
+            return
+
+        log.info("Updating %s from %s in %s mode" % (WORKING_DE.name,','.join(Seed),CallMode))
+        update.FullUpdate(Seed=Seed,Forced=self.opts.forced,EmailWhenDone=self.opts.email,CallMode=CallMode,Jobs=Jobs)
@@ -0,0 +1,65 @@
+import sys
+import optparse
+import os
+
+import starflow
+from starflow.logger import log
+from starflow import de
+
+from base import CmdBase
+
+class CmdWatch(CmdBase):
+    """
+    watch [seed ...]
+
+    Update the working data environment whenever something in it changes
+
+    Runs until interrupted.   After each burst of changes, only the
+    operations downstream of the paths that changed are called, as
+    "starflow update" would call them.   Seeds (default: the whole data
+    environment) limit the changes that are acted on.
+
+    Example:
+
+        $ starflow watch -m LOCAL_PARALLEL -j 8
+        $ starflow watch -s -d 5 ../Data/
+    """
+    names = ['watch']
+
+    def addopts(self, parser):
+        opt = parser.add_option("-n","--local-name", dest="local_name",
+        action="store", default=None, help="local name of the data environment to watch")
+        opt = parser.add_option("-m","--callmode", dest="callmode",
+        action="store", default=None, help="how operations are called: DIRECT, LOCAL_PARALLEL, DRMAA or LOCAL_DRMAA")
+        opt = parser.add_option("-j","--jobs", dest="jobs", type="int",
+        action="store", default=None, help="number of operations to run at once in LOCAL_PARALLEL and LOCAL_DRMAA modes (0 means one per cpu)")
+        opt = parser.add_option("-d","--debounce", dest="debounce", type="float",
+        action="store", default=None, help="seconds without changes to wait for before updating")
+        opt = parser.add_option("-e","--email", dest="email",
+        action="store", default=None, help="comma-separated addresses to email the report of each update to")
+        opt = parser.add_option("-s","--skip-initial", dest="skip_initial",
+        action="store_true", default=False, help="don't bring the data environment up to date before watching it")
+
+    def execute(self,args):
+
+        DE_MANAGER = de.DataEnvironmentManager()
+        if self.opts.local_name:
+            reg_info = DE_MANAGER.get_registry_info(local_name = self.opts.local_name)
+            os.environ["WORKING_DE_PATH"] = reg_info["root_dir"]
+
+        WORKING_DE = DE_MANAGER.working_de
+
+        from starflow.system_io_override import io_override
+        io_override(WORKING_DE)
+
+        os.chdir(WORKING_DE.temp_dir)
+
+        from starflow import update, watch
+
+        Seed = args if args else ['../']
+        CallMode = self.opts.callmode or update.DEFAULT_CALLMODE
+        Jobs = self.opts.jobs if self.opts.jobs is not None else update.DEFAULT_JOBS
+        Debounce = self.opts.debounce if self.opts.debounce is not None else watch.DEBOUNCE
+
+        log.info("Watching %s from %s in %s mode" % (WORKING_DE.name,','.join(Seed),CallMode))
+        watch.WatchUpdate(Seed=Seed,EmailWhenDone=self.opts.email,CallMode=CallMode,Jobs=Jobs,Initial=not self.opts.skip_initial,Debounce=Debounce)
@@ -248,6 +248,26 @@ class StarFlowConfig(ConfigObject):
         store = self._load_section('global', static.GLOBAL_SETTINGS)
         self.python_executable = store["python_executable"]
         self.default_callmode = store["default_callmode"]
+        self.default_jobs = store["default_jobs"]
+        self.worker_max_ops = store["worker_max_ops"]
+        self.worker_preload = store["worker_preload"]
+        self.fast_ops_in_process = store["fast_ops_in_process"]
+        self.op_cache_max_bytes = store["op_cache_max_bytes"]
+        self.archive_keep_versions = store["archive_keep_versions"]
+        self.archive_max_bytes = store["archive_max_bytes"]
+        self.max_threads = store["max_threads"]
+        self.max_memory = store["max_memory"]
+        self.max_io_ops = store["max_io_ops"]
+        self.drmaa_threads_spec = store["drmaa_threads_spec"]
+        self.drmaa_memory_spec = store["drmaa_memory_spec"]
+        self.drmaa_scratch_spec = store["drmaa_scratch_spec"]
+        self.grid_batch_seconds = store["grid_batch_seconds"]
+        self.op_log_max_bytes = store["op_log_max_bytes"]
+        self.op_log_segments = store["op_log_segments"]
+        self.op_timeout_factor = store["op_timeout_factor"]
+        self.relaunch_stragglers = store["relaunch_stragglers"]
+        self.link_jobs = store["link_jobs"]
+        self.link_timeout = store["link_timeout"]
         self.pythonpath = store["pythonpath"]    
             
     def create_global_config(self):
@@ -320,6 +340,9 @@ class DataEnvironmentConfig(ConfigObject):
         self._metadata_dir = os.path.join(self._root_dir, static.LOCAL_METADATA_DIR)
         self._links_dir = os.path.join(self._root_dir, static.LOCAL_LINKS_DIR)
         self._modules_dir = os.path.join(self._root_dir,static.LOCAL_MODULES_DIR)
+        self._manifest_dir = os.path.join(self._root_dir,static.LOCAL_MANIFEST_DIR)
+        self._cache_dir = os.path.join(self._root_dir,static.LOCAL_CACHE_DIR)
+        self._lock_dir = os.path.join(self._root_dir,static.LOCAL_LOCK_DIR)
         self._tmp_dir = os.path.join(self._root_dir, static.LOCAL_TMP_DIR)
         self._temp_dir = os.path.join(self._root_dir, static.LOCAL_TEMP_DIR)
         self._lmf_file = os.path.join(self._root_dir, static.LOCAL_LIVE_MODULE_FILTER_FILE)
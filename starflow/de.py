@@ -247,6 +247,18 @@ class DataEnvironment(DataEnvironmentConfig):
     def links_dir(self):
         return self._create_dir(self._links_dir)
 
+    @property
+    def manifest_dir(self):
+        return self._create_dir(self._manifest_dir)
+
+    @property
+    def cache_dir(self):
+        return self._create_dir(self._cache_dir)
+
+    @property
+    def lock_dir(self):
+        return self._create_dir(self._lock_dir)
+
     @property
     def tmp_dir(self):
         return self._create_dir(self._tmp_dir)
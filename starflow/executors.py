@@ -0,0 +1,311 @@
+'''
+Executors, the backends through which the updater calls operations.
+
+The update scheduler (update.DataflowUpdate) hands each call to an executor as
+a job -- a python script to be run in a production interpreter -- and learns
+from the executor when each job has ended.   All executors have the same
+interface:
+
+    Submit(Script,Name,OutputFile,Resources)
+                submits a job and returns its id
+    SubmitBatch(Scripts,Name,OutputFile,Resources)
+                submits an array job, the n-th task of which runs Scripts[n-1],
+                and returns the ids of its tasks (only if CanBatch)
+    Slots()     number of further jobs the executor can take at the moment
+    Wait(Timeout)
+                waits up to Timeout seconds for a job to end, and returns
+                (job id, JobResult) for it, or None if none ended
+    Cancel(JobId)
+                stops a job if it can
+    Close(Abort = False)
+                waits for (or, if Abort, stops) the jobs left and shuts down
+
+and the attributes Local (whether jobs run on this machine, within the budget
+of starflow.budget) and DefaultThreads (threads given to jobs that declare
+none, see budget.GetThreadEnv).
+
+A JobResult is a dictionary with keys 'Aborted' (whether the job was stopped
+before it ended), 'ExitStatus' and 'ResourceUsage' (a dictionary in the
+format of DRMAA's JobInfo.resourceUsage:  strings, e.g. 'ru_wallclock' and
+'cpu' in seconds).
+
+The backends are
+
+    InlineExecutor      runs each job in this process as it's submitted
+                        ('DIRECT' mode)
+    PoolExecutor        runs jobs in a pool of local processes
+                        ('LOCAL_PARALLEL' mode)
+    DrmaaExecutor       submits jobs to a grid engine through DRMAA ('DRMAA'
+                        mode), or to starflow.localdrmaa, which runs them as
+                        local processes the way a grid engine would
+                        ('LOCAL_DRMAA' mode)
+'''
+
+import os
+import sys
+import time
+import resource
+import traceback
+import multiprocessing
+import cPickle as pickle
+
+import starflow.de as de
+import starflow.budget as budget
+import starflow.locking as locking
+import starflow.localdrmaa as localdrmaa
+
+try:
+    import drmaa
+except ImportError:
+    print("DRMAA not available")
+    drmaa = None
+else:
+    print("DRMAA loaded")
+
+DE_MANAGER = de.DataEnvironmentManager()
+PATH_TO_PYTHON = DE_MANAGER.python_executable
+POLL_INTERVAL = .05                 # seconds between checks for ended jobs of local pools
+POOL_WAIT_FOREVER = 60*60*24*365    # timeout for local pool waits (an untimed wait can't be interrupted)
+JOB_ENVIRONMENT = ['PYTHONPATH','PATH','LD_LIBRARY_PATH']    # variables passed on to grid jobs
+CALLMODES = ['DIRECT','LOCAL_PARALLEL','DRMAA','LOCAL_DRMAA']
+TASK_ID_VARIABLES = ['SGE_TASK_ID','SLURM_ARRAY_TASK_ID','LSB_JOBINDEX','PBS_ARRAYID','PBS_ARRAY_INDEX']   # variables in which grid engines give array tasks their index
+
+
+def GetExecutor(CallMode,Workers):
+    '''
+    Executor for a call mode, running up to Workers jobs at once in
+    'LOCAL_PARALLEL' and 'LOCAL_DRMAA' modes.
+    '''
+    if CallMode == 'DIRECT':
+        return InlineExecutor()
+    elif CallMode == 'LOCAL_PARALLEL':
+        return PoolExecutor(Workers)
+    elif CallMode == 'DRMAA':
+        if drmaa is None:
+            raise ImportError('DRMAA is not available, so operations cannot be called in DRMAA mode.')
+        return DrmaaExecutor(drmaa.Session())
+    elif CallMode == 'LOCAL_DRMAA':
+        return DrmaaExecutor(localdrmaa.Session(Slots = Workers),Module = localdrmaa)
+    else:
+        raise ValueError('Unknown call mode ' + repr(CallMode) + ', should be one of ' + ', '.join(CALLMODES) + '.')
+
+
+def RunScript(Script):
+    '''
+    Runs a job script in this process and returns its JobResult.   Failures
+    are printed and reported as a nonzero exit status.
+    '''
+    Before = time.time()
+    UsageBefore = [resource.getrusage(r) for r in [resource.RUSAGE_SELF,resource.RUSAGE_CHILDREN]]
+    try:
+        exec Script in {'__name__':'__job__'}
+        ExitStatus = 0
+    except SystemExit, e:
+        ExitStatus = 0 if e.code is None else (e.code if isinstance(e.code,int) else 1)
+    except Exception:
+        traceback.print_exc()
+        ExitStatus = 1
+    After = time.time()
+    UsageAfter = [resource.getrusage(r) for r in [resource.RUSAGE_SELF,resource.RUSAGE_CHILDREN]]
+    UTime = sum([a.ru_utime - b.ru_utime for (a,b) in zip(UsageAfter,UsageBefore)])
+    STime = sum([a.ru_stime - b.ru_stime for (a,b) in zip(UsageAfter,UsageBefore)])
+    return {'Aborted':False,
+            'ExitStatus':ExitStatus,
+            'ResourceUsage':{'submission_time':repr(Before),
+                             'start_time':repr(Before),
+                             'end_time':repr(After),
+                             'ru_wallclock':repr(After - Before),
+                             'ru_utime':repr(UTime),
+                             'ru_stime':repr(STime),
+                             'cpu':repr(UTime + STime),
+                             'ru_maxrss':repr(max([u.ru_maxrss for u in UsageAfter]))}}
+
+
+def FormatUsage(Usage):
+    '''
+    Short summary of a job's resource usage.
+    '''
+    Parts = []
+    for (Key,Label) in [('ru_wallclock','wall'),('cpu','cpu')]:
+        try:
+            Parts.append(Label + ' %.1fs' % float(Usage[Key]))
+        except (KeyError,ValueError):
+            pass
+    return ', '.join(Parts)
+
+
+class InlineExecutor(object):
+    '''
+    Runs each job in this process, to its end, as it's submitted.   Output
+    goes to this process's stdout rather than to the jobs' output files.
+    '''
+    Local = True
+    CanBatch = False
+    DefaultThreads = None
+
+    def __init__(self):
+        self.Results = []
+        self.Count = 0
+
+    def Submit(self,Script,Name,OutputFile,Resources = None):
+        self.Count += 1
+        self.Results.append((str(self.Count),RunScript(Script)))
+        return str(self.Count)
+
+    def Slots(self):
+        return 0 if len(self.Results) > 0 else 1
+
+    def Wait(self,Timeout):
+        return self.Results.pop(0) if len(self.Results) > 0 else None
+
+    def Cancel(self,JobId):
+        pass
+
+    def Close(self,Abort = False):
+        self.Results = []
+
+
+class PoolExecutor(object):
+    '''
+    Runs jobs in a pool of Workers local processes, forked from this one (so
+    output goes to this process's stdout rather than to the jobs' output
+    files).   Jobs that ask for no threads get an even share of the budget.
+    '''
+    Local = True
+    CanBatch = False
+
+    def __init__(self,Workers):
+        self.Workers = max(Workers,1)
+        self.DefaultThreads = budget.GetDefaultThreads(budget.GetBudget(self.Workers),self.Workers)
+        self.Pool = multiprocessing.Pool(self.Workers,locking.ForgetInheritedLocks)
+        self.Running = {}
+        self.Count = 0
+
+    def Submit(self,Script,Name,OutputFile,Resources = None):
+        self.Count += 1
+        self.Running[str(self.Count)] = self.Pool.apply_async(RunScript,(Script,))
+        return str(self.Count)
+
+    def Slots(self):
+        return self.Workers - len(self.Running)
+
+    def Wait(self,Timeout):
+        Start = time.time()
+        while len(self.Running) > 0:
+            Done = [k for k in sorted(self.Running.keys(),key = int) if self.Running[k].ready()]
+            if len(Done) > 0:
+                return (Done[0],self.Running.pop(Done[0]).get(POOL_WAIT_FOREVER))
+            if time.time() - Start >= Timeout:
+                break
+            time.sleep(POLL_INTERVAL)
+        return None
+
+    def Cancel(self,JobId):
+        #a pool can't stop one of its jobs -- it is only forgotten, and stopped when the pool is closed with Abort
+        self.Running.pop(JobId,None)
+
+    def Close(self,Abort = False):
+        if Abort:
+            self.Pool.terminate()
+        else:
+            self.Pool.close()
+        self.Pool.join()
+
+
+class DrmaaExecutor(object):
+    '''
+    Submits jobs to a DRMAA session -- of the drmaa module or of a stand-in
+    with the same interface, such as starflow.localdrmaa -- asking for the
+    jobs' resources in the native specification of their templates (see
+    budget.NativeSpecification).   Jobs run PATH_TO_PYTHON with their
+    script, and get the JOB_ENVIRONMENT variables of this process.
+    '''
+    Local = False
+    CanBatch = True
+    DefaultThreads = 1
+
+    def __init__(self,Session,Module = None):
+        self.Module = Module if Module is not None else drmaa
+        self.Session = Session
+        self.Session.initialize()
+        self.Running = set([])
+
+    def GetJobTemplate(self,Script,Name,OutputFile,Resources):
+        jt = self.Session.createJobTemplate()
+        jt.remoteCommand = PATH_TO_PYTHON
+        jt.workingDirectory = os.getcwd()
+        jt.args = ["-c","from starflow.production import *\n" + Script]
+        jt.joinFiles = True
+        jt.jobEnvironment = dict([(k,os.environ[k]) for k in JOB_ENVIRONMENT if k in os.environ])
+        jt.outputPath = ':' + OutputFile
+        jt.jobName = Name
+        NativeSpecification = budget.NativeSpecification(Resources) if Resources is not None else ''
+        if NativeSpecification:
+            jt.nativeSpecification = NativeSpecification
+        return jt
+
+    def Submit(self,Script,Name,OutputFile,Resources = None):
+        jt = self.GetJobTemplate(Script,Name,OutputFile,Resources)
+        JobId = self.Session.runJob(jt)
+        self.Session.deleteJobTemplate(jt)
+        self.Running.add(JobId)
+        return JobId
+
+    def SubmitBatch(self,Scripts,Name,OutputFile,Resources = None):
+        '''
+        The task scripts are pickled to a file next to OutputFile, from which
+        each task reads its own, by the index the grid engine gives it in its
+        environment (see RunTask);  task n's output goes to OutputFile + '.n'.
+        (DRMAA substitutes PARAMETRIC_INDEX in the paths of a job template,
+        but not in its arguments.)
+        '''
+        TaskFile = os.path.join(os.path.dirname(OutputFile),Name + '.tasks')
+        F = open(TaskFile,'wb')
+        pickle.dump(Scripts,F,pickle.HIGHEST_PROTOCOL)
+        F.close()
+        Index = self.Module.JobTemplate.PARAMETRIC_INDEX
+        jt = self.GetJobTemplate("import starflow.executors as E ; E.RunTask(" + repr(TaskFile) + ")",Name,OutputFile + '.' + Index,Resources)
+        JobIds = self.Session.runBulkJobs(jt,1,len(Scripts),1)
+        self.Session.deleteJobTemplate(jt)
+        self.Running.update(JobIds)
+        return JobIds
+
+    def Slots(self):
+        #the grid engine queues what it can't run yet
+        return sys.maxint
+
+    def Wait(self,Timeout):
+        if len(self.Running) == 0:
+            return None
+        try:
+            Info = self.Session.wait(self.Module.Session.JOB_IDS_SESSION_ANY,Timeout)
+        except self.Module.ExitTimeoutException:
+            return None
+        self.Running.discard(Info.jobId)
+        return (Info.jobId,{'Aborted':bool(Info.wasAborted) or not Info.hasExited,
+                            'ExitStatus':Info.exitStatus,
+                            'ResourceUsage':dict(Info.resourceUsage or {})})
+
+    def Cancel(self,JobId):
+        try:
+            self.Session.control(JobId,self.Module.JobControlAction.TERMINATE)
+        except self.Module.DrmaaException:
+            pass
+
+    def Close(self,Abort = False):
+        if Abort:
+            for JobId in list(self.Running):
+                self.Cancel(JobId)
+        self.Session.exit()
+
+
+def RunTask(TaskFile):
+    '''
+    Runs this task of an array job submitted with SubmitBatch:  the one
+    whose number is in the first of TASK_ID_VARIABLES that is set.
+    '''
+    Indices = [os.environ[v] for v in TASK_ID_VARIABLES if os.environ.get(v,'undefined') != 'undefined']
+    if len(Indices) == 0:
+        raise EnvironmentError('No array task index in the environment (none of ' + ', '.join(TASK_ID_VARIABLES) + ' is set).')
+    Script = pickle.load(open(TaskFile,'rb'))[int(Indices[0]) - 1]
+    exec Script in {'__name__':'__job__'}
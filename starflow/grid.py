@@ -1,77 +1,62 @@
-import drmaa
-import time
 import os
 
-try:
-	import System.config.PerMachineSetup as P
-	PATH_TO_PYTHON = P.PATH_TO_PYTHON
-except:
-	PATH_TO_PYTHON = 'python'
+import starflow.de as de
+import starflow.executors as executors
 
-def submitJobs(joblist):
+DE_MANAGER = de.DataEnvironmentManager()
+WORKING_DE = DE_MANAGER.working_de
+GRID_WAIT = 60      # seconds between reports while waiting on grid jobs
 
-    Session = drmaa.Session()
-    Session.initialize()
-    jobs = {}
-    
-    for j in joblist:
-        argstr = j['argstr']
-        name = j['name']
-        outfile = j['outfile']
-    
-        jt = Session.createJobTemplate()
-        jt.remoteCommand = PATH_TO_PYTHON
-        jt.workingDirectory = os.getcwd()       
 
-        jt.args = ["-c","execfile('../System/initialize_for_production'); " + argstr]
-        jt.joinFiles = True
-        jt.jobEnvironment = dict([(k,os.environ[k]) for k in ['PYTHONPATH','PATH','V8_HOME','LD_LIBRARY_PATH']])        
-        jt.outputPath = ':' + os.environ['DataEnvironmentDirectory'] + '/Temp/' + outfile
-        jt.errorPath = jt.outputPath
-        jt.jobName = name
-        jobid = Session.runJob(jt)
-        jobs[jobid] = j
-        print 'Loading job', name, 'with id', jobid
-        
+def submitJobs(joblist):
+    '''
+    Runs python statements as grid engine jobs (through executors.DrmaaExecutor)
+    and waits for all of them.   Each job in joblist is a dictionary with keys
+    'argstr' (the statements), 'name' and 'outfile'.
+
+    Returns a dictionary mapping the id of each job to the job and its
+    result;  if a job fails, the others are stopped and an exception is
+    raised.
+
+    Since submitJobs goes through executors.DrmaaExecutor, it differs from 
+    its earlier, standalone version in that:
+
+        --the result of each job is an executors JobResult (a dictionary with
+            keys 'Aborted', 'ExitStatus' and 'ResourceUsage') rather than the
+            DRMAA JobInfo object of the job;
+        --the statements are run after "from starflow.production import *",
+            as operations are, rather than after executing
+            '../System/initialize_for_production';
+        --'outfile' is taken relative to the data environment's temp
+            directory (WORKING_DE.temp_dir) rather than to
+            $DataEnvironmentDirectory/Temp;
+        --killAllJobs is gone:  the jobs left are stopped by closing the
+            executor with Abort = True.
+    '''
+    Executor = executors.GetExecutor('DRMAA',len(joblist))
+    jobs = {}
     retvals = {}
-    while True:
-        running = False
-        for (id,j) in jobs.items():
-            js = Session.jobStatus(id)
-            if js == 'done':
-                retval = Session.wait(id,drmaa.Session.TIMEOUT_WAIT_FOREVER)
-                print 'retval=', retval
-                if retval.exitStatus != 0:
-                    killAllJobs(jobs,Session)
-                    Session.exit()
-                    raise Exception, 'Job ' + j['name'] + ' threw an exception during grid run.  See error in ' + j['outfile'] + '.'
-                else:
-                    print 'job', id, '(' + j['name'] + ')', 'succeeded.'
-                    retvals[id] = (jobs.pop(id),retval)
-                
-            elif js == 'failed':
-                killAllJobs(jobs,Session)    	    
-                Session.exit()
+    try:
+        for j in joblist:
+            id = Executor.Submit(j['argstr'],j['name'],os.path.join(WORKING_DE.temp_dir,j['outfile']))
+            jobs[id] = j
+            print 'Loading job', j['name'], 'with id', id
+
+        while jobs:
+            Ended = Executor.Wait(GRID_WAIT)
+            if Ended is None:
+                print 'jobs', ', '.join(sorted(jobs.keys())), 'running.'
+                continue
+            (id,retval) = Ended
+            j = jobs.pop(id)
+            if retval['Aborted'] or retval['ExitStatus'] != 0:
                 raise Exception, 'Job ' + j['name'] + ' failed during grid run.  See error in ' + j['outfile'] + '.'
+            print 'job', id, '(' + j['name'] + ')', 'succeeded.'
+            retvals[id] = (j,retval)
+    except:
+        Executor.Close(Abort = True)
+        raise
+    else:
+        Executor.Close()
 
-            else:
-                print 'job', id, 'running.'
-                running = True
-                
-        if not running:
-            break
-        else:
-            time.sleep(60)
-    
-    Session.exit()
-    
     return retvals
-
-
-
-def killAllJobs(jobs,Session):
-    for id in jobs.keys():
-        try:
-            Session.control(id,drmaa.JobControlAction.TERMINATE)
-        except drmaa.InvalidJobException:
-	    pass
@@ -0,0 +1,188 @@
+'''
+Content hashing of files and directory trees, and the manifests built from it.
+
+A manifest describes a file or directory tree as a dictionary mapping paths
+relative to its top ('' for the top itself) to
+
+    (size, mtime, digest)   for files, and
+    None                    for directories.
+
+Two versions of an output have the same contents exactly when their manifests
+agree on paths, sizes and digests.  The mtimes are not part of the contents;
+they're kept so that a stored manifest can be checked against the files it
+describes with a stat alone (see ManifestIsCurrent), so the version it
+describes never needs to be read again.
+
+Files are hashed in chunks, large ones through mmap, and the files of a tree
+are hashed in parallel threads (hashlib releases the GIL while it digests).
+
+Manifests of data environment paths are stored in the data environment's
+manifest_dir (see GetManifestFile).
+'''
+
+import os
+import mmap
+import hashlib
+import multiprocessing
+import cPickle as pickle
+from multiprocessing.pool import ThreadPool
+
+import starflow.de as de
+from starflow.utils import PathFileName
+DE_MANAGER = de.DataEnvironmentManager()
+WORKING_DE = DE_MANAGER.working_de
+
+HASH_ALGORITHM = 'sha1'
+CHUNK_SIZE = 2**20                  # bytes read (or mmap'd) per hash update
+MMAP_THRESHOLD = 2**24              # files at least this big are hashed through mmap
+HASH_THREADS = min(8,multiprocessing.cpu_count())
+
+
+def HashFile(path):
+    '''
+    Hex digest of the contents of the file at path.
+    '''
+    h = hashlib.new(HASH_ALGORITHM)
+    size = os.path.getsize(path)
+    F = open(path,'rb')
+    try:
+        if size >= MMAP_THRESHOLD:
+            M = mmap.mmap(F.fileno(),0,access=mmap.ACCESS_READ)
+            try:
+                for i in xrange(0,size,CHUNK_SIZE):
+                    h.update(buffer(M,i,CHUNK_SIZE))
+            finally:
+                M.close()
+        else:
+            chunk = F.read(CHUNK_SIZE)
+            while chunk:
+                h.update(chunk)
+                chunk = F.read(CHUNK_SIZE)
+    finally:
+        F.close()
+    return h.hexdigest()
+
+
+def ListTree(path):
+    '''
+    Stat information for the file or directory tree at path, as a dictionary
+    mapping relative paths to (size, mtime) for files and None for directories.
+    '''
+    if not os.path.isdir(path):
+        s = os.stat(path)
+        return {'':(s.st_size,s.st_mtime)}
+    Entries = {'':None}
+    for (root,dirs,files) in os.walk(path,followlinks=True):
+        rel = os.path.relpath(root,path)
+        rel = '' if rel == '.' else rel + '/'
+        for d in dirs:
+            Entries[rel + d] = None
+        for f in files:
+            s = os.stat(os.path.join(root,f))
+            Entries[rel + f] = (s.st_size,s.st_mtime)
+    return Entries
+
+
+def MakeManifest(path,Threads = HASH_THREADS):
+    '''
+    Manifest of the file or directory tree at path (see module docstring).
+    '''
+    Entries = ListTree(path)
+    Files = [r for r in Entries.keys() if Entries[r] is not None]
+    Paths = [os.path.join(path,r) if r else path for r in Files]
+    if len(Paths) > 1 and Threads > 1:
+        Pool = ThreadPool(min(Threads,len(Paths)))
+        try:
+            Digests = Pool.map(HashFile,Paths)
+        finally:
+            Pool.close()
+            Pool.join()
+    else:
+        Digests = map(HashFile,Paths)
+    Manifest = dict([(r,None) for r in Entries.keys() if Entries[r] is None])
+    Manifest.update(dict([(r,Entries[r] + (d,)) for (r,d) in zip(Files,Digests)]))
+    return Manifest
+
+
+def ManifestIsCurrent(Manifest,path):
+    '''
+    Whether a manifest still describes the file or directory tree at path, as
+    far as names, sizes and mtimes can tell.
+    '''
+    if Manifest is None or not os.path.exists(path):
+        return False
+    Entries = ListTree(path)
+    if set(Entries.keys()) != set(Manifest.keys()):
+        return False
+    for r in Entries.keys():
+        if (Entries[r] is None) != (Manifest[r] is None):
+            return False
+        if Entries[r] is not None and Entries[r] != Manifest[r][:2]:
+            return False
+    return True
+
+
+def SubManifest(Manifest,rel):
+    '''
+    Part of a manifest describing the relative path rel inside it, re-rooted at rel.
+    '''
+    rel = rel.strip('/')
+    if not rel:
+        return Manifest
+    return dict([(r[len(rel)+1:],Manifest[r]) for r in Manifest.keys() if r == rel or r.startswith(rel + '/')])
+
+
+def SameContents(Manifest1,Manifest2):
+    '''
+    Whether two manifests describe the same contents.
+    '''
+    if set(Manifest1.keys()) != set(Manifest2.keys()):
+        return False
+    for r in Manifest1.keys():
+        if (Manifest1[r] is None) != (Manifest2[r] is None):
+            return False
+        if Manifest1[r] is not None and (Manifest1[r][0],Manifest1[r][2]) != (Manifest2[r][0],Manifest2[r][2]):
+            return False
+    return True
+
+
+def GetManifestFile(path):
+    '''
+    Where the manifest of the data environment path (relative to Temp) is stored.
+    '''
+    return os.path.join(WORKING_DE.manifest_dir,PathFileName(path))
+
+
+def GetCurrentManifest(path):
+    '''
+    Manifest of path, taken from its stored manifest if that is still current
+    (and made, and stored, afresh otherwise).
+    '''
+    ManifestFile = GetManifestFile(path)
+    Manifest = LoadManifest(ManifestFile)
+    if not ManifestIsCurrent(Manifest,path):
+        Manifest = MakeManifest(path)
+        SaveManifest(Manifest,ManifestFile)
+    return Manifest
+
+
+def LoadManifest(ManifestFile):
+    '''
+    Manifest stored at ManifestFile, or None if there isn't a readable one.
+    '''
+    if os.path.exists(ManifestFile):
+        try:
+            return pickle.load(open(ManifestFile,'rb'))
+        except Exception:
+            return None
+
+
+def SaveManifest(Manifest,ManifestFile):
+    '''
+    Stores a manifest, replacing whatever was at ManifestFile atomically.
+    '''
+    TempFile = ManifestFile + '.' + str(os.getpid())
+    F = open(TempFile,'wb')
+    pickle.dump(Manifest,F,pickle.HIGHEST_PROTOCOL)
+    F.close()
+    os.rename(TempFile,ManifestFile)
@@ -0,0 +1,151 @@
+'''
+Incremental re-planning of a running update.
+
+An update plan is the set of links activated by propagating downstream from
+the seeds (see linkmanagement.PropagateThroughLinkGraphWithTimes).   As the
+updater calls operations, two kinds of events change the plan:
+
+    -- an operation fails, so the operations downstream of it are not to be
+    called (unless something else that changed reaches them);
+    -- an operation's outputs turn out to be no different from their
+    previous versions, so the operations downstream of them need only have
+    their outputs touched (unless something else that changed reaches them).
+
+Rather than propagating from the seeds through the whole plan again after each
+event, re-statting every path in it, a PlanGraph holds the adjacency of the
+plan's links, built once, and which of their endpoints are reached from the
+seeds.   An event excludes some links, and only the cone downstream of them is
+walked to find what is no longer reached.   Activation is taken as it was
+when the plan was made:  paths outside the cone aren't looked at again.   A
+link out of a path that an operation of the plan makes is taken to be
+activated by that operation only, so the failure of the operation cancels
+what is downstream of it.
+
+Reachability is kept for two views of the plan:
+
+    CALLED      links of failed operations excluded -- what is still to be
+                called (or touched)
+    CHANGED     links of failed operations, links out of unchanged outputs,
+                and Dummy links excluded -- what is still to be called
+
+Links can be added to a plan while it runs (see PlanGraph.Add):  only what is
+reached through the new links is walked.
+'''
+
+CALLED = 'called'
+CHANGED = 'changed'
+KEYS = ('LinkType','LinkSource','LinkTarget','UpdateScript')    # fields identifying a link of a plan
+
+
+class PlanGraph(object):
+    '''
+    Adjacency and reachability of the links in LinkList, the links of a plan,
+    of which those in RootLinks (the first stage of the propagation that made
+    the plan) are activated by the seeds themselves.
+    '''
+    def __init__(self,LinkList,RootLinks):
+        self.Sources = []
+        self.Targets = []
+        self.Scripts = []
+        self.Root = []
+        self.Keys = set([])
+        self.Out = {}
+        self.In = {}
+        self.Creates = {}
+        self.Excluded = {CALLED:set([]),CHANGED:set([])}
+        self.Reached = {CALLED:set([]),CHANGED:set([])}
+        self.Add(LinkList,RootLinks)
+
+    def Add(self,LinkList,RootLinks):
+        '''
+        Adds the links in LinkList that aren't in the plan yet, of which those
+        in RootLinks are activated by seeds of their own (as when the calls of
+        newly created modules are merged into a running update), walking only
+        what is reached through them.
+        '''
+        if len(LinkList) == 0:
+            return
+        Types = LinkList['LinkType'].tolist()
+        Keys = zip(*[LinkList[k].tolist() for k in KEYS])
+        RootKeys = set(zip(*[RootLinks[k].tolist() for k in KEYS])) if len(RootLinks) > 0 else set([])
+        New = []
+        for (i,k) in enumerate(Keys):
+            if k not in self.Keys:
+                self.Keys.add(k)
+                n = len(self.Sources)
+                self.Sources.append(k[1])
+                self.Targets.append(k[2])
+                self.Scripts.append(k[3])
+                self.Out.setdefault(k[1],[]).append(n)
+                self.In.setdefault(k[2],[]).append(n)
+                if Types[i] == 'CreatedBy':
+                    self.Creates.setdefault(k[3],[]).append(n)
+                if Types[i] == 'Dummy':
+                    self.Excluded[CHANGED].add(n)
+                New.append((n,k))
+        #a link out of an output of the plan is activated by the operation making it, whatever the first stage says
+        Made = set([self.Targets[i] for i in ListLinks(self.Creates,self.Creates.keys())])
+        self.Root += [k in RootKeys and k[1] not in Made for (n,k) in New]
+        for View in [CALLED,CHANGED]:
+            self.Walk(View,[n for (n,k) in New if self.Live(View,n)])
+
+    def Live(self,View,i):
+        '''
+        Whether link i is activated in View.
+        '''
+        return i not in self.Excluded[View] and (self.Root[i] or self.Sources[i] in self.Reached[View])
+
+    def Walk(self,View,Links):
+        '''
+        Adds to what is reached in View the endpoints reached through Links,
+        walking downstream from them.
+        '''
+        Reached = self.Reached[View]
+        Work = list(Links)
+        while Work:
+            i = Work.pop()
+            t = self.Targets[i]
+            if t not in Reached:
+                Reached.add(t)
+                Work += [k for k in self.Out.get(t,[]) if k not in self.Excluded[View]]
+
+    def Exclude(self,View,Links):
+        '''
+        Excludes Links from View, walking the cone downstream of them, and
+        returns the scripts whose calls are no longer activated in View.
+        '''
+        Links = set(Links).difference(self.Excluded[View])
+        self.Excluded[View].update(Links)
+        Reached = self.Reached[View]
+        Affected = set(Links)
+        Work = [self.Targets[i] for i in Links]
+        while Work:
+            n = Work.pop()
+            if n in Reached and not any([self.Live(View,i) for i in self.In.get(n,[])]):
+                Reached.remove(n)
+                Out = self.Out.get(n,[])
+                Affected.update(Out)
+                Work += [self.Targets[i] for i in Out]
+        Candidates = set([self.Scripts[i] for i in Affected if self.Scripts[i] in self.Creates])
+        return set([s for s in Candidates if not any([self.Live(View,i) for i in self.Creates[s]])])
+
+    def Fail(self,Scripts):
+        '''
+        Takes in the failure of the operations in Scripts, and returns the
+        scripts no longer to be called.
+        '''
+        Links = ListLinks(self.Creates,Scripts)
+        self.Exclude(CHANGED,Links)
+        return self.Exclude(CALLED,Links)
+
+    def Unchanged(self,Paths):
+        '''
+        Takes in that the outputs in Paths are no different from their
+        previous versions, and returns the scripts that now need only have
+        their outputs touched.
+        '''
+        return self.Exclude(CHANGED,ListLinks(self.Out,Paths))
+
+
+def ListLinks(Index,Keys):
+    return [i for k in Keys for i in Index.get(k,[])]
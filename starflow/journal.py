@@ -0,0 +1,112 @@
+'''
+Run journals of update sessions, from which interrupted updates are resumed.
+
+Each update session keeps, in its temp directory,
+
+    PLAN        the pickled arguments of the UpdateLinks call that started it
+                (including the activated link list sequence), written once
+                before any operation is called
+    JOURNAL     an append-only log, one event per line:
+
+                    <time> START <operation>    the operation was launched
+                    <time> COMMIT <operation>   its results were taken in
+                    <time> FAIL <operation>     it failed
+                    <time> RESUME               the session was resumed
+                    <time> END                  the session finished
+
+Every line is flushed to disk before the updater goes on, and a partially
+written last line is ignored when the journal is read, so the journal of a
+session whose driver died at any point says exactly which operations were
+committed, and which were in flight.   Sessions whose journal has no END
+can be resumed (see update.ResumeUpdate, or "starflow update --resume").
+'''
+
+import os
+import time
+import cPickle as pickle
+
+from starflow.utils import PathExists
+
+JOURNALFILE = 'JOURNAL'
+PLANFILE = 'PLAN'
+
+
+def StartJournal(SsTemp,Plan):
+    '''
+    Starts the journal of a new session whose temp directory is SsTemp (which
+    may hold the journal of an old session with the same id).
+    '''
+    F = open(os.path.join(SsTemp,PLANFILE + '.tmp'),'wb')
+    pickle.dump(Plan,F,pickle.HIGHEST_PROTOCOL)
+    F.close()
+    os.rename(os.path.join(SsTemp,PLANFILE + '.tmp'),os.path.join(SsTemp,PLANFILE))
+    F = open(os.path.join(SsTemp,JOURNALFILE),'w')
+    F.close()
+
+
+def Record(SsTemp,Event,j = ''):
+    F = open(os.path.join(SsTemp,JOURNALFILE),'a')
+    F.write(repr(time.time()) + ' ' + Event + (' ' + j if j else '') + '\n')
+    F.flush()
+    os.fsync(F.fileno())
+    F.close()
+
+
+def ReadJournal(SsTemp):
+    '''
+    Events of a session's journal, as (time, event, operation) triples in the
+    order they were recorded.
+    '''
+    JournalFile = os.path.join(SsTemp,JOURNALFILE)
+    if not PathExists(JournalFile):
+        return []
+    Lines = open(JournalFile,'r').read().split('\n')[:-1]
+    Events = []
+    for l in Lines:
+        l = l.split(' ')
+        Events.append((float(l[0]),l[1],l[2] if len(l) > 2 else ''))
+    return Events
+
+
+def LoadPlan(SsTemp):
+    return pickle.load(open(os.path.join(SsTemp,PLANFILE),'rb'))
+
+
+def IsResumable(SsTemp):
+    '''
+    Whether the session with temp directory SsTemp was interrupted, i.e. has
+    a plan and a journal that doesn't end with END.
+    '''
+    if not PathExists(os.path.join(SsTemp,PLANFILE)):
+        return False
+    Events = ReadJournal(SsTemp)
+    return len(Events) > 0 and Events[-1][1] != 'END'
+
+
+def GetResumableSessions(TempFolder):
+    '''
+    Ids of the interrupted sessions whose temp directories are in TempFolder.
+    '''
+    return sorted([int(s) for s in os.listdir(TempFolder) if s.isdigit() and IsResumable(os.path.join(TempFolder,s))])
+
+
+def GetCommitted(Events):
+    '''
+    Operations that were committed or failed, in order, and a dictionary
+    mapping each to its event.
+    '''
+    Ended = [(e,j) for (t,e,j) in Events if e in ['COMMIT','FAIL']]
+    return [[j for (e,j) in Ended],dict([(j,e) for (e,j) in Ended])]
+
+
+def GetInFlight(Events):
+    '''
+    Operations that were started and neither committed nor failed, with the
+    times they were (last) started.
+    '''
+    [Ended,EndedDict] = GetCommitted(Events)
+    Started = {}
+    for (t,e,j) in Events:
+        if e == 'START' and j not in EndedDict:
+            Started[j] = t
+    return Started
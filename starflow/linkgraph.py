@@ -0,0 +1,163 @@
+'''
+Compiled adjacency of link lists, for propagation through them.
+
+Propagating through a link list (see linkmanagement.PropagateSeed and
+linkmanagement.PropagateThroughLinkGraphWithTimes) goes, at each stage, from
+the links activated to the links out of their targets:  the links whose
+source is the target, and, through the target of a CreatedBy link, the links
+whose source contains the target or lies under it (path containment).   A
+LinkGraph holds these once and for all for a link list:
+
+    --the paths (and python names) that are the endpoints of its links, as
+        integer node ids (Names);
+    --the source and target node of each link (Source, Target);
+    --the links out of each node and into each node, in compressed sparse row
+        form (OUT, IN);
+    --for each node, the nodes containing it and the nodes under it,
+        including itself, as path strings (UP, DOWN), also in compressed
+        sparse row form.
+
+so each stage of a propagation is a vectorized lookup of the neighbors of its
+frontier (see Expand), rather than a sort and search over the whole link list.
+
+GetLinkGraph builds the graph of a link list and keeps it, under a fingerprint
+of the link list's endpoints, for the next propagation through the same links
+(e.g. the next update).
+'''
+
+import hashlib
+import numpy
+
+GRAPH_CACHE_SIZE = 8        # link graphs kept for reuse
+OUT = 'out'
+IN = 'in'
+UP = 'up'
+DOWN = 'down'
+
+GRAPHS = []                 # [fingerprint, LinkGraph] of the graphs kept, most recently used last
+
+
+class LinkGraph(object):
+    '''
+    Compiled adjacency of the links in LinkList.
+    '''
+    def __init__(self,LinkList):
+        Endpoints = numpy.append(LinkList['LinkSource'],LinkList['LinkTarget']) if len(LinkList) > 0 else numpy.array([],str)
+        [self.Names,Inverse] = numpy.unique(Endpoints,return_inverse = True)
+        self.Source = Inverse[:len(LinkList)]
+        self.Target = Inverse[len(LinkList):]
+        N = len(self.Names)
+        self.CSR = {OUT:MakeCSR(self.Source,numpy.arange(len(LinkList)),N),
+                    IN:MakeCSR(self.Target,numpy.arange(len(LinkList)),N)}
+
+        #a name taken as a path is along another when the other's components begin it
+        Keys = {}
+        for (n,name) in enumerate(self.Names.tolist()):
+            Keys.setdefault(name if name.endswith('/') else name + '/',[]).append(n)
+        Pairs = []
+        for (key,Nodes) in Keys.items():
+            Parts = key.split('/')
+            for i in range(1,len(Parts)):
+                for m in Keys.get('/'.join(Parts[:i]) + '/',[]):
+                    Pairs += [(n,m) for n in Nodes]
+        Along = numpy.array([p[0] for p in Pairs],int)
+        Containing = numpy.array([p[1] for p in Pairs],int)
+        self.CSR[UP] = MakeCSR(Along,Containing,N)
+        self.CSR[DOWN] = MakeCSR(Containing,Along,N)
+
+    def Nodes(self,Field):
+        '''
+        Node ids of the links' endpoints in Field ('LinkSource' or
+        'LinkTarget').
+        '''
+        return self.Source if Field == 'LinkSource' else self.Target
+
+    def Links(self,Field):
+        '''
+        Adjacency (OUT or IN) giving, for each node, the links with the node
+        as their endpoint in Field.
+        '''
+        return OUT if Field == 'LinkSource' else IN
+
+    def Expand(self,Kind,Nodes):
+        '''
+        Neighbors, in adjacency Kind, of the nodes in the array Nodes:
+        [P,J] where J are the neighbors and P the positions in Nodes of the
+        node each is a neighbor of.
+        '''
+        [Ptr,Idx] = self.CSR[Kind]
+        Nodes = numpy.asarray(Nodes,int)
+        Counts = Ptr[Nodes + 1] - Ptr[Nodes]
+        P = numpy.repeat(numpy.arange(len(Nodes)),Counts)
+        Offsets = numpy.arange(len(P)) - numpy.repeat(Counts.cumsum() - Counts,Counts)
+        return [P,Idx[numpy.repeat(Ptr[Nodes],Counts) + Offsets]]
+
+    def LinksFrom(self,Field,Nodes,Contain = None):
+        '''
+        Links whose endpoint in Field is one of Nodes -- or, with Contain = UP
+        (resp. DOWN), contains (resp. lies under) one of them:  [P,J] where J
+        are the links and P the positions in Nodes that reach them.
+        '''
+        if Contain is not None:
+            [P0,Nodes] = self.Expand(Contain,Nodes)
+        [P,J] = self.Expand(self.Links(Field),Nodes)
+        return [P0[P],J] if Contain is not None else [P,J]
+
+
+def MakeCSR(Rows,Values,N):
+    '''
+    Compressed sparse row form [Ptr,Idx] of the pairs (Rows[k],Values[k]),
+    where N is the number of rows:  the values of row r are
+    Idx[Ptr[r]:Ptr[r+1]], in increasing order.
+    '''
+    Rows = numpy.asarray(Rows,int)
+    Values = numpy.asarray(Values,int)
+    s = numpy.lexsort((Values,Rows))
+    Ptr = numpy.zeros((N + 1,),int)
+    Ptr[1:] = numpy.bincount(Rows,minlength = N).cumsum() if len(Rows) > 0 else 0
+    return [Ptr,Values[s]]
+
+
+def GroupBy(P,J):
+    '''
+    Groups the pairs (P[k],J[k]) by J:  a list of (j,[p, ...]), in
+    increasing order of j, with the p of each in increasing order and
+    without repeats.
+    '''
+    if len(J) == 0:
+        return []
+    s = numpy.lexsort((P,J))
+    P = P[s]; J = J[s]
+    Keep = numpy.append([True],(J[1:] != J[:-1]) | (P[1:] != P[:-1]))
+    P = P[Keep]; J = J[Keep]
+    Starts = numpy.append([0],(J[1:] != J[:-1]).nonzero()[0] + 1)
+    Ends = numpy.append(Starts[1:],[len(J)])
+    J = J.tolist()
+    return [(J[a],P[a:b]) for (a,b) in zip(Starts.tolist(),Ends.tolist())]
+
+
+def Fingerprint(LinkList):
+    '''
+    Fingerprint of the endpoints of the links in LinkList, in order.
+    '''
+    H = hashlib.sha1(str(len(LinkList)))
+    for f in ['LinkSource','LinkTarget']:
+        H.update(str(LinkList.dtype[f]))
+        H.update(numpy.ascontiguousarray(LinkList[f]).tostring())
+    return H.hexdigest()
+
+
+def GetLinkGraph(LinkList):
+    '''
+    The LinkGraph of LinkList, built only if no graph of the same links is
+    kept.
+    '''
+    Key = Fingerprint(LinkList)
+    for (i,(k,G)) in enumerate(GRAPHS):
+        if k == Key:
+            GRAPHS.append(GRAPHS.pop(i))
+            return G
+    G = LinkGraph(LinkList)
+    GRAPHS.append((Key,G))
+    del GRAPHS[:-GRAPH_CACHE_SIZE]
+    return G
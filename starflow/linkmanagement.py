@@ -13,23 +13,34 @@
 '''
 
 import os
+import sys
 import re
 import traceback
 import subprocess
 import time
+import select
+import cPickle
+import multiprocessing
 import numpy
 
 from starflow.utils import *
 from starflow.metadata import FindPtime
 from starflow.storage import *
 import starflow.de as de
+import starflow.tracing as tracing
+from starflow.linkstore import LinkStore, MakeLinkList, MakeEndpoints, LINK_FIELDS, STORE_VERSION
+from starflow.linkgraph import GetLinkGraph, GroupBy, UP, DOWN
 
 DE_MANAGER = de.DataEnvironmentManager()
 WORKING_DE = DE_MANAGER.working_de
 
+EXTRACTION_POLL = .5                # longest time, in seconds, between checks on the modules whose links are being computed
+EXTRACTION_REPORT_INTERVAL = 10     # seconds between reports on the progress of computing links
+
 isnan = numpy.isnan
 nan = numpy.nan
 
+@tracing.traced
 def LinksFromOperations(FileList,Aliases = None, AddImplied = False, 
                         AddDummies = False, FilterInternal = True, 
                         FilterNEs = True, Recompute=False,
@@ -40,8 +51,9 @@ def LinksFromOperations(FileList,Aliases = None, AddImplied = False,
     Analyzes a set of python modules to find data dependency links present in the 
     modules.   Overall, this function does two things:  
     
-    1) it writes out files that cache the links computed, and uses these cached 
-        versions to increase speed when the function is called again;
+    1) it caches the links computed in the link store of the data environment
+        (see linkstore.py), recomputing only the links of modules that changed 
+        since, and of modules that are gone, when the function is called again;
     and
     
     2) it returns the list of links, as a numpy record array.  
@@ -62,55 +74,90 @@ def LinksFromOperations(FileList,Aliases = None, AddImplied = False,
     where A is a numpy array describing the LinkList 
     '''
 
-    #load up cached linklists
+    Store = LinkStore(WORKING_DE.links_dir)
+    try:
+        LinksToReturn = RefreshLinkStore(Store,FileList,AddImplied,AddDummies,Recompute)
+    finally:
+        Store.Close()
+
+    FileArray = numpy.array(FileList)
+    if len(LinksToReturn) > 0 and FilterNEs:
+        LinksToReturn = LinksToReturn[LinksToReturn['SourceFile'] != 'NOTEXIST']
+
+    if len(LinksToReturn) > 0 and FilterInternal:
+        LinksToReturn = LinksToReturn[(LinksToReturn['LinkType'] != 'Uses') | fastisin(LinksToReturn['SourceFile'],FileArray)]
+    
+    return LinksToReturn
     
-    STORED_LINKS_FILE = os.path.join(WORKING_DE.links_dir,'StoredLinks')
-    if not PathExists(STORED_LINKS_FILE):
-        names = ['LinkType','LinkSource','SourceFile','LinkTarget','TargetFile','UpdateScript','UpdateScriptFile','IsFast']
-        StoredLinks = numpy.rec.fromarrays([[],[],[],[],[],[],[],[]],names=names, formats = ['int']*len(names))
-    else:
-        StoredLinks = numpy.load(STORED_LINKS_FILE)
 
+def RefreshLinkStore(Store,FileList,AddImplied,AddDummies,Recompute):
+    '''
+    Recomputes the links of the modules that changed since their links were 
+    stored in Store (a linkstore.LinkStore), replaces them and the implied 
+    and dummy links they induce in Store, and returns the stored links of the 
+    modules in FileList (see LinksFromOperations).
+    
+    Computing links (importing and analyzing modules) can take long, so it's 
+    done with no transaction open on Store, and other sessions can refresh 
+    the store meanwhile.   The changes are then made in one transaction, in 
+    which the modules to refresh are determined again:  if some of them 
+    weren't computed (or have changed since), the transaction is given up, 
+    their links are computed, and it's tried again. 
+    '''
+    
+    Computed = {}       #module -> [its modification time when its links were computed, its links or None if they couldn't be]
+    while True:
+        Store.Begin()
+        try:
+            [Gone,ToGet,Modified] = GetModulesToRefresh(Store,FileList,Recompute)
+            Missing = [f for f in ToGet if f not in Computed or GetModTime(f) != Computed[f][0]]
+            if len(Missing) == 0:
+                LinksToReturn = ApplyRefresh(Store,FileList,AddImplied,AddDummies,Gone,ToGet,Modified,Computed)
+                Store.Commit()
+                return LinksToReturn
+        except:
+            Store.Rollback()
+            raise
+        Store.Rollback()
+        
+        #actually recompute links for selected modules
+        Times = dict([(f,GetModTime(f)) for f in Missing])
+        [LinksToAdd,SucceededList] = ComputeLinksFromOperations(Missing)
+        for f in Missing:
+            Computed[f] = [Times[f],(LinksToAdd[LinksToAdd['UpdateScriptFile'] == f] if len(LinksToAdd) > 0 else LinksToAdd) if f in SucceededList else None]
 
-    STORED_TIMES_FILE = os.path.join(WORKING_DE.links_dir,'StoredTimes') 
-    if not PathExists(STORED_TIMES_FILE):
-        names = ['FileName','ModTime']
-        StoredTimes = numpy.rec.fromarrays([[],[]],names=names, formats = ['int']*len(names))
-    else:
-        StoredTimes = numpy.load(STORED_TIMES_FILE)    
-           
+
+def GetModTime(f):
+    return os.path.getmtime(f) if PathExists(f) else None
+
+
+def GetModulesToRefresh(Store,FileList,Recompute):
+    '''
+    Returns [Gone,ToGet,Modified]:  the modules in Store that are gone, those 
+    whose links are to be computed, and those stored that were modified since 
+    their links were. 
+    '''
+    
     #only retain links from py files that still exist
-    if len(StoredLinks) > 0:
-        scriptfiles = uniqify(StoredLinks['UpdateScriptFile'].tolist() + StoredTimes['FileName'].tolist() + StoredLinks[StoredLinks['LinkType'] == 'Uses']['SourceFile'].tolist())
-    else:
-        scriptfiles = []
+    StoredTimes = Store.Times()
+    scriptfiles = uniqify(Store.Distinct('links','UpdateScriptFile') + StoredTimes['FileName'].tolist() + Store.Distinct('links','SourceFile',"LinkType = 'Uses' AND SourceFile != 'NOTEXIST'"))
     ExistsDict = dict([(scriptfile,PathExists(scriptfile)) for scriptfile in scriptfiles])
-    Retain = [i for i in range(len(StoredLinks)) if ExistsDict[StoredLinks['UpdateScriptFile'][i]]]
-    ToDelete = numpy.ones((len(StoredLinks),),bool); ToDelete[Retain] = False; StoredLinksDeleted = StoredLinks[ToDelete]
-    
-    StoredLinksFiltered = StoredLinks[Retain] 
-    Changes = len(StoredLinksFiltered) < len(StoredLinks)
-    if len(StoredTimes):
-        StoredTimesFiltered = StoredTimes[[i for i in range(len(StoredTimes)) if ExistsDict[StoredTimes['FileName'][i]]]]
-    else:
-        StoredTimesFiltered = StoredTimes[0:0] 
+    Gone = [f for f in scriptfiles if not ExistsDict[f]]
+    StoredTimesFiltered = StoredTimes[[ExistsDict[f] for f in StoredTimes['FileName']]] if len(StoredTimes) > 0 else StoredTimes[0:0]
     
     #sort by updatescriptfile   
     StoredTimesFiltered.sort(order=['FileName'])    
-    FileArray = numpy.array(FileList)
+    FileArray = numpy.array(FileList,str)
     FileArray.sort()
 
     A = fastisin(FileArray,StoredTimesFiltered['FileName'])
     CurrentTimes = numpy.array([os.path.getmtime(x) for x in StoredTimesFiltered['FileName']])
     B = CurrentTimes > StoredTimesFiltered['ModTime']
     
-    if len(StoredLinksFiltered) > 0:
-        NE = StoredLinksFiltered[StoredLinksFiltered['SourceFile'] == 'NOTEXIST'][['LinkSource','TargetFile']]
-        NE = [x['TargetFile'] for x in NE if x['TargetFile'] in FileArray and any([IsFile('../' + '/'.join(x['LinkSource'].split('.')[:j]) + '.py') for j in range(1,len(x['LinkSource'].split('.')))])]
-        DE = [x['TargetFile'] for x in StoredLinksFiltered[(StoredLinksFiltered['LinkType'] == 'Uses') & (StoredLinksFiltered['SourceFile'] != 'NOTEXIST')] if not ExistsDict[x['SourceFile']]]
-    else:
-        NE = []
-        DE = [] 
+    NE = Store.Links('links',"SourceFile = 'NOTEXIST'")
+    NE = [x['TargetFile'] for x in NE if x['TargetFile'] in FileArray and any([IsFile('../' + '/'.join(x['LinkSource'].split('.')[:j]) + '.py') for j in range(1,len(x['LinkSource'].split('.')))])]
+    DE = Store.LinksOf('links','SourceFile',[f for f in Gone if f != 'NOTEXIST'])
+    DE = DE[DE['LinkType'] == 'Uses']['TargetFile'].tolist() if len(DE) > 0 else []
     
     #determine which modules to recompute links about . 
     if Recompute:
@@ -119,103 +166,129 @@ def LinksFromOperations(FileList,Aliases = None, AddImplied = False,
         ToGet = uniqify(FileArray[numpy.invert(A)].tolist() + StoredTimesFiltered['FileName'][B].tolist() + NE + DE)
         
     ToGet = [t for t in ToGet if not t.endswith('__init__.py')]
+
+    return [Gone,ToGet,StoredTimesFiltered['FileName'][B].tolist()]
+
+
+def ApplyRefresh(Store,FileList,AddImplied,AddDummies,Gone,ToGet,Modified,Computed):
+    '''
+    Makes the changes of a refresh of Store (in a transaction), with the 
+    links Computed of the modules in ToGet (see RefreshLinkStore), and 
+    returns the stored links of the modules in FileList. 
+    '''
     
-    #actually recompute links for selected modules
-    [LinksToAdd,SucceededList] = ComputeLinksFromOperations(ToGet)
-           
-    #integrate resulting links into cached linklists    
-    TimesToAdd = numpy.rec.fromarrays([SucceededList, [os.path.getmtime(x) for x in SucceededList]],names=['FileName','ModTime'])
-    NewTimes = SimpleStack([StoredTimesFiltered[numpy.invert(B)],TimesToAdd])   
-    LinksToAdd.sort(order=['UpdateScriptFile'])
-    C = fastisin(StoredLinksFiltered['UpdateScriptFile'],LinksToAdd['UpdateScriptFile'])    
-
-    if any(C):
-        StoredLinksDeleted = SimpleStack([StoredLinksDeleted,StoredLinksFiltered[C]])
-    
-    RetainedLinks = StoredLinksFiltered[numpy.invert(C)]
-    if len(LinksToAdd) > 0:
-        NewLinks = SimpleStack([RetainedLinks,LinksToAdd])
-    else:
-        NewLinks = StoredLinksFiltered
-    Changes = Changes or len(LinksToAdd) > 0    
-    if Changes:
-        NewLinks.dump(STORED_LINKS_FILE)
-    NewTimes.dump(STORED_TIMES_FILE)
-    
-
-    #handle creation of Implied Links
-    STORED_IMPLIED_FILE = os.path.join(WORKING_DE.links_dir,'StoredImpliedLinks')
-    if not PathExists(STORED_IMPLIED_FILE):
-        names = ['LinkType','LinkSource','SourceFile','LinkTarget','TargetFile','UpdateScript','UpdateScriptFile','IsFast']
-        StoredImpliedLinks = numpy.rec.fromarrays([[],[],[],[],[],[],[],[]],names=names, formats = ['int']*len(names))
-    else:
-        StoredImpliedLinks = numpy.load(STORED_IMPLIED_FILE)
-    ImpliedAdded = GetImpliedLinks(LinksToAdd,RetainedLinks)
-    ImpliedDeleted = GetImpliedLinks(StoredLinksDeleted,StoredLinks)
-    ImpliedNew = SimpleStack([FastRecarrayDifference(StoredImpliedLinks,ImpliedDeleted),ImpliedAdded])
-    ImpliedNew.dump(STORED_IMPLIED_FILE)
-    
-    #handle creation of Dummy Links
-    STORED_DUMMY_FILE = os.path.join(WORKING_DE.links_dir,'StoredDummyLinks') 
-    if not PathExists(STORED_DUMMY_FILE):
-        names = ['LinkType','LinkSource','SourceFile','LinkTarget','TargetFile','UpdateScript','UpdateScriptFile','IsFast']
-        StoredDummyLinks = numpy.rec.fromarrays([[],[],[],[],[],[],[],[]],names=names, formats = ['int']*len(names))
-    else:
-        StoredDummyLinks = numpy.load(STORED_DUMMY_FILE)
-    TT = time.time()
-    DummyAdded = GetDummyLinks(LinksToAdd,RetainedLinks)
-    DummyDeleted = GetDummyLinks(StoredLinksDeleted,StoredLinks)
-    DummyNew = SimpleStack([FastRecarrayDifference(StoredDummyLinks,DummyDeleted),DummyAdded])
-    DummyNew.dump(STORED_DUMMY_FILE)
+    SucceededList = [f for f in ToGet if Computed[f][1] is not None]
+    LinksToAdd = SimpleStack1([Computed[f][1] for f in SucceededList]) if len(SucceededList) > 0 else MakeLinkList([])
     
+    #replace the stored links of the modules that are gone or were recomputed (even if they now have none)
+    Replaced = uniqify(Gone + SucceededList)
+    if len(Replaced) > 0:
+        StoredLinksDeleted = Store.LinksOf('links','UpdateScriptFile',Replaced)
+        Store.RemoveModules('links',Replaced)
+        Store.AddLinks('links',LinksToAdd)
+
+    #handle creation of Implied and Dummy Links
+    if Store.Version() < STORE_VERSION:
+        RebuildDerivedLinks(Store)
+    elif len(Replaced) > 0:
+        RefreshImpliedLinks(Store,Replaced,StoredLinksDeleted,LinksToAdd)
+        RefreshDummyLinks(Store,Replaced,StoredLinksDeleted,LinksToAdd)
+
+    #modules whose links couldn't be recomputed are tried again next time
+    Store.RemoveTimes(uniqify(Gone + Modified))
+    Store.SetTimes(SucceededList,[Computed[f][0] for f in SucceededList])
     
     #determine which links to return (ALL links are cached, but only those desired related to the user specified FileList are actually returned by this function)
-    D = fastisin(NewLinks['UpdateScriptFile'],FileArray)
-    LinksToReturn = NewLinks[D]
+    LinksToReturn = Store.LinksOf('links','UpdateScriptFile',FileList)
     if AddImplied:
-        LinksToReturn = SimpleStack1([LinksToReturn,ImpliedNew])
+        LinksToReturn = SimpleStack1([LinksToReturn,Store.Links('implied')])
 
     if AddDummies:
-        D = fastisin(DummyNew['TargetFile'],FileArray)
-        LinksToReturn = SimpleStack1([LinksToReturn,DummyNew[D]])
-
-    if len(LinksToReturn) > 0 and FilterNEs:
-        LinksToReturn = LinksToReturn[LinksToReturn['SourceFile'] != 'NOTEXIST']
+        LinksToReturn = SimpleStack1([LinksToReturn,Store.LinksOf('dummy','TargetFile',FileList)])
 
-    if len(LinksToReturn) > 0 and FilterInternal:
-        LinksToReturn = LinksToReturn[(LinksToReturn['LinkType'] != 'Uses') | fastisin(LinksToReturn['SourceFile'],FileArray)]
-    
     return LinksToReturn
     
     
 
+def RebuildDerivedLinks(Store):
+    '''
+    Computes the implied and dummy links in Store again from all its links.
+    '''
+    AllLinks = Store.Links('links')
+    Store.Clear('implied')
+    Store.Clear('dummy')
+    Store.AddLinks('implied',GetImpliedLinks(AllLinks,AllLinks[0:0]))
+    Store.AddLinks('dummy',GetDummyLinks(AllLinks,AllLinks[0:0]))
+    Store.SetVersion(STORE_VERSION)
+
+
+def RefreshImpliedLinks(Store,Replaced,Deleted,Added):
+    '''
+    Brings the implied links in Store up to date after the links of the 
+    modules in Replaced, Deleted, were replaced in it by the links Added.
+    
+    An implied link comes of a CreatedBy link and an object at an end of 
+    some link whose path is along the created one, so the implied links 
+    replaced are those of the creates of the replaced modules, and those to 
+    the objects named in Deleted or Added, each computed again against all 
+    the stored links.
+    '''
+    Store.RemoveModules('implied',Replaced)
+    Touched = Endpoints(SimpleStack([Deleted,Added]))
+    Store.RemoveEnds('implied','Target',Touched['Object'],Touched['ObjectFile'])
+
+    #objects still named, against the creates of paths they're along
+    Present = Store.Appearing(Touched['Object'],Touched['ObjectFile'])
+    Creates = CreateLinks(Store.LinksOf('links','TargetFile',PathAncestors(Present['ObjectFile'])))
+    New = [ImpliedJoin(Creates,Present)]
+    
+    #new creates, against the objects along what they create
+    Creates = CreateLinks(Added)
+    New += [ImpliedJoin(Creates,Store.EndpointsIn(*PathIntervals(Creates['TargetFile'])))]
+
+    Store.AddLinks('implied',UniqueLinks(SimpleStack(New)))
+
+
+def RefreshDummyLinks(Store,Replaced,Deleted,Added):
+    '''
+    Brings the dummy links in Store up to date after the links of the 
+    modules in Replaced, Deleted, were replaced in it by the links Added.
+    
+    A dummy link comes of a created path and an outermost create of some 
+    script (see Outermost) one level below it, so the dummy links replaced 
+    are those to the scripts of the replaced modules, and those from the 
+    paths created in Deleted or Added, each computed again against all the 
+    stored creates.
+    '''
+    Store.RemoveModules('dummy',Replaced,'TargetFile')
+    Touched = CreateTargets(SimpleStack([CreateLinks(Deleted),CreateLinks(Added)]))
+    Store.RemoveEnds('dummy','Source',DummyNames(Touched['LinkTarget']),DummyNames(Touched['TargetFile']))
+
+    #paths still created, however written (their dummy names are alike), against the outermost creates one level below them
+    Keys = PathKeys(Touched['LinkTarget'])
+    Present = CreateTargets(CreateLinks(Store.LinksOf('links','LinkTarget',ListUnion([[k[:-1],k] for k in Keys]))))
+    Below = CreateLinks(Store.LinksIn('links','TargetFile',*PathIntervals(Present['TargetFile'])))
+    Scripts = CreateLinks(Store.LinksOf('links','UpdateScriptFile',numpy.unique(Below['UpdateScriptFile'])))
+    New = [DummyJoin(Present,Outermost(Scripts))]
+    
+    #new outermost creates, against the created paths one level above them
+    Outer = Outermost(CreateLinks(Added))
+    Above = CreateTargets(CreateLinks(Store.LinksOf('links','TargetFile',PathAncestors(Outer['LinkTarget']))))
+    New += [DummyJoin(Above,Outer)]
+
+    Store.AddLinks('dummy',UniqueLinks(SimpleStack(New)))
+
+
 def GetImpliedLinks(NewLinks, LinkList):
     '''This computes the implied links --- assuming that all implied links in the "LinkList" argument have already by computed, it only computes the implied links that will be added by the addition of the NewLinks.   
+    
+    Paths are compared as getpathalong compares them (see PathIndex).   This changes results from earlier versions, which missed the paths along a create sorting differently with and without a trailing '/' than some other create:  e.g. with creates '../Data/d/' and '../Data/d-e', the implied link from '../Data/d-e' to '../Data/d-e/x' is now found. 
     '''
     
     if len(NewLinks)>0:
-        NL = NewLinks.copy()
-        All = SimpleStack1([NL,LinkList])
-            
-        NewRecs = []
-        for (S,T) in [(NL,All),(All,NL)]:
-            TT = T[T['LinkType'] == 'CreatedBy'].copy()
-            if len(S) > 0 and len(TT) > 0:
-                L1 = numpy.rec.fromrecords(uniqify(zip(TT['LinkTarget'],TT['TargetFile'],TT['UpdateScript'],TT['UpdateScriptFile'])),names=['Object','ObjectFile','Script','ScriptFile'])
-                L1.sort(order = ['ObjectFile'])
-                L2 = numpy.rec.fromrecords(uniqify(zip(S['LinkSource'],S['SourceFile'])) + uniqify(zip(S['LinkTarget'],S['TargetFile'])),names=['Object','ObjectFile'])
-                L2.sort(order = ['ObjectFile'])
-                [A,B] = getpathalong(L1['ObjectFile'],L2['ObjectFile'])
-                F1 = [range(A[i],B[i]) for i in range(len(L1))]
-                NewRecs += ListUnion([[('Implied',L1['Object'][i],L1['ObjectFile'][i],L2['Object'][j],L2['ObjectFile'][j],L1['Script'][i],L1['ScriptFile'][i],0) for j in F1[i]] for i in range(len(F1))])
-                
-        if len(NewRecs) > 0:
-            NR =  numpy.rec.fromrecords(uniqify(NewRecs),names=LinkList.dtype.names)
-            NRs = numpy.array([n if n[-1] == '/' else n + '/' for n in NR['LinkSource']])
-            NRt = numpy.array([n if n[-1] == '/' else n + '/' for n in NR['LinkTarget']])
-            return NR[NRs != NRt]
-        else:
-            return LinkList[0:0]
+        All = SimpleStack([NewLinks,LinkList])
+        NewRecs = [ImpliedJoin(CreateLinks(NewLinks),Endpoints(All)),ImpliedJoin(CreateLinks(All),Endpoints(NewLinks))]
+        return UniqueLinks(SimpleStack(NewRecs))
     else:
         return LinkList[0:0]
         
@@ -235,45 +308,138 @@ def GetDummyLinks(NewLinks,LinkList):
     '''
 
     if len(NewLinks) > 0:
-        Total = SimpleStack([NewLinks,LinkList])
-
-        NewC = NewLinks[NewLinks['LinkType'] == 'CreatedBy'].copy()
-        TotalC = Total[Total['LinkType'] == 'CreatedBy']
-
-        if len(NewC) > 0:
-            NewRecs = []
-            for (NL,AllC) in [(NewC,TotalC),(TotalC,NewC)]:         
-                L1 = numpy.rec.fromrecords(uniqify(zip(AllC['LinkTarget'],AllC['TargetFile'])),names = ['LinkTarget','TargetFile'])
-                L2 = numpy.rec.fromrecords(uniqify(zip(NL['LinkTarget'],NL['TargetFile'],NL['UpdateScript'],NL['UpdateScriptFile'])),names = ['LinkTarget','TargetFile','UpdateScript','UpdateScriptFile'])
-                            
-                C = numpy.array([a + ' ; ' + b for (a,b) in zip(L2['UpdateScript'],L2['TargetFile'])])
-                s = C.argsort(); C = C[s]; L2 = L2[s]
-                [A,B] = getpathstrictlyalong(C,C)
-                G = numpy.array(ListUnion([range(a,b) for (a,b) in zip(A,B)])); G.sort()
-                D = numpy.arange(len(L2))
-                L2 = L2[numpy.invert(fastisin(D,G))]
-        
-                [s1,s2,A,B] = getKalong(L1['LinkTarget'],L2['LinkTarget'],1)
-                L1 = L1[s1]; L2 = L2[s2]
-                NewRecs += ListUnion([[('Dummy',Backslash(L1['LinkTarget'][i]) + 'dummy',Backslash(L1['TargetFile'][i])+'dummy', L2['UpdateScript'][j],L2['UpdateScriptFile'][j],'None','None',0) for j in range(A[i],B[i])] for i in range(len(A))])           
-
-            if len(NewRecs) > 0:    
-                NR =  numpy.rec.fromrecords(uniqify(NewRecs),names=LinkList.dtype.names)
-                return NR[NR['LinkSource'] != NR['LinkTarget']]
-            else:
-                return LinkList[0:0]
-        else:
-            return LinkList[0:0]
+        NewC = CreateLinks(NewLinks)
+        TotalC = CreateLinks(SimpleStack([NewLinks,LinkList]))
+        NewRecs = [DummyJoin(CreateTargets(TotalC),Outermost(NewC)),DummyJoin(CreateTargets(NewC),Outermost(TotalC))]
+        return UniqueLinks(SimpleStack(NewRecs))
     else:
         return LinkList[0:0]
 
 
+def ImpliedJoin(Creates,Objects):
+    '''
+    Implied links from the targets of the CreatedBy links Creates to the 
+    objects in Objects (see Endpoints) whose paths are along them.
+    '''
+    Creates = UniqueFields(Creates,['LinkTarget','TargetFile','UpdateScript','UpdateScriptFile'])
+    [P,J] = PathIndex(Objects['ObjectFile']).Below(Creates['TargetFile'])
+    NR = MakeLinks('Implied',Creates['LinkTarget'][P],Creates['TargetFile'][P],Objects['Object'][J],Objects['ObjectFile'][J],Creates['UpdateScript'][P],Creates['UpdateScriptFile'][P])
+    return NR[PathKeys(NR['LinkSource']) != PathKeys(NR['LinkTarget'])]
+
+
+def DummyJoin(Targets,Outer):
+    '''
+    Dummy links from the created paths Targets (see CreateTargets) to the 
+    scripts of the creates in Outer one level below them.
+    '''
+    [P,J] = PathIndex(Outer['LinkTarget']).Below(Targets['LinkTarget'],Levels = 1)
+    NR = MakeLinks('Dummy',DummyNames(Targets['LinkTarget'][P]),DummyNames(Targets['TargetFile'][P]),Outer['UpdateScript'][J],Outer['UpdateScriptFile'][J],'None','None')
+    return NR[NR['LinkSource'] != NR['LinkTarget']]
+
+
+def Outermost(Creates):
+    '''
+    The CreatedBy links among Creates (fields LinkTarget, TargetFile, 
+    UpdateScript and UpdateScriptFile, without repeats) whose target isn't 
+    strictly along another target of the same script.
+    '''
+    Creates = UniqueFields(Creates,['LinkTarget','TargetFile','UpdateScript','UpdateScriptFile'])
+    C = numpy.char.add(numpy.char.add(Creates['UpdateScript'],' ; '),Creates['TargetFile'])
+    Inner = numpy.zeros((len(Creates),),bool)
+    Inner[PathIndex(C).Below(C,Strict = True)[1]] = True
+    return Creates[numpy.invert(Inner)]
+
+
+def CreateLinks(LinkList):
+    '''
+    The CreatedBy links in LinkList.
+    '''
+    if len(LinkList) == 0:
+        return MakeLinkList([('','','','','','','',0)])[0:0]
+    return LinkList[LinkList['LinkType'] == 'CreatedBy']
+
+
+def CreateTargets(Creates):
+    '''
+    The created paths (fields LinkTarget and TargetFile, without repeats) of 
+    the CreatedBy links Creates.
+    '''
+    return UniqueFields(Creates,['LinkTarget','TargetFile'])
+
+
+def Endpoints(LinkList):
+    '''
+    The objects (Object) at the ends of the links in LinkList, with their 
+    paths (ObjectFile), without repeats.
+    '''
+    if len(LinkList) == 0:
+        return MakeEndpoints([])
+    E = numpy.rec.fromarrays([numpy.append(LinkList['LinkSource'],LinkList['LinkTarget']),numpy.append(LinkList['SourceFile'],LinkList['TargetFile'])],names = ['Object','ObjectFile'])
+    return numpy.unique(E)
+
+
+def UniqueFields(LinkList,Fields):
+    '''
+    Record array of the Fields of the links in LinkList, without repeats.
+    '''
+    return numpy.unique(numpy.rec.fromarrays([numpy.asarray(LinkList[f],str) for f in Fields],names = Fields))
+
+
+def UniqueLinks(LinkList):
+    return numpy.unique(LinkList) if len(LinkList) > 0 else LinkList
+
+
+def MakeLinks(LinkType,LinkSource,SourceFile,LinkTarget,TargetFile,UpdateScript,UpdateScriptFile):
+    '''
+    Link list of the links with the given fields, each a numpy array or a 
+    string for all the links.
+    '''
+    N = len(LinkSource)
+    if N == 0:
+        return MakeLinkList([])
+    Columns = [numpy.array([c] * N) if isinstance(c,str) else c for c in [LinkType,LinkSource,SourceFile,LinkTarget,TargetFile,UpdateScript,UpdateScriptFile]]
+    return numpy.rec.fromarrays(Columns + [numpy.zeros((N,),int)],names = LINK_FIELDS)
+
+
+def DummyNames(Paths):
+    '''
+    Names of the dummy objects in the directories Paths.
+    '''
+    return numpy.char.add(PathKeys(Paths),'dummy') if len(Paths) > 0 else numpy.array([],str)
+
+
+def PathAncestors(Paths):
+    '''
+    The paths, as they may be written, that some path in Paths is along:  
+    each directory level of each path, with and without a trailing '/'.
+    '''
+    Parts = [p.split('/') for p in PathKeys(Paths)]
+    return uniqify(ListUnion([[s for j in range(1,len(P)) for s in ['/'.join(P[:j]),'/'.join(P[:j]) + '/']] for P in Parts]))
+
+
+def PathIntervals(Paths):
+    '''
+    [Lower,Upper] such that the paths along Paths[i], however written, lie 
+    between Lower[i] (included) and Upper[i] (excluded) -- among others, to 
+    be told apart with a PathIndex.
+    '''
+    Keys = [k[:-1] for k in PathKeys(Paths)]
+    return [Keys,[k + '0' for k in Keys]]
+
+
 
 def GutsComputeLinks(FileList):
     '''
         This function actually computes the links contained
         in the files in FileList
         
+        The modules are analyzed link_jobs at a time (see the global 
+        settings), each in a process of its own (see ExtractInProcesses), so 
+        that one module's imports can't affect another's analysis, and a 
+        module whose analysis crashes, or takes longer than link_timeout 
+        seconds, counts only as failing to load.   With link_jobs = 1, or a 
+        single module, they are analyzed in turn in this process.
+        
         Argument: 
         FileList == list of modules to analysis
         
@@ -286,37 +452,164 @@ def GutsComputeLinks(FileList):
     LinkList = []; #<-- initialize
     SucceededList = []
 
-    for opfile in FileList:  #<-- for each op in the list of operations,     
-        StoredModule = GetStoredModule(opfile)  #<-- get stored version of information about the module -- GetStoredModules is defined in ../System/MetaData.py, see that for information.
-        if StoredModule:   #<-- if stored version f information is sucessfully obtained,  go ahead
-            SucceededList += [opfile]   
-            ModuleName = '.'.join(opfile.split('/')[1:-1] + [inspect.getmodulename(opfile)])    #get name of module from file name, assuming it's in the system standard convention formation, starting with '../' relative to Temp directory
-            for op in StoredModule.keys():   #for each function  or class defined in the stored module: 
-                if StoredModule[op].descr == 'Internal Function' or  StoredModule[op].descr == 'Internal Class':    
-                    opn = StoredModule[op].reconstitute()   #reconstitute the object, 
-                    opname = ModuleName + '.' + op     
-                    if StoredModule[op].descr == 'Internal Function':    # if its a function, strip out depends_on and creates  and uses notations  and produce links from them
-                        DependsOn = MakeT(GetStoredDefaultVal(opn,'depends_on',NoVal = ())) + MakeT(GetStoredAttributes(opn,'__depends_on__',NoVal = ()))
-                        Creates = MakeT(GetStoredDefaultVal(opn,'creates',NoVal = ())) + MakeT(GetStoredAttributes(opn,'__creates__',NoVal = ())) 
-                        IsFast = GetStoredDefaultVal(opn,'IsFast',NoVal = 0) or GetStoredAttributes(opn,'__is_fast__',NoVal = 0) 
-                        LinkList += [('CreatedBy',opname,opfile,b,b,opname,opfile,IsFast) for b in Creates]
-                        LinkList += [('DependsOn',a,a,opname,opfile,'None',opfile,IsFast) for a in DependsOn]
-                        SpecifiedUses = [(u,'../' + '/'.join(u.split('.')[:-1]) + '.py') if isinstance(u,str) else u for u in MakeT(GetStoredDefaultVal(opn,'uses',NoVal = ())) + MakeT(GetStoredAttributes(opn,'__uses__',NoVal = ()))]
-                        
-                    else:
-                        SpecifiedUses = []
-                        IsFast = 0
-                    ComputedUses = StoredModule[op].static    #get system-computed Uses links determined by static analysis  on the funciton -- which is included in the StoredModule 
-                    Uses = SpecifiedUses + (ComputedUses[0] if ComputedUses != None else [])  #add the system-computed Uses to the user-declared ones
-                    OpPaths = [['../' + '/'.join(a[0].split('.')[:j]) + '.py' for j in range( 1, len(a[0].split('.'))) if IsFile('../' + '/'.join(a[0].split('.')[:j]) + '.py')] for a in Uses]
-                    OpPaths = [x[0] if x else 'NOTEXIST' for x in OpPaths]
-                    LinkList += [('Uses',a[0],oppath,opname,opfile,'None',opfile,IsFast) for (a,oppath) in zip(Uses,OpPaths) if a[0] != opname]   #and produce Uses links from them
+    Jobs = min(DE_MANAGER.link_jobs or multiprocessing.cpu_count(),len(FileList))
+    if Jobs > 1:
+        Found = ExtractInProcesses(FileList,Jobs,DE_MANAGER.link_timeout)
+    else:
+        Found = ExtractInTurn(FileList)
+
+    for (opfile,Links) in zip(FileList,Found):
+        if Links is not None:
+            SucceededList += [opfile]
+            LinkList += Links
         else:
             print  'No links for ', opfile, 'being processed because module failed to load properly.'
             
     return [LinkList,SucceededList]
 
 
+def ModuleLinks(opfile):
+    '''
+        Links contained in the module opfile, as a list of tuples, or None if 
+        the module failed to load properly.
+    '''
+    LinkList = []
+    StoredModule = GetStoredModule(opfile)  #<-- get stored version of information about the module -- GetStoredModules is defined in ../System/MetaData.py, see that for information.
+    if not StoredModule:
+        return None
+    ModuleName = '.'.join(opfile.split('/')[1:-1] + [inspect.getmodulename(opfile)])    #get name of module from file name, assuming it's in the system standard convention formation, starting with '../' relative to Temp directory
+    for op in StoredModule.keys():   #for each function  or class defined in the stored module: 
+        if StoredModule[op].descr == 'Internal Function' or  StoredModule[op].descr == 'Internal Class':    
+            opn = StoredModule[op].reconstitute()   #reconstitute the object, 
+            opname = ModuleName + '.' + op     
+            if StoredModule[op].descr == 'Internal Function':    # if its a function, strip out depends_on and creates  and uses notations  and produce links from them
+                DependsOn = MakeT(GetStoredDefaultVal(opn,'depends_on',NoVal = ())) + MakeT(GetStoredAttributes(opn,'__depends_on__',NoVal = ()))
+                Creates = MakeT(GetStoredDefaultVal(opn,'creates',NoVal = ())) + MakeT(GetStoredAttributes(opn,'__creates__',NoVal = ())) 
+                IsFast = GetStoredDefaultVal(opn,'IsFast',NoVal = 0) or GetStoredAttributes(opn,'__is_fast__',NoVal = 0) 
+                LinkList += [('CreatedBy',opname,opfile,b,b,opname,opfile,IsFast) for b in Creates]
+                LinkList += [('DependsOn',a,a,opname,opfile,'None',opfile,IsFast) for a in DependsOn]
+                SpecifiedUses = [(u,'../' + '/'.join(u.split('.')[:-1]) + '.py') if isinstance(u,str) else u for u in MakeT(GetStoredDefaultVal(opn,'uses',NoVal = ())) + MakeT(GetStoredAttributes(opn,'__uses__',NoVal = ()))]
+                
+            else:
+                SpecifiedUses = []
+                IsFast = 0
+            ComputedUses = StoredModule[op].static    #get system-computed Uses links determined by static analysis  on the funciton -- which is included in the StoredModule 
+            Uses = SpecifiedUses + (ComputedUses[0] if ComputedUses != None else [])  #add the system-computed Uses to the user-declared ones
+            OpPaths = [['../' + '/'.join(a[0].split('.')[:j]) + '.py' for j in range( 1, len(a[0].split('.'))) if IsFile('../' + '/'.join(a[0].split('.')[:j]) + '.py')] for a in Uses]
+            OpPaths = [x[0] if x else 'NOTEXIST' for x in OpPaths]
+            LinkList += [('Uses',a[0],oppath,opname,opfile,'None',opfile,IsFast) for (a,oppath) in zip(Uses,OpPaths) if a[0] != opname]   #and produce Uses links from them
+    return LinkList
+
+
+def ExtractInTurn(FileList):
+    '''
+        The links of each module in FileList (see ModuleLinks), computed one 
+        after the other in this process.
+    '''
+    Progress = ExtractionProgress(len(FileList))
+    Found = []
+    for opfile in FileList:
+        Found.append(ModuleLinks(opfile))
+        Progress.Done()
+    Progress.End()
+    return Found
+
+
+def ExtractInProcesses(FileList,Jobs,Timeout):
+    '''
+        The links of each module in FileList (see ModuleLinks), computed in 
+        forked children of this process, at most Jobs at a time.   
+        
+        Each child analyzes one module and sends its links back through a 
+        pipe.  A child that fails, or that hasn't finished after Timeout 
+        seconds (if Timeout is nonzero) -- in which case its process group is 
+        stopped -- yields None for its module, as a module that fails to 
+        load does.
+    '''
+    import starflow.workers as workers
+
+    Progress = ExtractionProgress(len(FileList))
+    Found = {}
+    Waiting = list(FileList)
+    Running = {}    #read end of each child's pipe -> [module, pid, data read so far, deadline]
+    try:
+        while Waiting or Running:
+            while Waiting and len(Running) < Jobs:
+                opfile = Waiting.pop(0)
+                [r,w] = os.pipe()
+                sys.stdout.flush() ; sys.stderr.flush()
+                #no transaction is open on the link store meanwhile (see RefreshLinkStore), and children end with 
+                #os._exit, so they never use or finalize its SQLite connection, which they inherit
+                pid = os.fork()
+                if pid == 0:
+                    os.close(r)
+                    try:
+                        os.setpgid(0,0)
+                        Data = cPickle.dumps(ModuleLinks(opfile),2)
+                    except:
+                        traceback.print_exc()
+                        Data = cPickle.dumps(None,2)
+                    try:
+                        while Data:
+                            Data = Data[os.write(w,Data):]
+                        sys.stdout.flush() ; sys.stderr.flush()
+                    finally:
+                        os._exit(0)
+                os.close(w)
+                Running[r] = [opfile,pid,[],time.time() + Timeout if Timeout else None]
+
+            for r in select.select(Running.keys(),[],[],EXTRACTION_POLL)[0]:
+                Chunk = os.read(r,2**16)
+                if Chunk:
+                    Running[r][2].append(Chunk)
+                else:
+                    [opfile,pid,Data,Deadline] = Running.pop(r)
+                    os.close(r)
+                    os.waitpid(pid,0)
+                    try:
+                        Found[opfile] = cPickle.loads(''.join(Data))
+                    except Exception:
+                        Found[opfile] = None
+                    Progress.Done()
+
+            Now = time.time()
+            for r in [r for r in Running.keys() if Running[r][3] is not None and Now >= Running[r][3]]:
+                [opfile,pid,Data,Deadline] = Running.pop(r)
+                os.close(r)
+                workers.StopGroup(pid)
+                print 'Computing the links of', opfile, 'was stopped after', Timeout, 'seconds.'
+                Found[opfile] = None
+                Progress.Done()
+    finally:
+        for r in Running.keys():
+            os.close(r)
+            workers.StopGroup(Running[r][1])
+
+    Progress.End()
+    return [Found[opfile] for opfile in FileList]
+
+
+class ExtractionProgress(object):
+    '''
+        Reports how many of Total modules have had their links computed, 
+        every EXTRACTION_REPORT_INTERVAL seconds.
+    '''
+    def __init__(self,Total):
+        self.Total = Total
+        self.Count = 0
+        self.Start = time.time()
+        self.NextReport = self.Start + EXTRACTION_REPORT_INTERVAL
+        
+    def Done(self):
+        self.Count += 1
+        if time.time() >= self.NextReport and self.Count < self.Total:
+            print 'Computed links of', self.Count, 'of', self.Total, 'modules (%.0fs) ...' % (time.time() - self.Start)
+            self.NextReport = time.time() + EXTRACTION_REPORT_INTERVAL
+            
+    def End(self):
+        if time.time() - self.Start >= EXTRACTION_REPORT_INTERVAL:
+            print 'Computed links of', self.Total, 'modules in %.0fs.' % (time.time() - self.Start)
+
 
 def ComputeLinksFromOperations(FileList):
     '''
@@ -467,60 +760,34 @@ def GetLinksBelow(Seed, AU = None, Exceptions = None, Forced = False,
 
         
 def GetII(LinkList,Seed):
+    '''
+    Indices of the links in LinkList activated by the paths in Seed:  those
+    whose source file exists and is along a path in Seed, and those 
+    whose update script is in a module (dot path) in Seed.  
+    '''
     
     Seed = uniqify(Seed)
-    PSeed = [ss for ss in Seed if not IsDotPath(ss)]
-    
-    if len(LinkList) > 0:
-        S = LinkList.argsort(order = ['SourceFile'])
-        LinkList = LinkList[S]
-        
-        if len(PSeed) > 0:
-    
-            PSeed = numpy.array(PSeed)
-            PSeed.sort()
-            II1 = [i for i in range(len(LinkList)) if PathExists(LinkList['SourceFile'][i])]
-            [A,B] = getpathalong(LinkList['SourceFile'],PSeed)
-            II2 = (B>A).nonzero()[0].tolist()
-            [A,B] = getpathalong(PSeed,LinkList['SourceFile'])
-            II3 = ListUnion([range(A[i],B[i]) for i in range(len(A))])
-            #II = numpy.array(list(set(II1).intersection(II2 + II3)))
-            II = numpy.array(list(set(II1).intersection(II3)))
-            if len(II) > 0:
-                IP = S[II]
-            else:
-                IP = numpy.array([],int)
-        else:
-            IP = numpy.array([],int)
-    
-        DSeed = [ss for ss in Seed if IsDotPath(ss)]
-            
-        if len(DSeed) > 0:
-            LinkList = LinkList[PermInverse(S)]
-            S = LinkList.argsort(order = ['LinkSource'])
-            LinkList = LinkList[S]
-            DSeed = numpy.array(DSeed)
-            DSeed.sort()
-            II1 = [i for i in range(len(LinkList)) if PathExists(LinkList['SourceFile'][i])]
-            DSeedM = numpy.array(['../' + x.replace('.','/') for x in DSeed])
-            USM = numpy.array(['../' + x.replace('.','/') for x in LinkList['UpdateScript']])
-            [A,B] = getpathalong(DSeedM,USM)
-            II3 = ListUnion([range(A[i],B[i]) for i in range(len(A))])      
-            II = numpy.array(list(set(II1).intersection(II3)))
-    
-            if len(II):
-                ID = S[II]
-            else:
-                ID = numpy.array([],int)
-        else:
-            ID = numpy.array([],int)
+    if len(LinkList) == 0:
+        return []
+
+    ExistsDict = dict([(f,PathExists(f)) for f in set(LinkList['SourceFile'].tolist())])
+    Exists = numpy.array([ExistsDict[f] for f in LinkList['SourceFile'].tolist()],bool)
         
-        IC = numpy.append(IP,ID)
+    PSeed = [ss for ss in Seed if not IsDotPath(ss)]
+    if len(PSeed) > 0:
+        IP = (Exists & PathIndex(LinkList['SourceFile']).Along(PSeed)).nonzero()[0]
     else:
-        return []
+        IP = numpy.array([],int)
     
+    DSeed = [ss for ss in Seed if IsDotPath(ss)]
+    if len(DSeed) > 0:
+        DSeedM = ['../' + x.replace('.','/') for x in DSeed]
+        USM = numpy.array(['../' + x.replace('.','/') for x in LinkList['UpdateScript']])
+        ID = (Exists & PathIndex(USM).Along(DSeedM)).nonzero()[0]
+    else:
+        ID = numpy.array([],int)
     
-    return IC
+    return numpy.append(IP,ID)
 
 def UpdateGuts(UpdateList,LinkList,MtimesDict,PtimesDict,ProtectComputed):
     '''
@@ -600,6 +867,7 @@ def UpdateGuts(UpdateList,LinkList,MtimesDict,PtimesDict,ProtectComputed):
 
 
     
+@tracing.traced
 def PropagateThroughLinkGraphWithTimes(Seed,LinkList, Simple = False,
                                        Pruning = True, HoldTimes = None,
                                        ProtectComputed = False,
@@ -647,7 +915,7 @@ def PropagateThroughLinkGraphWithTimes(Seed,LinkList, Simple = False,
 
     LinkList = RemoveColumns(LinkList,('LinkNumber','InMarkTime','OutMarkTime','LinkTriggers','TargetExists','TargetModTime','TargetLastCreateTime','Activated'))   
     
-    LinkList.sort(order=['LinkSource'])
+    LinkList = LinkList[LinkList['LinkSource'].argsort(kind = 'mergesort')]
     
     if isinstance(Seed,str):    
         Seed = Seed.split(',')      
@@ -655,6 +923,7 @@ def PropagateThroughLinkGraphWithTimes(Seed,LinkList, Simple = False,
     II = list(GetII(LinkList,Seed))
     if len(II) == 0:
         return []
+    Graph = GetLinkGraph(LinkList)
     Sources = uniqify(zip(LinkList['SourceFile'][II],LinkList['LinkSource'][II]))
     
     
@@ -663,7 +932,7 @@ def PropagateThroughLinkGraphWithTimes(Seed,LinkList, Simple = False,
     
     MtimesDict = ListFindMtimes(Sources,HoldTimes,Simple)
     UpdateList = [(i,MtimesDict[LinkList['LinkSource'][i]],'') for i in II]
-    UpdateLists = [UpdateList]
+    UpdateLists = [set(UpdateList)]
     
     LinkArraySequence = []  
     
@@ -672,13 +941,13 @@ def PropagateThroughLinkGraphWithTimes(Seed,LinkList, Simple = False,
     
     while len(UpdateList) > 0:  
         
-        NewSources = [(LinkList['TargetFile'][i[0]], LinkList['LinkTarget'][i[0]]) for i in UpdateList if LinkList['LinkTarget'][i[0]] not in MtimesDict.keys()]
+        NewSources = [(LinkList['TargetFile'][i[0]], LinkList['LinkTarget'][i[0]]) for i in UpdateList if LinkList['LinkTarget'][i[0]] not in MtimesDict]
         
         if len(NewSources) > 0:
             NewMtimes = ListFindMtimes(NewSources,HoldTimes,Simple)
             MtimesDict.update(NewMtimes)
         if ProtectComputed:
-            NewPtimes =  [(LinkList['LinkTarget'][i[0]], FindPtime(LinkList['LinkTarget'][i[0]],Simple=Simple)) for i in UpdateList if LinkList['LinkTarget'][i[0]] not in PtimesDict.keys()]   
+            NewPtimes =  [(LinkList['LinkTarget'][i[0]], FindPtime(LinkList['LinkTarget'][i[0]],Simple=Simple)) for i in UpdateList if LinkList['LinkTarget'][i[0]] not in PtimesDict]   
             PtimesDict.update(dict(NewPtimes))
         else:
             PtimesDict = {}
@@ -691,34 +960,44 @@ def PropagateThroughLinkGraphWithTimes(Seed,LinkList, Simple = False,
             TargetArray = TargetArray[TargetArray['Activated']]
 
         TargetArray.sort(order=['LinkTarget'])
-        Targets = TargetArray['LinkTarget']; Times = TargetArray['OutMarkTime']; LinkNumbers = TargetArray['LinkNumber']        
-        [A,B] = fastequalspairs(LinkList['LinkSource'],Targets)         
-        L1 = [(i, Max(Times[range(A[i],B[i])]) , ','.join(uniqify(LinkNumbers[range(A[i],B[i])].tolist()))) for i in range(len(LinkList)) if A[i] < B[i]]
-        CreateTargetArray = TargetArray[TargetArray['LinkType'] == 'CreatedBy']
-        if len(CreateTargetArray) > 0:
-            CreateTargets = CreateTargetArray['LinkTarget']; CreateTimes = CreateTargetArray['OutMarkTime']; CreateLinkNumbers = CreateTargetArray['LinkNumber']
-            [A,B] = getpathalong(LinkList['LinkSource'],CreateTargets)      
-            L2 = [(i, Max(CreateTimes[range(A[i],B[i])]), ','.join(uniqify(CreateLinkNumbers[range(A[i],B[i])].tolist()))) for i in range(len(LinkList)) if A[i] < B[i]]
-            [A,B] = getpathalong(CreateTargets,LinkList['LinkSource']) 
-            FF = [((A <= j) & (B > j)).nonzero()[0] for j in range(len(LinkList))]
-            EE = ListUnion([range(A[l],B[l]) for l in range(len(A))])
-            NewMtimes = [(LinkList['LinkSource'][i], FindMtime(LinkList['SourceFile'][i],objectname = LinkList['LinkSource'][i],Simple=Simple) if PathExists(LinkList['SourceFile'][i]) else nan) for i in EE if LinkList['LinkSource'][i] not in MtimesDict.keys()]
+        Times = TargetArray['OutMarkTime']; LinkNumbers = TargetArray['LinkNumber']
+        Nodes = Graph.Target[TargetArray['LinkNumber'].astype(int)] if len(TargetArray) > 0 else numpy.array([],int)
+        L1 = Triggers(Graph.LinksFrom('LinkSource',Nodes),Times,LinkNumbers)
+        C = (TargetArray['LinkType'] == 'CreatedBy').nonzero()[0] if len(TargetArray) > 0 else []
+        if len(C) > 0:
+            CreateTimes = Times[C]; CreateLinkNumbers = LinkNumbers[C]
+            L2 = Triggers(Graph.LinksFrom('LinkSource',Nodes[C],UP),CreateTimes,CreateLinkNumbers)
+            [P3,J3] = Graph.LinksFrom('LinkSource',Nodes[C],DOWN)
+            EE = uniqify(J3.tolist())
+            NewMtimes = [(LinkList['LinkSource'][i], FindMtime(LinkList['SourceFile'][i],objectname = LinkList['LinkSource'][i],Simple=Simple) if PathExists(LinkList['SourceFile'][i]) else nan) for i in EE if LinkList['LinkSource'][i] not in MtimesDict]
             MtimesDict.update(dict(NewMtimes))  
             if ProtectComputed:
-                NewPtimes = [(LinkList['LinkSource'][i], FindPtime(LinkList['LinkSource'][i],Simple=Simple)) for i in EE if LinkList['LinkSource'][i] not in PtimesDict.keys()]
+                NewPtimes = [(LinkList['LinkSource'][i], FindPtime(LinkList['LinkSource'][i],Simple=Simple)) for i in EE if LinkList['LinkSource'][i] not in PtimesDict]
                 PtimesDict.update(dict(NewPtimes))              
-            L3 = [(i,Max(CreateTimes[FF[i]]),','.join(uniqify(CreateLinkNumbers[FF[i]].tolist()))) for i in range(len(LinkList)) if len(FF[i]) > 0]
+            L3 = Triggers([P3,J3],CreateTimes,CreateLinkNumbers)
             UpdateList = uniqify(L1 + L2 + L3)
         else:
             UpdateList = L1
-        if any([set(l) <= set(UpdateList) for l in UpdateLists]):
+        UpdateSet = set(UpdateList)
+        if any([l <= UpdateSet for l in UpdateLists]):
             print 'There was a circularity involving at some of the links in' , uniqify(LinkList[[i[0] for i in UpdateList]]['LinkSource'].tolist()) , '. Further updates will be canceled.'
             return LinkList[0:0]
         else:
-            UpdateLists += [UpdateList]
+            UpdateLists += [UpdateSet]
              
     return LinkArraySequence
 
+def Triggers(Reached,Times,LinkNumbers):
+    '''
+    Used by PropagateThroughLinkGraphWithTimes:  given Reached = [P,J], 
+    where the links J of the link list are reached from the links of the 
+    current stage at positions P, returns the UpdateList entries of the 
+    links reached, in order, each with the latest time of the links 
+    reaching it and their link numbers. 
+    '''
+    return [(j, Max(Times[p]), ','.join(uniqify(LinkNumbers[p].tolist()))) for (j,p) in GroupBy(Reached[0],Reached[1])]
+    
+
 def PropagateThroughLinkGraph(Seed,LinkList,depends_on = WORKING_DE.root_dir):
     '''
     Given a Seed list of paths, and Linklist propagates downstream 
@@ -789,40 +1068,39 @@ def PropagateSeed(Seed,LinkList,N1,N2,N3,Special):
         
     '''
 
-    UpdateList = GetI(LinkList[N3],Seed)    
-    UpdateLists = [UpdateList]
+    Graph = GetLinkGraph(LinkList)
+    Special = LinkList['LinkType'] == Special if len(LinkList) > 0 else numpy.zeros((0,),bool)
+    UpdateList = list(GetI(LinkList[N3],Seed))
+    UpdateLists = [set(UpdateList)]
     ActivatedLinkIndices = [UpdateList[:]]
     while len(UpdateList) > 0:
-        TargetList = LinkList[UpdateList]
-        s = TargetList[N2].argsort(); TargetList = TargetList[s]
-        L1 = fastisin(LinkList[N1], TargetList[N2]).nonzero()[0].tolist() 
-        [A,B] = getpathalong(LinkList[N1],TargetList[N2])
-        L2 = [i for i in range(len(LinkList)) if (TargetList['LinkType'][A[i]:B[i]] == Special).any()]
-        [A,B] = getpathalong(TargetList[N2],LinkList[N1])   
-        L3 = set((TargetList['LinkType'] == Special).nonzero()[0]).intersection(ListUnion([range(a,b) for (a,b) in zip(A,B) if b > a]))
-        UpdateList = uniqify(L1 + L2 + list(L3))
-        if any([set(l) <= set(UpdateList) for l in UpdateLists]):
+        Nodes = Graph.Nodes(N2)[UpdateList]
+        L1 = numpy.unique(Graph.LinksFrom(N1,Nodes)[1]).tolist()
+        SpecialNodes = Nodes[Special[UpdateList]]
+        L2 = numpy.unique(Graph.LinksFrom(N1,SpecialNodes,UP)[1]).tolist()
+        L3 = numpy.unique(Graph.LinksFrom(N1,SpecialNodes,DOWN)[1]).tolist()
+        UpdateList = uniqify(L1 + L2 + L3)
+        UpdateSet = set(UpdateList)
+        if any([l <= UpdateSet for l in UpdateLists]):
             print 'There was a circularity involving at least some of the links generated by the scripts' , set([LinkList['UpdateScript'][i] for i in UpdateList]) , '. Updates will be canceled.'
             return LinkList[0:0]
         else:
-            UpdateLists += [UpdateList]
-            ActivatedLinkIndices.append([UpdateList[:]])
-    return [LinkList[[i for i in l]] for l in ActivatedLinkIndices]
+            UpdateLists += [UpdateSet]
+            ActivatedLinkIndices.append(UpdateList[:])
+    return [LinkList[l] for l in ActivatedLinkIndices]
 
     
     
 def GetI(List,Seed):
-    s = List.argsort() ; List = List[s]
-    Seed = numpy.array(Seed) ; Seed.sort()
-    [A,B] = getpathalong(List,Seed)
-    C1 = (B > A).nonzero()[0].tolist()
-    [A,B] = getpathalong(Seed,List)
-    C2 = ListUnion([range(a,b) for (a,b) in zip(A,B) if b > a])
-    I = numpy.array(uniqify(C1 + C2))
-    if len(I) > 0:
-        return s[I]
-    else:
+    '''
+    Indices of the paths in List along a path in Seed, or that a path in 
+    Seed is along. 
+    '''
+    if len(List) == 0:
         return numpy.array([],int)
+    C1 = PathIndex(numpy.array(Seed)).Contain(List)
+    C2 = PathIndex(List).Along(Seed)
+    return (C1 | C2).nonzero()[0]
         
             
     
@@ -869,6 +1147,7 @@ def GetConnected(Seed, level = -1, Filter = True,depends_on = WORKING_DE.relativ
 
 
         
+@tracing.traced
 def FilterForAutomaticUpdates(LList,AU = None,Exceptions = None, ReturnIndices = False):
     '''
     Filters a link links removing links that are not meant to be 
@@ -910,31 +1189,15 @@ def FilterForAutomaticUpdates(LList,AU = None,Exceptions = None, ReturnIndices =
         PExceptions = [x for x in Exceptions if not IsDotPath(x)]
         PExceptions = numpy.array(PExceptions,str)  
         if len(PExceptions) > 0:
-            s = LinkList.argsort(order = ['LinkTarget'])
-            LinkList = LinkList[s]
-            [A,B] = getpathalong(Exceptions,LinkList['LinkTarget'])
-            R = ListUnion([range(A[i],B[i]) for i in range(len(A))])
-            if len(R) > 0:
-                ExcpT = fastisin(numpy.arange(len(LinkList)),s[numpy.array(R)])
-            else:
-                ExcpT = numpy.zeros((len(LinkList),),bool)
-            LinkList = LinkList[PermInverse(s)]
+            ExcpT = PathIndex(LinkList['LinkTarget']).Along(PExceptions)
         else:
             ExcpT = numpy.zeros((len(LinkList),),bool)
         
         DExceptions = [x for x in Exceptions if IsDotPath(x)]
         if len(DExceptions) > 0:
-            s = LinkList.argsort(order = ['UpdateScript'])
-            LinkList = LinkList[s]
             LTM = numpy.array(['../' + ss.replace('.','/') for ss in LinkList['UpdateScript']])
             DEM = numpy.array(['../' + ss.replace('.','/') for ss in DExceptions])
-            [A,B] = getpathalong(DEM,LTM)
-            R = ListUnion([range(A[i],B[i]) for i in range(len(A))])
-            if len(R) > 0:
-                ExcpS = fastisin(numpy.arange(len(LinkList)),s[numpy.array(R)])
-            else:
-                ExcpS = numpy.zeros((len(LinkList),),bool)
-            LinkList =  LinkList[PermInverse(s)]
+            ExcpS = PathIndex(LTM).Along(DEM)
         else:
             ExcpS = numpy.zeros((len(LinkList),),bool)
 
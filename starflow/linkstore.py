@@ -0,0 +1,255 @@
+'''
+On-disk store of the links of the data environment's modules.
+
+LinksFromOperations keeps the links it computes in a SQLite database,
+LINKSTOREFILE in the links directory, with the tables
+
+    links       the links found in each module (see GutsComputeLinks)
+    implied     the implied links among them (see GetImpliedLinks)
+    dummy       the dummy links among them (see GetDummyLinks)
+    times       the modification time of each module when its links were
+                computed
+
+The link tables have the fields of a link list (LINK_FIELDS), and are indexed
+on INDEXED_FIELDS, so the links of given modules, or out of or into given
+paths, are looked up without reading the rest.   When modules change, only
+their rows are replaced (see RemoveModules and AddLinks), and all the changes
+of a refresh are made in one transaction:  other processes reading the store
+(e.g. another update session) see it either before or after them, never half
+written.
+
+The implied and dummy links are kept exactly those that the links in the
+store induce:  when modules change, only the ones induced by the creates of
+those modules, or reaching the paths their links name, are replaced (see
+linkmanagement.RefreshImpliedLinks and linkmanagement.RefreshDummyLinks).
+A store whose implied and dummy links were kept otherwise (one with a
+version below STORE_VERSION) has them computed again from its links.
+
+A store made in a links directory that holds the pickled record arrays links
+used to be kept in (LEGACY_FILES) is filled from them when it's made.
+'''
+
+import os
+import sqlite3
+import numpy
+
+from starflow.utils import PathExists
+
+LINKSTOREFILE = 'LinkStore.db'
+STORE_VERSION = 1           # version of the way the implied and dummy links are kept
+BUSY_TIMEOUT = 600          # seconds to wait for another process's changes to the store to be committed
+LINK_FIELDS = ['LinkType','LinkSource','SourceFile','LinkTarget','TargetFile','UpdateScript','UpdateScriptFile','IsFast']
+LINK_TABLES = ['links','implied','dummy']
+INDEXED_FIELDS = ['LinkSource','LinkTarget','SourceFile','TargetFile','UpdateScriptFile']
+LEGACY_FILES = [('links','StoredLinks'),('implied','StoredImpliedLinks'),('dummy','StoredDummyLinks'),('times','StoredTimes')]
+
+
+class LinkStore(object):
+    '''
+    The link store in the links directory LinksDir, made if need be.
+    '''
+    def __init__(self,LinksDir):
+        Path = os.path.join(LinksDir,LINKSTOREFILE)
+        New = not PathExists(Path)
+        self.Conn = sqlite3.connect(Path,timeout = BUSY_TIMEOUT,isolation_level = None)
+        self.Conn.text_factory = str
+        self.Begin()
+        try:
+            Fields = ', '.join([f + (' INTEGER' if f == 'IsFast' else ' TEXT') for f in LINK_FIELDS])
+            for t in LINK_TABLES:
+                self.Conn.execute('CREATE TABLE IF NOT EXISTS ' + t + ' (' + Fields + ')')
+                for f in INDEXED_FIELDS:
+                    self.Conn.execute('CREATE INDEX IF NOT EXISTS ' + t + '_' + f + ' ON ' + t + ' (' + f + ')')
+            self.Conn.execute('CREATE TABLE IF NOT EXISTS times (FileName TEXT PRIMARY KEY, ModTime REAL)')
+            if New:
+                self.ImportLegacy(LinksDir)
+        except:
+            self.Rollback()
+            raise
+        self.Commit()
+
+    def Begin(self):
+        '''
+        Starts a transaction, waiting for any other process's to end.
+        '''
+        self.Conn.execute('BEGIN IMMEDIATE')
+
+    def Commit(self):
+        self.Conn.execute('COMMIT')
+
+    def Rollback(self):
+        try:
+            self.Conn.execute('ROLLBACK')
+        except sqlite3.OperationalError:
+            #no transaction was open
+            pass
+
+    def Close(self):
+        self.Conn.close()
+
+    def Version(self):
+        return self.Conn.execute('PRAGMA user_version').fetchone()[0]
+
+    def SetVersion(self,Version):
+        self.Conn.execute('PRAGMA user_version = ' + str(int(Version)))
+
+    def ImportLegacy(self,LinksDir):
+        for (Table,Name) in LEGACY_FILES:
+            if PathExists(os.path.join(LinksDir,Name)):
+                try:
+                    Stored = numpy.load(os.path.join(LinksDir,Name))
+                except Exception:
+                    print 'Could not read', Name, 'from', LinksDir, ';  its links will be computed again.'
+                    continue
+                if Table == 'times':
+                    self.SetTimes(Stored['FileName'].tolist(),Stored['ModTime'].tolist())
+                else:
+                    self.AddLinks(Table,Stored)
+
+    def Links(self,Table,Where = '',Args = ()):
+        '''
+        Record array of the links in Table satisfying the SQL condition Where.
+        '''
+        Rows = self.Conn.execute('SELECT ' + ', '.join(LINK_FIELDS) + ' FROM ' + Table + (' WHERE ' + Where if Where else ''),Args).fetchall()
+        return MakeLinkList(Rows)
+
+    def LinksOf(self,Table,Field,Values):
+        '''
+        Record array of the links in Table whose Field is one of Values.
+        '''
+        if len(Values) == 0:
+            return MakeLinkList([])
+        self.Select(Values)
+        return self.Links(Table,Field + ' IN (SELECT Value FROM selection)')
+
+    def LinksIn(self,Table,Field,Lower,Upper):
+        '''
+        Record array of the links in Table whose Field lies, for some i,
+        between Lower[i] (included) and Upper[i] (excluded) -- once for
+        each such i.
+        '''
+        if len(Lower) == 0:
+            return MakeLinkList([])
+        self.SelectIntervals(Lower,Upper)
+        Rows = self.Conn.execute('SELECT ' + ', '.join(LINK_FIELDS) + ' FROM intervals JOIN ' + Table + ' ON ' + Field + ' >= Lower AND ' + Field + ' < Upper').fetchall()
+        return MakeLinkList(Rows)
+
+    def EndpointsIn(self,Lower,Upper):
+        '''
+        Record array of the objects (Object) and their paths (ObjectFile) at
+        the ends of the stored links whose path lies, for some i, between
+        Lower[i] (included) and Upper[i] (excluded).
+        '''
+        if len(Lower) == 0:
+            return MakeEndpoints([])
+        self.SelectIntervals(Lower,Upper)
+        Rows = self.Conn.execute('SELECT LinkSource, SourceFile FROM intervals JOIN links ON SourceFile >= Lower AND SourceFile < Upper '
+                                 'UNION SELECT LinkTarget, TargetFile FROM intervals JOIN links ON TargetFile >= Lower AND TargetFile < Upper').fetchall()
+        return MakeEndpoints(Rows)
+
+    def Appearing(self,Objects,Files):
+        '''
+        Record array of the objects Objects[i], with paths Files[i], that
+        are at an end of some stored link (see EndpointsIn).
+        '''
+        if len(Objects) == 0:
+            return MakeEndpoints([])
+        self.Conn.execute('CREATE TEMP TABLE IF NOT EXISTS endpoints (Object TEXT, ObjectFile TEXT)')
+        self.Conn.execute('DELETE FROM endpoints')
+        self.Conn.executemany('INSERT INTO endpoints VALUES (?,?)',zip(Objects,Files))
+        Rows = self.Conn.execute('SELECT Object, ObjectFile FROM endpoints WHERE '
+                                 'EXISTS (SELECT 1 FROM links WHERE LinkSource = Object AND SourceFile = ObjectFile) OR '
+                                 'EXISTS (SELECT 1 FROM links WHERE LinkTarget = Object AND TargetFile = ObjectFile)').fetchall()
+        return MakeEndpoints(Rows)
+
+    def Distinct(self,Table,Field,Where = ''):
+        '''
+        Values of Field among the links in Table satisfying Where.
+        '''
+        return [r[0] for r in self.Conn.execute('SELECT DISTINCT ' + Field + ' FROM ' + Table + (' WHERE ' + Where if Where else '')).fetchall()]
+
+    def Times(self):
+        '''
+        Record array of the modules in the store (FileName) and their
+        modification times when their links were computed (ModTime).
+        '''
+        Rows = self.Conn.execute('SELECT FileName, ModTime FROM times').fetchall()
+        if len(Rows) == 0:
+            return numpy.rec.fromarrays([[],[]],names = ['FileName','ModTime'],formats = ['int'] * 2)
+        return numpy.rec.fromrecords(Rows,names = ['FileName','ModTime'])
+
+    def SetTimes(self,Files,Times):
+        self.Conn.executemany('INSERT OR REPLACE INTO times VALUES (?,?)',zip(Files,[float(t) for t in Times]))
+
+    def RemoveTimes(self,Files):
+        self.Conn.executemany('DELETE FROM times WHERE FileName = ?',[(f,) for f in Files])
+
+    def AddLinks(self,Table,LinkList):
+        if len(LinkList) > 0:
+            self.Conn.executemany('INSERT INTO ' + Table + ' VALUES (' + ','.join(['?'] * len(LINK_FIELDS)) + ')',Records(LinkList))
+
+    def RemoveLinks(self,Table,LinkList):
+        '''
+        Removes the links in LinkList from Table.
+        '''
+        if len(LinkList) > 0:
+            self.Conn.executemany('DELETE FROM ' + Table + ' WHERE ' + ' AND '.join([f + ' = ?' for f in LINK_FIELDS]),Records(LinkList))
+
+    def RemoveModules(self,Table,Files,Field = 'UpdateScriptFile'):
+        '''
+        Removes the links of the modules in Files (those with the module as
+        their Field) from Table.
+        '''
+        if len(Files) > 0:
+            self.Select(Files)
+            self.Conn.execute('DELETE FROM ' + Table + ' WHERE ' + Field + ' IN (SELECT Value FROM selection)')
+
+    def RemoveEnds(self,Table,End,Objects,Files):
+        '''
+        Removes from Table the links whose End ('Source' or 'Target') is one
+        of the objects Objects[i], with path Files[i].
+        '''
+        self.Conn.executemany('DELETE FROM ' + Table + ' WHERE Link' + End + ' = ? AND ' + End + 'File = ?',zip(Objects,Files))
+
+    def Clear(self,Table):
+        self.Conn.execute('DELETE FROM ' + Table)
+
+    def Select(self,Values):
+        '''
+        Puts Values in the temporary table "selection", for queries to join
+        on (there is a bound on the number of parameters of a query).
+        '''
+        self.Conn.execute('CREATE TEMP TABLE IF NOT EXISTS selection (Value TEXT PRIMARY KEY)')
+        self.Conn.execute('DELETE FROM selection')
+        self.Conn.executemany('INSERT OR IGNORE INTO selection VALUES (?)',[(v,) for v in Values])
+
+    def SelectIntervals(self,Lower,Upper):
+        '''
+        Puts the intervals [Lower[i],Upper[i]) in the temporary table
+        "intervals", for range queries to join on.
+        '''
+        self.Conn.execute('CREATE TEMP TABLE IF NOT EXISTS intervals (Lower TEXT, Upper TEXT)')
+        self.Conn.execute('DELETE FROM intervals')
+        self.Conn.executemany('INSERT INTO intervals VALUES (?,?)',zip(Lower,Upper))
+
+
+def Records(LinkList):
+    return [tuple([str(x) for x in r[:-1]]) + (int(r[-1]),) for r in zip(*[LinkList[f].tolist() for f in LINK_FIELDS])]
+
+
+def MakeLinkList(Rows):
+    '''
+    Link list (a numpy record array with fields LINK_FIELDS) of Rows.
+    '''
+    if len(Rows) == 0:
+        return numpy.rec.fromarrays([[] for f in LINK_FIELDS],names = LINK_FIELDS,formats = ['int'] * len(LINK_FIELDS))
+    return numpy.rec.fromrecords(Rows,names = LINK_FIELDS)
+
+
+def MakeEndpoints(Rows):
+    '''
+    Record array of the objects (Object) and paths (ObjectFile) in Rows.
+    '''
+    if len(Rows) == 0:
+        return numpy.rec.fromarrays([numpy.array([],str)] * 2,names = ['Object','ObjectFile'])
+    return numpy.rec.fromrecords(Rows,names = ['Object','ObjectFile'])
@@ -0,0 +1,282 @@
+'''
+A stand-in for the drmaa module that runs jobs as processes on this machine.
+
+It has the part of the drmaa-python interface the updater uses (see
+executors.DrmaaExecutor):  sessions, job templates, runJob and runBulkJobs
+(with PARAMETRIC_INDEX substitution), jobStatus, wait on one job or on
+JOB_IDS_SESSION_ANY with timeouts, synchronize, control(TERMINATE), and
+JobInfo with resourceUsage.   'LOCAL_DRMAA' mode thereby goes through the same
+submission, monitoring, batching and failure handling as 'DRMAA' mode, so
+that these can be exercised and benchmarked on one machine without a grid
+engine.
+
+Like a grid scheduler, a session queues the jobs submitted to it and runs
+them SLOTS at a time (one per cpu if SLOTS is 0), each at least
+DISPATCH_LATENCY seconds after it was submitted.   A job is run by forking and
+exec'ing its remote command with its arguments in its working directory, with
+its job environment added to this process's environment (along with JOB_ID
+and SGE_TASK_ID, as Sun Grid Engine sets them), and its output appended to
+its output path.   As in DRMAA, the placeholders (PARAMETRIC_INDEX etc.) are
+replaced in the working directory and the input, output and error paths only,
+not in the arguments:  a task of an array job learns its index from
+SGE_TASK_ID.   Its resourceUsage comes from the rusage of its process.
+
+The queue is advanced whenever the session is called, so jobs only start
+while the submitting process is waiting on them or asking about them.
+'''
+
+import os
+import time
+import signal
+import collections
+import multiprocessing
+
+SLOTS = 0                   # jobs run at once; 0 means one per cpu
+DISPATCH_LATENCY = 0        # seconds a job stays queued at the least
+POLL_INTERVAL = .05         # seconds between checks for ended jobs while waiting
+
+
+class DrmaaException(Exception):
+    pass
+
+class InvalidJobException(DrmaaException):
+    pass
+
+class ExitTimeoutException(DrmaaException):
+    pass
+
+
+class JobState(object):
+    UNDETERMINED = 'undetermined'
+    QUEUED_ACTIVE = 'queued_active'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+
+class JobControlAction(object):
+    SUSPEND = 'suspend'
+    RESUME = 'resume'
+    HOLD = 'hold'
+    RELEASE = 'release'
+    TERMINATE = 'terminate'
+
+
+JobInfo = collections.namedtuple('JobInfo',['jobId','hasExited','hasSignal','terminatedSignal','hasCoreDump','wasAborted','exitStatus','resourceUsage'])
+
+
+class JobTemplate(object):
+    PARAMETRIC_INDEX = '$drmaa_incr_ph$'
+    HOME_DIRECTORY = '$drmaa_hd_ph$'
+    WORKING_DIRECTORY = '$drmaa_wd_ph$'
+
+    def __init__(self):
+        self.remoteCommand = None
+        self.args = []
+        self.workingDirectory = None
+        self.jobEnvironment = {}
+        self.inputPath = None
+        self.outputPath = None
+        self.errorPath = None
+        self.joinFiles = False
+        self.jobName = None
+        self.nativeSpecification = ''
+
+
+class Job(object):
+    def __init__(self,JobId,Template,Index):
+        self.JobId = JobId
+        self.Index = Index
+        self.Template = Template
+        self.State = JobState.QUEUED_ACTIVE
+        self.Submitted = time.time()
+        self.Started = None
+        self.Ended = None
+        self.Pid = None
+        self.Status = None
+        self.Usage = None
+        self.Aborted = False
+        self.Reaped = False
+
+
+class Session(object):
+    JOB_IDS_SESSION_ALL = 'DRMAA_JOB_IDS_SESSION_ALL'
+    JOB_IDS_SESSION_ANY = 'DRMAA_JOB_IDS_SESSION_ANY'
+    TIMEOUT_WAIT_FOREVER = -1
+    TIMEOUT_NO_WAIT = 0
+
+    def __init__(self,contactString = None,Slots = None,Latency = None):
+        Slots = SLOTS if Slots is None else Slots
+        self.Slots = Slots if Slots > 0 else multiprocessing.cpu_count()
+        self.Latency = DISPATCH_LATENCY if Latency is None else Latency
+        self.Jobs = {}
+        self.Queue = []
+        self.Count = 0
+
+    def initialize(self,contactString = None):
+        pass
+
+    def exit(self):
+        pass
+
+    def createJobTemplate(self):
+        return JobTemplate()
+
+    def deleteJobTemplate(self,jt):
+        pass
+
+    def runJob(self,jt):
+        return self.Submit(jt,None)
+
+    def runBulkJobs(self,jt,beginIndex,endIndex,step):
+        return [self.Submit(jt,i) for i in range(beginIndex,endIndex + 1,step)]
+
+    def Submit(self,jt,Index):
+        self.Count += 1
+        JobId = str(self.Count) + ('.' + str(Index) if Index is not None else '')
+        Template = JobTemplate()
+        Template.__dict__.update(jt.__dict__)
+        Template.args = list(jt.args)
+        Template.jobEnvironment = dict(jt.jobEnvironment or {})
+        self.Jobs[JobId] = Job(JobId,Template,Index)
+        self.Queue.append(JobId)
+        self.Pump()
+        return JobId
+
+    def jobStatus(self,jobId):
+        self.Pump()
+        return self.GetJob(jobId).State
+
+    def control(self,jobId,action):
+        if action != JobControlAction.TERMINATE:
+            raise DrmaaException('Only TERMINATE is supported by the local stand-in.')
+        self.Pump()
+        JobIds = [jobId] if jobId != self.JOB_IDS_SESSION_ALL else self.Jobs.keys()
+        for JobId in JobIds:
+            J = self.GetJob(JobId)
+            if J.State == JobState.QUEUED_ACTIVE:
+                self.Queue.remove(JobId)
+                J.State = JobState.FAILED
+                J.Aborted = True
+                J.Ended = time.time()
+            elif J.State == JobState.RUNNING:
+                try:
+                    os.kill(J.Pid,signal.SIGKILL)
+                except OSError:
+                    pass
+
+    def wait(self,jobId,timeout = -1):
+        '''
+        Waits for the job jobId -- or for any job of the session, if jobId is
+        JOB_IDS_SESSION_ANY -- to end, and returns its JobInfo.   Each ended
+        job is returned by one wait only.
+        '''
+        Start = time.time()
+        while True:
+            self.Pump()
+            if jobId == self.JOB_IDS_SESSION_ANY:
+                Candidates = [J for J in self.Jobs.values() if not J.Reaped]
+                if len(Candidates) == 0:
+                    raise InvalidJobException('No jobs to wait for.')
+            else:
+                Candidates = [self.GetJob(jobId)]
+            Ended = [J for J in Candidates if J.State in [JobState.DONE,JobState.FAILED]]
+            if len(Ended) > 0:
+                J = min(Ended,key = lambda J : J.Ended)
+                J.Reaped = True
+                return self.GetJobInfo(J)
+            if timeout >= 0 and time.time() - Start >= timeout:
+                raise ExitTimeoutException('Timed out waiting for jobs.')
+            time.sleep(POLL_INTERVAL)
+
+    def synchronize(self,jobIds,timeout = -1,dispose = False):
+        Start = time.time()
+        if self.JOB_IDS_SESSION_ALL in jobIds:
+            jobIds = self.Jobs.keys()
+        for JobId in jobIds:
+            while True:
+                self.Pump()
+                if self.GetJob(JobId).State in [JobState.DONE,JobState.FAILED]:
+                    break
+                if timeout >= 0 and time.time() - Start >= timeout:
+                    raise ExitTimeoutException('Timed out waiting for jobs.')
+                time.sleep(POLL_INTERVAL)
+            if dispose:
+                self.GetJob(JobId).Reaped = True
+
+    def GetJob(self,JobId):
+        if JobId not in self.Jobs:
+            raise InvalidJobException('No job ' + str(JobId) + ' in the session.')
+        return self.Jobs[JobId]
+
+    def Pump(self):
+        '''
+        Takes in the jobs that have ended and starts queued ones in the slots
+        they free.
+        '''
+        for J in self.Jobs.values():
+            if J.State == JobState.RUNNING:
+                (pid,Status,Usage) = os.wait4(J.Pid,os.WNOHANG)
+                if pid != 0:
+                    J.Ended = time.time()
+                    J.Status = Status
+                    J.Usage = Usage
+                    J.State = JobState.DONE if os.WIFEXITED(Status) else JobState.FAILED
+        Running = len([J for J in self.Jobs.values() if J.State == JobState.RUNNING])
+        Now = time.time()
+        while Running < self.Slots and len(self.Queue) > 0 and self.Jobs[self.Queue[0]].Submitted + self.Latency <= Now:
+            self.Start(self.Jobs[self.Queue.pop(0)])
+            Running += 1
+
+    def Start(self,J):
+        jt = J.Template
+        Index = str(J.Index) if J.Index is not None else ''
+        Fill = lambda s : s.replace(JobTemplate.PARAMETRIC_INDEX,Index).replace(JobTemplate.HOME_DIRECTORY,os.environ.get('HOME','')).replace(JobTemplate.WORKING_DIRECTORY,jt.workingDirectory or os.getcwd())
+        Env = dict(os.environ)
+        Env.update(jt.jobEnvironment)
+        Env['JOB_ID'] = J.JobId.split('.')[0]
+        Env['SGE_TASK_ID'] = Index or 'undefined'
+        Args = [jt.remoteCommand] + list(jt.args)
+        J.Pid = os.fork()
+        if J.Pid == 0:
+            try:
+                if jt.workingDirectory:
+                    os.chdir(Fill(jt.workingDirectory))
+                Out = jt.outputPath
+                Err = jt.outputPath if jt.joinFiles or not jt.errorPath else jt.errorPath
+                if jt.inputPath:
+                    fd = os.open(Fill(jt.inputPath.split(':',1)[-1]),os.O_RDONLY)
+                    os.dup2(fd,0)
+                    os.close(fd)
+                for (Path,f) in [(Out,1),(Err,2)]:
+                    if Path:
+                        fd = os.open(Fill(Path.split(':',1)[-1]),os.O_WRONLY | os.O_CREAT | os.O_APPEND,0666)
+                        os.dup2(fd,f)
+                        os.close(fd)
+                os.execvpe(jt.remoteCommand,Args,Env)
+            finally:
+                os._exit(127)
+        J.Started = time.time()
+        J.State = JobState.RUNNING
+
+    def GetJobInfo(self,J):
+        Status = J.Status
+        Exited = Status is not None and os.WIFEXITED(Status)
+        Signaled = Status is not None and os.WIFSIGNALED(Status)
+        Usage = {'submission_time':repr(J.Submitted),
+                 'start_time':repr(J.Started or 0),
+                 'end_time':repr(J.Ended or 0),
+                 'ru_wallclock':repr((J.Ended - J.Started) if J.Started else 0)}
+        if J.Usage is not None:
+            Usage.update({'ru_utime':repr(J.Usage.ru_utime),
+                          'ru_stime':repr(J.Usage.ru_stime),
+                          'cpu':repr(J.Usage.ru_utime + J.Usage.ru_stime),
+                          'ru_maxrss':repr(J.Usage.ru_maxrss)})
+        return JobInfo(jobId = J.JobId,
+                       hasExited = Exited,
+                       hasSignal = Signaled,
+                       terminatedSignal = str(os.WTERMSIG(Status)) if Signaled else '',
+                       hasCoreDump = Signaled and os.WCOREDUMP(Status),
+                       wasAborted = J.Aborted,
+                       exitStatus = os.WEXITSTATUS(Status) if Exited else 0,
+                       resourceUsage = Usage)
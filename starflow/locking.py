@@ -0,0 +1,248 @@
+'''
+Locks that let several update sessions run in one data environment at once.
+
+Every lock is an flock(2) lock on a file in the data environment's lock_dir.
+Since the kernel drops such locks when the process holding them dies, a lock
+can never be left behind by a crashed session; the only stale state there can
+be is a session id that was never released, and session ids are checked for
+that whenever a new one is allocated (see AllocateSessionID).
+
+Three kinds of locks are used:
+
+    -- session locks, held by an update session for as long as it runs, so
+    that other sessions can tell its id is live;
+    -- target locks, held by the updater around each call to an operation:
+    exclusive on each path the operation creates, and shared on the paths it
+    depends on and on the directories above all of these (so that an
+    operation creating '../Data/x' and one creating or reading '../Data/x/y'
+    wait for each other, while ones creating '../Data/x' and '../Data/y'
+    don't, nor do ones reading the same path);
+    -- named locks on shared stores such as the archive and op result cache
+    (e.g. LockSet(Exclusive = ['archive'])), held while their indexes are
+    rewritten or their contents evicted.
+
+The locks needed for one step are taken together as a LockSet, always in
+sorted order, so that sessions that block on each other can't deadlock.
+
+Lock files are removed by the last holder to release them.   A locker that
+finds, once it has its lock, that the file it opened is no longer the one at
+the lock path starts over.
+'''
+
+import os
+import time
+import fcntl
+import errno
+
+import starflow.de as de
+from starflow.utils import PathFileName
+DE_MANAGER = de.DataEnvironmentManager()
+WORKING_DE = DE_MANAGER.working_de
+
+TARGETDIR = 'Targets'
+SESSIONDIR = 'Sessions'
+SSIDLOCK = 'ssid'
+LOCK_POLL_INTERVAL = .25            # seconds between attempts when waiting for a lock
+
+HELD = {}           # descriptor -> lock file, for every lock held by this process
+SESSIONS = {}       # session id -> LockSet of the sessions allocated by this process
+
+
+class LockSet(object):
+    '''
+    Set of locks, given by name, acquired and released together.
+    '''
+    def __init__(self,Exclusive = (),Shared = (),Labels = None):
+        self.Modes = dict([(n,fcntl.LOCK_SH) for n in Shared])
+        self.Modes.update(dict([(n,fcntl.LOCK_EX) for n in Exclusive]))
+        self.Labels = Labels if Labels is not None else {}
+        self.Held = {}
+
+    def Acquire(self,Blocking = True):
+        '''
+        Takes all the locks of the set.   If Blocking, waits for those held by
+        other sessions; otherwise takes none of them unless all are free.
+        Returns whether the locks were taken.
+        '''
+        for n in sorted(self.Modes.keys()):
+            Waited = False
+            fd = TryLock(n,self.Modes[n])
+            while fd is None:
+                if not Blocking:
+                    self.Release()
+                    return False
+                if not Waited:
+                    print 'Waiting for the lock on', self.Labels.get(n,n), '...'
+                    Waited = True
+                time.sleep(LOCK_POLL_INTERVAL)
+                fd = TryLock(n,self.Modes[n])
+            self.Held[n] = fd
+        return True
+
+    def Release(self):
+        for n in self.Held.keys():
+            Unlock(self.Held.pop(n))
+
+
+def TargetLocks(Creates,Reads = ()):
+    '''
+    LockSet for an operation that creates the paths in Creates and depends on
+    those in Reads (relative to Temp): exclusive on the paths it creates,
+    shared on those it reads, and shared on the directories containing either.
+    
+    (A path read is thus kept from being rewritten -- or moved to runtime 
+    storage -- by an operation creating it or a directory above it.   Writes 
+    below a directory that is read as a whole are not excluded, since the 
+    locks of writers on the directories above their outputs are shared.) 
+    '''
+    Exclusive = set([os.path.normpath(f) for f in Creates])
+    Shared = set([os.path.normpath(f) for f in Reads])
+    for f in Exclusive.union(Shared):
+        d = os.path.dirname(f)
+        while d not in ['','..','/']:
+            Shared.add(d)
+            d = os.path.dirname(d)
+    Labels = dict([(GetTargetLockName(f),f) for f in Exclusive.union(Shared)])
+    return LockSet(Exclusive = [GetTargetLockName(f) for f in Exclusive],
+                   Shared = [GetTargetLockName(f) for f in Shared.difference(Exclusive)],
+                   Labels = Labels)
+
+
+def GetTargetLockName(f):
+    return os.path.join(TARGETDIR,PathFileName(f))
+
+
+def GetLockFile(Name):
+    return os.path.join(WORKING_DE.lock_dir,Name)
+
+
+def TryLock(Name,Mode,creates = WORKING_DE.relative_lock_dir):
+    '''
+    Takes the named lock in Mode (fcntl.LOCK_SH or fcntl.LOCK_EX) if it's free
+    and returns the descriptor holding it; returns None if it's held elsewhere.
+    '''
+    LockFile = GetLockFile(Name)
+    if not os.path.isdir(os.path.dirname(LockFile)):
+        try:
+            os.makedirs(os.path.dirname(LockFile))
+        except OSError:
+            pass
+    while True:
+        fd = os.open(LockFile,os.O_RDWR | os.O_CREAT,0666)
+        fcntl.fcntl(fd,fcntl.F_SETFD,fcntl.fcntl(fd,fcntl.F_GETFD) | fcntl.FD_CLOEXEC)
+        try:
+            fcntl.flock(fd,Mode | fcntl.LOCK_NB)
+        except IOError, e:
+            os.close(fd)
+            if e.errno in [errno.EAGAIN,errno.EACCES,errno.EWOULDBLOCK]:
+                return None
+            raise
+        try:
+            Current = os.fstat(fd).st_ino == os.stat(LockFile).st_ino
+        except OSError:
+            Current = False
+        if Current:
+            HELD[fd] = LockFile
+            return fd
+        #the last holder removed the file after we opened it
+        os.close(fd)
+
+
+def Unlock(fd,creates = WORKING_DE.relative_lock_dir):
+    '''
+    Releases the lock held by fd, removing the lock file if no one else holds
+    or is waiting on it.
+    '''
+    LockFile = HELD.pop(fd)
+    try:
+        fcntl.flock(fd,fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except IOError:
+        pass
+    else:
+        try:
+            os.remove(LockFile)
+        except OSError:
+            pass
+    os.close(fd)
+
+
+def ForgetInheritedLocks():
+    '''
+    To be called in processes forked from one holding locks (e.g. pool and
+    warm workers): closes their copies of the lock descriptors, so that the
+    locks are released when their real holder releases them.
+    '''
+    for fd in HELD.keys():
+        try:
+            os.close(fd)
+        except OSError:
+            pass
+    HELD.clear()
+    SESSIONS.clear()
+
+
+def IsLive(SsID):
+    '''
+    Whether the update session with id SsID is still running.
+    '''
+    if SsID in SESSIONS:
+        return True
+    fd = TryLock(os.path.join(SESSIONDIR,str(SsID)),fcntl.LOCK_EX)
+    if fd is None:
+        return True
+    Unlock(fd)
+    return False
+
+
+def AllocateSessionID(IDFile,SsID = None,Reserved = ()):
+    '''
+    Allocates an id for an update session: SsID if given (or None if the
+    session with that id is still running), and otherwise one more than the
+    highest id in use or in Reserved.   IDFile lists the ids in use, separated
+    by commas; ids of sessions that died without releasing them are dropped
+    from it.
+    '''
+    Lock = LockSet(Exclusive = [SSIDLOCK])
+    Lock.Acquire()
+    try:
+        N = ReadSessionIDs(IDFile)
+        Live = [n for n in N if IsLive(n)]
+        if len(Live) < len(N):
+            print 'Dropping stale session id(s)', ', '.join([str(n) for n in N if n not in Live])
+        if SsID is None:
+            SsID = max(Live + list(Reserved)) + 1 if Live or Reserved else 0
+        elif SsID in Live:
+            WriteSessionIDs(IDFile,Live)
+            return None
+        SESSIONS[SsID] = LockSet(Exclusive = [os.path.join(SESSIONDIR,str(SsID))])
+        SESSIONS[SsID].Acquire()
+        WriteSessionIDs(IDFile,Live + [SsID])
+    finally:
+        Lock.Release()
+    return SsID
+
+
+def ReleaseSessionID(IDFile,SsID):
+    Lock = LockSet(Exclusive = [SSIDLOCK])
+    Lock.Acquire()
+    try:
+        N = ReadSessionIDs(IDFile)
+        if SsID in N:
+            N.remove(SsID)
+            WriteSessionIDs(IDFile,N)
+    finally:
+        Lock.Release()
+    if SsID in SESSIONS:
+        SESSIONS.pop(SsID).Release()
+
+
+def ReadSessionIDs(IDFile):
+    if not os.path.exists(IDFile):
+        return []
+    return [int(x) for x in open(IDFile,'r').read().strip().strip(',').split(',') if x.strip()]
+
+
+def WriteSessionIDs(IDFile,N):
+    F = open(IDFile,'w')
+    F.write(','.join([str(n) for n in N]))
+    F.close()
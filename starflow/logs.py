@@ -0,0 +1,335 @@
+'''
+Output logs of update sessions.
+
+The temp directory of an update session (see update.SetupRun) holds
+
+    MostRecentRun                   the session log:  what the updater printed
+    MostRecentRun.InSession_<op>    the op log of each operation called:  what
+                                    it printed to stdout and stderr
+
+Logs are written through LogSinks (see also utils.multicaster), which keep
+their file open and write it a line at a time, rather than opening and closing
+it for every write.   A sink holds output back only until the end of its line
+(or LOG_BUFFER_BYTES of it, for output without line breaks), so a log can be
+followed while it is written (see FollowSession, or "starflow tail").
+
+An op log can be capped.   Its first MaxBytes are kept in the log file itself,
+and the output after that goes to a ring of Segments segment files, <log>.1 to
+<log>.<Segments>, of about MaxBytes each (lines aren't split):  when the last
+is full, the oldest is emptied to make room, and the output dropped is marked
+in the log.   So both the beginning of the output of a chatty operation and
+its most recent output are kept.   If Segments is 0, only the beginning is.
+The updater caps op logs at the op_log_max_bytes and op_log_segments settings.
+
+The updater copies each op log into the session log when the operation ends
+(see CopyLog), a chunk at a time, so no log is ever read into memory whole.
+
+Sinks write with os.open and os.write, which the i/o protections of production
+interpreters (see starflow.system_io_override) leave alone:  an op log is
+opened by the updater's script around the operation, not by the operation.
+'''
+
+import os
+import sys
+import time
+import atexit
+
+LOG_BUFFER_BYTES = 2**16        # output without line breaks a sink holds back at most
+SYNC_INTERVAL = 1               # seconds between checks of a capped log for segments begun by other processes
+COPY_CHUNK_BYTES = 2**20        # bytes read at a time when copying or searching logs
+TAIL_POLL_INTERVAL = .5         # seconds between checks for new output when following a session
+DROPPED_MARK = '\n[... earlier output dropped:  the log of this operation is capped (see op_log_max_bytes) ...]\n\n'
+CAPPED_MARK = '\n[... further output dropped:  the log of this operation is capped (see op_log_max_bytes) ...]\n'
+
+SINKS = {}                      # open sinks of this process, by absolute path
+
+
+def GetSink(Path,MaxBytes = 0,Segments = 0):
+    '''
+    The sink of this process for the log at Path, opened if need be, so that
+    all the streams written to one log (e.g. stdout and stderr) share it.
+    '''
+    Key = os.path.abspath(Path)
+    if Key not in SINKS or SINKS[Key].fd is None:
+        SINKS[Key] = LogSink(Path,MaxBytes,Segments)
+    return SINKS[Key]
+
+
+def FlushAll():
+    for S in SINKS.values():
+        S.flush()
+
+atexit.register(FlushAll)
+
+
+class LogSink(object):
+    '''
+    File-like object that appends what's written to it to the log at Path,
+    a line at a time, capped as described above if MaxBytes > 0.
+    '''
+    softspace = 0
+
+    def __init__(self,Path,MaxBytes = 0,Segments = 0):
+        self.Path = Path
+        self.MaxBytes = MaxBytes
+        self.Segments = max(Segments,0)
+        self.Pid = os.getpid()
+        self.Buffer = []
+        self.Buffered = 0
+        self.Dropping = False
+        self.fd = None
+        self.Sync()
+
+    def Sync(self):
+        '''
+        Opens the file of the log that output goes to now.
+        '''
+        self.Open(CurrentSegment(self.Path,self.MaxBytes) if self.MaxBytes > 0 else 0)
+        self.Synced = time.time()
+
+    def Open(self,Segment,Truncate = False):
+        if self.fd is not None:
+            os.close(self.fd)
+        self.Segment = Segment
+        self.fd = os.open(SegmentPath(self.Path,Segment),os.O_WRONLY | os.O_CREAT | os.O_APPEND | (os.O_TRUNC if Truncate else 0),0666)
+        self.Size = os.fstat(self.fd).st_size
+
+    def Own(self):
+        #a forked child inherits its parent's sinks, and what the parent held back is the parent's to write
+        if self.Pid != os.getpid():
+            self.Pid = os.getpid()
+            self.Buffer = []
+            self.Buffered = 0
+
+    def write(self,s):
+        self.Own()
+        if isinstance(s,unicode):
+            s = s.encode('utf-8')
+        self.Buffer.append(s)
+        self.Buffered += len(s)
+        if '\n' in s or self.Buffered >= LOG_BUFFER_BYTES:
+            self.flush()
+
+    def writelines(self,Lines):
+        for l in Lines:
+            self.write(l)
+
+    def flush(self):
+        self.Own()
+        if self.Buffered == 0 or self.fd is None:
+            return
+        Data = ''.join(self.Buffer)
+        self.Buffer = []
+        self.Buffered = 0
+        if self.MaxBytes > 0:
+            if time.time() - self.Synced >= SYNC_INTERVAL:
+                self.Sync()
+            if self.Size >= self.MaxBytes:
+                if self.Segments > 0:
+                    self.Advance()
+                elif self.Dropping:
+                    return
+                else:
+                    self.Dropping = True
+                    Data = CAPPED_MARK
+        self.Write(Data)
+
+    def Advance(self):
+        '''
+        Goes on to the next segment of the ring, emptying it if it was used.
+        '''
+        Next = self.Segment % self.Segments + 1
+        Reused = Size(SegmentPath(self.Path,Next)) > 0
+        self.Open(Next,Truncate = True)
+        if Reused:
+            self.Write(DROPPED_MARK)
+
+    def Write(self,Data):
+        while Data:
+            n = os.write(self.fd,Data)
+            self.Size += n
+            Data = Data[n:]
+
+    def close(self):
+        self.flush()
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def isatty(self):
+        return False
+
+
+def SegmentPath(Path,i):
+    return Path if i == 0 else Path + '.' + str(i)
+
+
+def Size(Path):
+    try:
+        return os.stat(Path).st_size
+    except OSError:
+        return 0
+
+
+def CurrentSegment(Path,MaxBytes):
+    '''
+    Segment of a capped log that output goes to now:  the log file itself
+    until it's full, then the segment file written last.
+    '''
+    if Size(Path) < MaxBytes:
+        return 0
+    Ring = GetRing(Path)
+    return Ring[-1][1] if len(Ring) > 0 else 0
+
+
+def GetRing(Path):
+    '''
+    (modification time, index) of the segment files of a log, oldest first.
+    '''
+    Ring = []
+    i = 1
+    while True:
+        try:
+            st = os.stat(SegmentPath(Path,i))
+        except OSError:
+            break
+        Ring.append((st.st_mtime,i))
+        i += 1
+    Ring.sort()
+    return Ring
+
+
+def GetSegments(Path):
+    '''
+    Files of a log, in the order their output was written.
+    '''
+    return [SegmentPath(Path,i) for i in [0] + [i for (t,i) in GetRing(Path)]]
+
+
+def LogSize(Path):
+    return sum([Size(p) for p in GetSegments(Path)])
+
+
+def CopyLog(Path,F):
+    '''
+    Writes the output in the log at Path to the open file F, a chunk at a
+    time.
+    '''
+    for p in GetSegments(Path):
+        try:
+            fd = os.open(p,os.O_RDONLY)
+        except OSError:
+            continue
+        try:
+            while True:
+                Chunk = os.read(fd,COPY_CHUNK_BYTES)
+                if not Chunk:
+                    break
+                F.write(Chunk)
+        finally:
+            os.close(fd)
+
+
+def LastLines(Path,n):
+    '''
+    Last n lines in the log at Path, read from the end.
+    '''
+    Chunks = []
+    for p in reversed(GetSegments(Path)):
+        End = Size(p)
+        try:
+            fd = os.open(p,os.O_RDONLY)
+        except OSError:
+            continue
+        try:
+            while End > 0 and ''.join(Chunks).count('\n') <= n:
+                Start = max(End - COPY_CHUNK_BYTES,0)
+                os.lseek(fd,Start,os.SEEK_SET)
+                Chunks.insert(0,os.read(fd,End - Start))
+                End = Start
+        finally:
+            os.close(fd)
+        if ''.join(Chunks).count('\n') > n:
+            break
+    Lines = ''.join(Chunks).split('\n')
+    if Lines[-1] == '':
+        Lines.pop()
+    return Lines[-n:] if n > 0 else []
+
+
+def FollowSession(SsTemp,OpLogPrefix,Lines = 10,Follow = True,Out = None):
+    '''
+    Prints the output of the operations of the update session whose temp
+    directory is SsTemp as it is written, each line prefixed with the name of
+    its operation, along with the operations' starts and ends as recorded in
+    the session's journal (see starflow.journal).   The op logs are the files
+    in SsTemp whose names begin with OpLogPrefix.
+
+    It starts with the last Lines lines of the output of the operations in
+    flight, and, if Follow, goes on until the session ends.
+    '''
+    import starflow.journal as journal
+
+    Out = Out if Out is not None else sys.stdout
+    Events = journal.ReadJournal(SsTemp)
+    InFlight = journal.GetInFlight(Events)
+    Seen = len(Events)
+    Offsets = {}
+    Partial = {}
+    for op in GetOpLogs(SsTemp,OpLogPrefix):
+        Path = os.path.join(SsTemp,OpLogPrefix + op)
+        Offsets[op] = dict([(p,Size(p)) for p in GetSegments(Path)])
+        if op in InFlight:
+            for l in LastLines(Path,Lines):
+                Out.write('[' + op + '] ' + l + '\n')
+    Out.flush()
+
+    while Follow:
+        for op in GetOpLogs(SsTemp,OpLogPrefix):
+            Path = os.path.join(SsTemp,OpLogPrefix + op)
+            Data = ReadNew(Path,Offsets.setdefault(op,{}))
+            if Data:
+                Text = Partial.pop(op,'') + Data
+                Done = Text.split('\n')
+                if Done[-1]:
+                    Partial[op] = Done[-1]
+                for l in Done[:-1]:
+                    Out.write('[' + op + '] ' + l + '\n')
+        Events = journal.ReadJournal(SsTemp)
+        for (t,e,j) in Events[Seen:]:
+            Out.write('==> ' + time.strftime('%H:%M:%S',time.localtime(t)) + ' ' + e + (' ' + j if j else '') + '\n')
+        Seen = len(Events)
+        Out.flush()
+        if len(Events) > 0 and Events[-1][1] == 'END':
+            break
+        time.sleep(TAIL_POLL_INTERVAL)
+
+
+def GetOpLogs(SsTemp,OpLogPrefix):
+    '''
+    Operations with op logs in SsTemp.
+    '''
+    #operation names end with a python name, segment files with a number
+    return sorted([f[len(OpLogPrefix):] for f in os.listdir(SsTemp) if f.startswith(OpLogPrefix) and not f.split('.')[-1].isdigit()])
+
+
+def ReadNew(Path,Offsets):
+    '''
+    Output written to the log at Path since it was last read, as recorded in
+    Offsets, a dictionary of how far each of its files has been read.
+    '''
+    Data = []
+    for p in GetSegments(Path):
+        n = Size(p)
+        if n < Offsets.get(p,0):
+            #a segment file emptied for reuse
+            Offsets[p] = 0
+        if n > Offsets.get(p,0):
+            fd = os.open(p,os.O_RDONLY)
+            try:
+                os.lseek(fd,Offsets.get(p,0),os.SEEK_SET)
+                Data.append(os.read(fd,n - Offsets.get(p,0)))
+            finally:
+                os.close(fd)
+            Offsets[p] = n
+    return ''.join(Data)
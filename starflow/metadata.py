@@ -41,8 +41,11 @@ from starflow.utils import *
 from starflow.storage import StoredDocstring
 from starflow import static
 import starflow.de as de
+import starflow.logs as logs
+import starflow.tracing as tracing
 DE_MANAGER = de.DataEnvironmentManager()
 WORKING_DE = DE_MANAGER.working_de
+SUCCESS_TYPES = ['Success','CacheHit']     # exit types of calls that made their creates ('CacheHit':  restored from the op result cache)
 
 def AttachMetaData(NewMetaData,FileName = '',OperationName='',Resources = None,
                    creates = WORKING_DE.relative_metadata_dir):
@@ -94,6 +97,31 @@ def AttachMetaData(NewMetaData,FileName = '',OperationName='',Resources = None,
     ProcessMetaData(metapath,FileName if FileName else OperationName,extensions=['Attached'])
 
 
+@tracing.traced
+def RecordExitStatus(opname,Creates,ExitType,ExitStatus,Before,After):
+    '''
+    Appends a record of a run of operation opname to 
+    opmetadatapath(opname) + '/ExitStatusFile.csv'.   Besides the runs 
+    recorded by MakeRuntimeMetaData, the updater records this way the runs it 
+    abandons, e.g. stragglers it stops to submit again (ExitType 'Relaunched'). 
+    '''
+    if not PathExists(opmetadatapath(opname)):
+        MakeDirs(opmetadatapath(opname))
+    ESFName = opmetadatapath(opname) + '/ExitStatusFile.csv'
+    if not PathExists(ESFName):
+        F = open(ESFName,'w')
+        F.write('OperationName,ExitType,ExitStatus,TimeStamp,CreateList,CreateTimeStamps,Before,After,Runtime\n')
+        F.close()           
+    CreateString = '\t'.join(Creates)
+    CreateTimesList = [os.path.getmtime(l) if PathExists(l) else numpy.nan for l in Creates]
+    CreateTimesString = '\t'.join([str(x) for x in CreateTimesList])
+    TS = str(max(Before,max(CreateTimesList)))
+    NewESFData = ','.join([opname,ExitType, str(ExitStatus),TS , CreateString , CreateTimesString,str(Before),str(After),str(After - Before)]) + '\n'
+    esf = open(ESFName,'a') 
+    esf.write(NewESFData)
+    esf.close()     
+
+
 def MakeRuntimeMetaData(opname,Creates,OriginalTimes,OriginalDirInfo,RunOutput,ExitType,ExitStatus,Before,After,IsDifferent,TempSOIS):
 
     '''
@@ -135,7 +163,10 @@ def MakeRuntimeMetaData(opname,Creates,OriginalTimes,OriginalDirInfo,RunOutput,E
     
     strongcopy(opmetadatapath(opname) + '/MostRecentRunPrintout.txt',opmetadatapath(opname) + '/PreviousRunPrintout.txt')
     delete(opmetadatapath(opname) + '/MostRecentRunPrintout.txt')
-    strongcopy(TempSOIS,opmetadatapath(opname) + '/MostRecentRunPrintout.txt')
+    if PathExists(TempSOIS):
+        F = open(opmetadatapath(opname) + '/MostRecentRunPrintout.txt','w')
+        logs.CopyLog(TempSOIS,F)
+        F.close()
 
     for j in Creates:
         CRFName = metadatapath(j) + '/CreationRecord.csv'
@@ -160,21 +191,9 @@ def MakeRuntimeMetaData(opname,Creates,OriginalTimes,OriginalDirInfo,RunOutput,E
     pickle.dump(RunOutput,F)
     F.close()
     
-    ESFName = opmetadatapath(opname) + '/ExitStatusFile.csv'
-    if not PathExists(ESFName):
-        F = open(ESFName,'w')
-        F.write('OperationName,ExitType,ExitStatus,TimeStamp,CreateList,CreateTimeStamps,Before,After,Runtime\n')
-        F.close()           
-    CreateString = '\t'.join(Creates)
-    CreateTimesList = [os.path.getmtime(l) if PathExists(l) else numpy.nan for l in Creates]
-    CreateTimesString = '\t'.join([str(x) for x in CreateTimesList])
-    TS = str(max(Before,max(CreateTimesList)))
-    NewESFData = ','.join([opname,ExitType, str(ExitStatus),TS , CreateString , CreateTimesString,str(Before),str(After),rtime]) + '\n'
-    esf = open(ESFName,'a') 
-    esf.write(NewESFData)
-    esf.close()     
+    RecordExitStatus(opname,Creates,ExitType,ExitStatus,Before,After)
                 
-    if ExitType == 'Success':
+    if ExitType in SUCCESS_TYPES:
         Written = []
         if isinstance(RunOutput,dict) and 'MetaData' in RunOutput.keys() and isinstance(RunOutput['MetaData'],dict):    
             for j in RunOutput['MetaData'].keys():
@@ -209,7 +228,7 @@ def MakeRuntimeMetaData(opname,Creates,OriginalTimes,OriginalDirInfo,RunOutput,E
             'Deleting', kk, 'as it appears to old irrelevant associated metadata.'
             delete(kk)
 
-    if ExitType == 'Success':
+    if ExitType in SUCCESS_TYPES:
         for j in Creates:
             if IsDifferent[j] and PathExists(j):
                 MakeAutomaticMetaData(j)
@@ -536,8 +555,9 @@ def FindPtime(target,Simple=False):
             Data = tb.tabarray(SVfile = metapath,delimiter = ',', lineterminator='\n') 
             if len(Data) > 0:
                 Data.sort(order=['TimeStamp'])
-                if any(Data['ExitType'] == 'Success'):
-                    MostRecentSuccess = Data[Data['ExitType'] == 'Success']['TimeStamp'][-1]
+                Succeeded = numpy.array([e in SUCCESS_TYPES for e in Data['ExitType']],bool)
+                if any(Succeeded):
+                    MostRecentSuccess = Data[Succeeded]['TimeStamp'][-1]
                     MoreRecentFailures = Data[(Data['ExitType'] == 'Failure') & (Data['TimeStamp'] > MostRecentSuccess)]
                     if len(MoreRecentFailures) > 0:
                         LeastRecentFailure = MoreRecentFailures['TimeStamp'][0]
@@ -0,0 +1,210 @@
+'''
+Runtime predictions for update plans.
+
+Every call the updater makes to an operation is recorded, with its runtime, in
+the operation's ExitStatusFile.csv (see metadata.MakeRuntimeMetaData).   From
+that history this module predicts how long each operation in a plan will take
+(the median of its most recent successful runs), and from those predictions and
+the op-level dependency graph of the plan (see update.GetOpDependencies):
+
+    -- the critical path through the plan, i.e. the chain of dependent
+    operations whose runtimes add up to the most -- no number of workers can
+    finish the update sooner;
+    -- the predicted wall time of the update in each call mode:  one operation
+    after another in 'DIRECT' mode, and otherwise by simulating the updater's
+    dataflow scheduler (see update.DataflowUpdate) -- with a given number of
+    workers in 'LOCAL_PARALLEL' mode, and in the grid modes ('DRMAA' and
+    'LOCAL_DRMAA') with no bound on slots, short operations being batched into
+    array job tasks as the updater batches them (see update.BatchOps).
+
+Operations with no successful runs on record are assumed to take the median
+predicted runtime of the others (or DEFAULT_RUNTIME if no operation of the plan
+has a history), and are flagged as such in the report.
+
+The same history bounds how long the updater lets an operation run (see
+GetTimeLimits):  an operation that declares no timeout of its own (see
+starflow.budget) is stopped once it has run op_timeout_factor times the 99th
+percentile of its recent runtimes, and, in the grid call modes, one running
+STRAGGLER_FACTOR times its predicted runtime can be submitted again.
+'''
+
+import os
+import heapq
+import numpy
+import tabular as tb
+
+from starflow.utils import PathExists, Union, ListUnion
+from starflow.metadata import opmetadatapath
+
+HISTORY_RUNS = 5            # number of most recent successful runs a prediction is made from
+DEFAULT_RUNTIME = 1.0       # seconds assumed for an operation when nothing in the plan has a history
+TIMEOUT_HISTORY_RUNS = 100  # number of most recent successful runs timeouts are made from
+TIMEOUT_MIN_RUNS = 3        # successful runs on record an operation needs to be given a timeout from its history
+MIN_TIMEOUT = 300           # shortest timeout, in seconds, made from an operation's history
+STRAGGLER_FACTOR = 3        # an operation running this many times its predicted runtime is a straggler
+MIN_STRAGGLER_SECONDS = 60  # ... if it has run at least this long
+
+
+def GetRuntimeHistory(op):
+    '''
+    Runtimes, in seconds and oldest first, of the successful runs of op on
+    record.   Calls whose outputs were restored from the op result cache
+    (ExitType 'CacheHit') are not runs, and are left out.
+    '''
+    ESFName = opmetadatapath(op) + '/ExitStatusFile.csv'
+    if not PathExists(ESFName):
+        return []
+    try:
+        ESD = tb.tabarray(SVfile = ESFName,delimiter = ',', lineterminator='\n',verbosity = 0)
+        ESD = ESD[ESD['ExitType'] == 'Success']
+        ESD.sort(order = ['Before'])
+        return [float(r) for r in ESD['Runtime']]
+    except:
+        return []
+
+
+def PredictRuntimes(Ops):
+    '''
+    Returns [Durations,Unknown], where Durations maps each operation in Ops to
+    its predicted runtime, and Unknown is the set of operations whose
+    prediction is a guess for lack of history.
+    '''
+    Durations = {}
+    for op in Ops:
+        History = GetRuntimeHistory(op)[-HISTORY_RUNS:]
+        if len(History) > 0:
+            Durations[op] = float(numpy.median(History))
+    Unknown = set(Ops).difference(Durations.keys())
+    Guess = float(numpy.median(Durations.values())) if len(Durations) > 0 else DEFAULT_RUNTIME
+    Durations.update(dict([(op,Guess) for op in Unknown]))
+    return [Durations,Unknown]
+
+
+def GetTimeLimits(op,Timeout = None,Factor = 0):
+    '''
+    Returns [Timeout,Straggling]:  the seconds op may run before it's
+    stopped, and the seconds after which it's a straggler, or None for no
+    limit.   The timeout is the declared Timeout if not None, otherwise, if
+    Factor > 0 and op has at least TIMEOUT_MIN_RUNS successful runs on record,
+    Factor times the 99th percentile of their runtimes (but at least
+    MIN_TIMEOUT).   op is a straggler once it has run STRAGGLER_FACTOR times
+    its predicted runtime (but at least MIN_STRAGGLER_SECONDS), if that is
+    short of its timeout.
+    '''
+    History = GetRuntimeHistory(op)[-TIMEOUT_HISTORY_RUNS:]
+    if len(History) < TIMEOUT_MIN_RUNS:
+        return [Timeout,None]
+    if Timeout is None and Factor > 0:
+        Timeout = max(Factor * float(numpy.percentile(History,99)),MIN_TIMEOUT)
+    Straggling = max(STRAGGLER_FACTOR * float(numpy.median(History[-HISTORY_RUNS:])),MIN_STRAGGLER_SECONDS)
+    return [Timeout,Straggling if Timeout is None or Straggling < Timeout else None]
+
+
+def CriticalPath(ScriptsToCall,Upstream,Durations):
+    '''
+    Returns [Length,Path], the critical path through the plan as a list of
+    operations, upstream first, and the sum of their runtimes.
+    '''
+    RoundOf = dict([(j,i) for (i,J) in enumerate(ScriptsToCall) for j in J])
+    Finish = {}
+    Previous = {}
+    for j in sorted(RoundOf.keys(),key = lambda j : RoundOf[j]):
+        Before = [k for k in Upstream[j] if k in Finish]
+        Previous[j] = max(Before,key = lambda k : Finish[k]) if len(Before) > 0 else None
+        Finish[j] = Durations[j] + (Finish[Previous[j]] if Previous[j] is not None else 0)
+    if len(Finish) == 0:
+        return [0,[]]
+    j = max(Finish.keys(),key = lambda j : Finish[j])
+    Length = Finish[j]
+    Path = []
+    while j is not None:
+        Path.insert(0,j)
+        j = Previous[j]
+    return [Length,Path]
+
+
+def SimulateDataflow(ScriptsToCall,Upstream,Durations,Workers = None,Batch = None,Unknown = ()):
+    '''
+    Wall time of the plan when run by update.DataflowUpdate with the given
+    number of workers (None for no bound, as on a grid), if every operation
+    takes its predicted runtime.   
+    
+    With Batch, the operations ready at once are grouped as the updater 
+    groups them on a grid:  Batch(Ops,Durations,Unknown), where Unknown are 
+    the operations whose predictions are guesses, gives jobs, each a list of 
+    tasks, each a list of operations that run one after another and are done 
+    when the task ends.
+    '''
+    RoundOf = dict([(j,i) for (i,J) in enumerate(ScriptsToCall) for j in J])
+    Pending = set(RoundOf.keys())
+    Done = set([])
+    Running = []
+    Now = 0
+    while len(Pending) > 0 or len(Running) > 0:
+        Ready = [j for j in Pending if Upstream[j].issubset(Done)]
+        if len(Ready) == 0 and len(Running) == 0:
+            First = min([RoundOf[j] for j in Pending])
+            Ready = [j for j in Pending if RoundOf[j] == First]
+        Ready.sort(key = lambda j : (RoundOf[j],j))
+        if Workers is not None:
+            Ready = Ready[:max(Workers - len(Running),0)]
+        Tasks = ListUnion(Batch(Ready,Durations,Unknown)) if Batch is not None and len(Ready) > 0 else [[j] for j in Ready]
+        for T in Tasks:
+            Pending.difference_update(T)
+            heapq.heappush(Running,(Now + sum([Durations[j] for j in T]),T))
+        (Now,T) = heapq.heappop(Running)
+        Done.update(T)
+    return Now
+
+
+def PlanReport(ScriptsToCall,Upstream,Workers,Batch = None):
+    '''
+    Readable report of the predicted runtimes, critical path and wall times
+    of an update plan, with Workers workers in 'LOCAL_PARALLEL' mode, and with
+    operations batched on a grid by Batch (see SimulateDataflow).
+    '''
+    Ops = Union(ScriptsToCall)
+    if len(Ops) == 0:
+        return ''
+    [Durations,Unknown] = PredictRuntimes(Ops)
+    RoundOf = dict([(j,i) for (i,J) in enumerate(ScriptsToCall) for j in J])
+    Width = max([len(j) for j in Ops])
+
+    Lines = ['Predicted runtimes (median of the ' + str(HISTORY_RUNS) + ' most recent successful runs):']
+    for j in sorted(Ops,key = lambda j : (RoundOf[j],j)):
+        Lines.append('    ' + j.ljust(Width) + '  ' + FormatDuration(Durations[j]) + ('  (no runs on record -- guessed)' if j in Unknown else ''))
+
+    Serial = sum(Durations.values())
+    [Length,Path] = CriticalPath(ScriptsToCall,Upstream,Durations)
+    Parallel = SimulateDataflow(ScriptsToCall,Upstream,Durations,Workers)
+    Grid = SimulateDataflow(ScriptsToCall,Upstream,Durations,None,Batch,Unknown)
+    Lines += ['',
+              'Total operation time: ' + FormatDuration(Serial),
+              'Critical path (' + FormatDuration(Length) + '):',
+              '    ' + '\n    -> '.join(Path),
+              '',
+              'Predicted wall time:']
+    for (Label,t) in [('DIRECT',Serial),
+                      ('LOCAL_PARALLEL, ' + str(Workers) + ' worker(s)',Parallel),
+                      ('DRMAA, no bound on slots',Grid),
+                      ('no bound on workers',Length)]:
+        Lines.append('    ' + (Label + ':').ljust(32) + FormatDuration(t).ljust(10) + '(speedup ' + FormatSpeedup(Serial,t) + ')')
+    if len(Unknown) > 0:
+        Lines += ['',str(len(Unknown)) + ' of the ' + str(len(Ops)) + ' operations have no runs on record, so these predictions are rough.']
+    return '\n'.join(Lines)
+
+
+def FormatDuration(t):
+    if t < 10:
+        return '%.1fs' % t
+    t = int(round(t))
+    if t < 60:
+        return str(t) + 's'
+    elif t < 3600:
+        return '%dm%02ds' % (t / 60,t % 60)
+    else:
+        return '%dh%02dm%02ds' % (t / 3600,(t % 3600) / 60,t % 60)
+
+
+def FormatSpeedup(Serial,Parallel):
+    return ('%.1fx' % (Serial / Parallel)) if Parallel > 0 else 'n/a'
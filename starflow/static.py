@@ -23,6 +23,9 @@ LOCAL_ARCHIVE_DIR = os.path.join(LOCAL_CFG_DIR,'.archive')
 LOCAL_METADATA_DIR = os.path.join(LOCAL_CFG_DIR,'.metadata')
 LOCAL_LINKS_DIR = os.path.join(LOCAL_CFG_DIR,'.links')
 LOCAL_MODULES_DIR = os.path.join(LOCAL_CFG_DIR,'.modules')
+LOCAL_MANIFEST_DIR = os.path.join(LOCAL_CFG_DIR,'.manifests')
+LOCAL_CACHE_DIR = os.path.join(LOCAL_CFG_DIR,'.cache')
+LOCAL_LOCK_DIR = os.path.join(LOCAL_CFG_DIR,'.locks')
 LOCAL_SETUP_MODULE = 'setupfunctions'
 LOCAL_SETUP_FILE = os.path.join(LOCAL_CFG_DIR,LOCAL_SETUP_MODULE + '.py')
 LOCAL_LIVE_MODULE_FILTER_FILE = os.path.join(LOCAL_CFG_DIR,'live_module_filters')
@@ -37,7 +40,27 @@ GLOBAL_SETTINGS = {
     # setting: (type, required, default)
     'python_executable' : (str, True, 'python',None),
     'pythonpath' : (str, True, '',None),
-    'default_callmode' : (str, True, 'DIRECT',None)
+    'default_callmode' : (str, True, 'DIRECT',None),
+    'default_jobs' : (int, True, 0, None),    # 0 means one job per cpu
+    'worker_max_ops' : (int, True, 100, None),   # ops a warm worker runs before it is recycled; 0 turns warm workers off
+    'worker_preload' : (str, True, 'numpy', None),  # comma-separated modules warm workers import up front
+    'fast_ops_in_process' : (bool, True, True, None),   # fast ops are called by the updater itself, in its warm worker, rather than as jobs
+    'op_cache_max_bytes' : (int, True, 2**30, None),  # size bound of the op result cache; 0 turns the cache off
+    'archive_keep_versions' : (int, True, 10, None),  # archived versions kept per target; 0 keeps all
+    'archive_max_bytes' : (int, True, 0, None),       # size bound of the archive; 0 means no bound
+    'max_threads' : (int, True, 0, None),             # threads the ops of a local update may use at once; 0 means one per cpu
+    'max_memory' : (str, True, '', None),             # memory the ops of a local update may use at once, e.g. 16G; empty means all of it
+    'max_io_ops' : (int, True, 1, None),              # i/o heavy ops run at once in a local update; 0 means no bound
+    'drmaa_threads_spec' : (str, True, '-pe smp {threads}', None),     # native specification of a grid job's thread request
+    'drmaa_memory_spec' : (str, True, '-l h_vmem={memory_per_thread_mb}M', None),   # ... of its memory request
+    'drmaa_scratch_spec' : (str, True, '', None),     # ... of its scratch disk request; empty means it isn't passed on
+    'grid_batch_seconds' : (int, True, 60, None),     # grid ops whose runs take less are batched into array jobs of about this length; 0 turns batching off
+    'op_log_max_bytes' : (int, True, 2**24, None),    # size of each segment of an op's output log; 0 means no bound
+    'op_log_segments' : (int, True, 2, None),         # segments of an op's most recent output kept past the first one (see starflow.logs)
+    'op_timeout_factor' : (int, True, 10, None),      # ops with no declared timeout are stopped after this many times their slowest recent runs; 0 turns these timeouts off
+    'relaunch_stragglers' : (bool, True, False, None), # grid ops running far longer than usual are stopped and submitted again
+    'link_jobs' : (int, True, 0, None),               # modules whose links are computed at once, each in its own process; 0 means one per cpu, 1 computes them in turn in this process
+    'link_timeout' : (int, True, 600, None)           # seconds computing the links of one module may take before it's stopped and counted as failed to load; 0 means no bound
 }
 ##local
 LOCAL_SETTINGS = {
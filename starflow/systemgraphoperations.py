@@ -12,6 +12,7 @@ import numpy, time, os, cPickle
 from starflow.utils import *
 from starflow.linkmanagement import *
 from starflow.metadata import metadatapath, opmetadatapath
+from starflow.linkstore import LinkStore, LINKSTOREFILE
 import tabular as tb
 import os
 
@@ -23,7 +24,7 @@ os.chdir(WORKING_DE.temp_dir)
 
 GraphIsTooLarge = 500
 
-def MakeLocalLinkList(Path,depends_on = os.path.join(WORKING_DE.relative_links_dir,'StoredTimes'), creates = (WORKING_DE.relative_metadata_dir,)):
+def MakeLocalLinkList(Path,depends_on = os.path.join(WORKING_DE.relative_links_dir,LINKSTOREFILE), creates = (WORKING_DE.relative_metadata_dir,)):
     '''
     Given, Path, a path string describing a location in the Data Environment, 
     get the 2-neighborhood graph of the linklist local to that path.
@@ -70,7 +71,9 @@ def MakeLocalLinkList(Path,depends_on = os.path.join(WORKING_DE.relative_links_d
             SeedFiles = [x for x in FileList if not x.split('/')[-1] == '__init__.py' and (x not in StoredFileList.keys() or os.path.getmtime(x) > StoredFileList[x])]      
             
     F = open(LiveModulePath,'wb')
-    SFileDict = dict([(x[0],x[1]) for x in numpy.load(os.path.join(WORKING_DE.links_dir,'StoredTimes')) if x[0] in FileList])
+    Store = LinkStore(WORKING_DE.links_dir)
+    SFileDict = dict([(x[0],x[1]) for x in Store.Times() if x[0] in FileList])
+    Store.Close()
     cPickle.dump(SFileDict,F)
     F.close()
     
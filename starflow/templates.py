@@ -18,6 +18,26 @@ GLOBAL_CONFIG = """
 [global]
 python_executable=%(python_executable)s
 default_callmode=%(default_callmode)s
+default_jobs=%(default_jobs)s
+worker_max_ops=%(worker_max_ops)s
+worker_preload=%(worker_preload)s
+fast_ops_in_process=%(fast_ops_in_process)s
+op_cache_max_bytes=%(op_cache_max_bytes)s
+archive_keep_versions=%(archive_keep_versions)s
+archive_max_bytes=%(archive_max_bytes)s
+max_threads=%(max_threads)s
+max_memory=%(max_memory)s
+max_io_ops=%(max_io_ops)s
+drmaa_threads_spec=%(drmaa_threads_spec)s
+drmaa_memory_spec=%(drmaa_memory_spec)s
+drmaa_scratch_spec=%(drmaa_scratch_spec)s
+grid_batch_seconds=%(grid_batch_seconds)s
+op_log_max_bytes=%(op_log_max_bytes)s
+op_log_segments=%(op_log_segments)s
+op_timeout_factor=%(op_timeout_factor)s
+relaunch_stragglers=%(relaunch_stragglers)s
+link_jobs=%(link_jobs)s
+link_timeout=%(link_timeout)s
 """ % dictk(static.GLOBAL_SETTINGS,2)
 
 LOCAL_CONFIG = """
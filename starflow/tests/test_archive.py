@@ -0,0 +1,129 @@
+import os
+import stat
+import shutil
+import tempfile
+from starflow.tests import StarFlowTest
+from starflow.archive import ArchiveVersion, Restore, GetVersions, SaveVersions, GetBlobPath
+
+def Write(path,Contents,Mode = None,Time = None):
+    F = open(path,'w')
+    F.write(Contents)
+    F.close()
+    if Mode is not None:
+        os.chmod(path,Mode)
+    if Time is not None:
+        os.utime(path,(Time,Time))
+
+def Describe(path):
+    '''
+    Contents, permission bits and mtime of each file below path (by relative
+    path), and the permission bits of each directory.
+    '''
+    D = {}
+    for (root,dirs,files) in os.walk(path):
+        rel = os.path.relpath(root,path)
+        rel = '' if rel == '.' else rel
+        for d in dirs:
+            D[os.path.join(rel,d)] = stat.S_IMODE(os.stat(os.path.join(root,d)).st_mode)
+        for f in files:
+            p = os.path.join(root,f)
+            s = os.stat(p)
+            D[os.path.join(rel,f)] = (open(p).read(),stat.S_IMODE(s.st_mode),int(s.st_mtime))
+    return D
+
+class TestArchive(StarFlowTest):
+
+    def setUp(self):
+        self.Dir = tempfile.mkdtemp()
+        self.Target = os.path.join(self.Dir,'out')
+        self.Outside = os.path.join(self.Dir,'outside.txt')
+        Write(self.Outside,'outside',0644,1000000000)
+
+    def tearDown(self):
+        Digests = set([e[2] for v in GetVersions(self.Target) for e in v['Manifest'].values() if e is not None])
+        SaveVersions(self.Target,[])
+        for d in Digests:
+            if os.path.exists(GetBlobPath(d)):
+                os.remove(GetBlobPath(d))
+        for (root,dirs,files) in os.walk(self.Dir):
+            for d in dirs:
+                os.chmod(os.path.join(root,d),0755)
+        shutil.rmtree(self.Dir)
+
+    def MakeVersion(self,Contents):
+        os.makedirs(os.path.join(self.Target,'sub'))
+        Write(os.path.join(self.Target,'a.txt'),Contents,0640,1200000000)
+        Write(os.path.join(self.Target,'sub','run.sh'),'#!/bin/sh\n',0755,1300000000)
+        os.symlink(self.Outside,os.path.join(self.Target,'sub','link.txt'))
+        os.chmod(os.path.join(self.Target,'sub'),0750)
+        os.utime(self.Target,(1400000000,1400000000))
+
+    def test_round_trip(self):
+        self.MakeVersion('version 1')
+        Before = Describe(self.Target)
+        ArchiveVersion(self.Target,self.Target)
+        assert not os.path.exists(self.Target)
+        #the file a symbolic link led to is left alone
+        assert open(self.Outside).read() == 'outside'
+        [V] = GetVersions(self.Target)
+        assert V['Kind'] == 'Superseded' and V['Time'] == 1400000000
+        assert V['Size'] == len('version 1') + len('#!/bin/sh\n') + len('outside')
+
+        To = os.path.join(self.Dir,'restored')
+        assert Restore(self.Target,To = To) == To
+        After = Describe(To)
+        assert After == Before
+        assert After['sub'] == 0750 and After['a.txt'][1:] == (0640,1200000000) and After['sub/run.sh'][1] == 0755
+        #symbolic links are restored as the contents they led to
+        assert not os.path.islink(os.path.join(To,'sub','link.txt'))
+        assert After['sub/link.txt'] == ('outside',0644,1000000000)
+        assert int(os.path.getmtime(To)) == 1400000000
+
+    def test_linked_target(self):
+        #a target that is itself a symbolic link:  the link is removed, what it leads to is kept
+        os.symlink(self.Outside,self.Target)
+        ArchiveVersion(self.Target,self.Target)
+        assert not os.path.lexists(self.Target) and open(self.Outside).read() == 'outside'
+        Restore(self.Target)
+        assert not os.path.islink(self.Target)
+        assert open(self.Target).read() == 'outside'
+        assert int(os.path.getmtime(self.Target)) == 1000000000
+
+    def test_in_place(self):
+        self.MakeVersion('version 1')
+        ArchiveVersion(self.Target,self.Target)
+        self.MakeVersion('version 2')
+        Second = Describe(self.Target)
+        #restoring in place archives the current version first
+        Restore(self.Target,Version = 0)
+        Versions = GetVersions(self.Target)
+        assert len(Versions) == 2
+        assert open(os.path.join(self.Target,'a.txt')).read() == 'version 1'
+        Restore(self.Target,To = os.path.join(self.Dir,'second'))
+        assert Describe(os.path.join(self.Dir,'second')) == Second
+        #archiving the contents of the latest version again adds no version
+        ArchiveVersion(self.Target,os.path.join(self.Dir,'second'))
+        assert len(GetVersions(self.Target)) == 2
+
+    def test_deduplication(self):
+        self.MakeVersion('version 1')
+        ArchiveVersion(self.Target,self.Target)
+        self.MakeVersion('version 2')
+        ArchiveVersion(self.Target,self.Target)
+        [V1,V2] = GetVersions(self.Target)
+        assert V1['Manifest']['a.txt'][2] != V2['Manifest']['a.txt'][2]
+        for r in ['sub/run.sh','sub/link.txt']:
+            assert V1['Manifest'][r][2] == V2['Manifest'][r][2]
+            assert os.path.exists(GetBlobPath(V1['Manifest'][r][2]))
+
+    def test_no_versions(self):
+        try:
+            Restore(self.Target)
+        except ValueError:
+            pass
+        else:
+            assert False, 'restored a target with no versions'
+
+if __name__ == "__main__":
+    import nose
+    nose.main(module='starflow.tests')
@@ -0,0 +1,73 @@
+import starflow.budget as budget
+from starflow.tests import StarFlowTest
+from starflow.budget import ParseResources, ParseSize, ParseDuration, GetNeeds, GetDefaultThreads, GetThreadEnv, Fits, Take, Give
+
+BUDGET = {'threads':4,'memory':2**30,'scratch':10*2**30,'io':1}
+
+class TestBudget(StarFlowTest):
+
+    def test_parse(self):
+        assert ParseSize(512) == 512 and ParseSize('1K') == 1024
+        assert ParseSize('8G') == 8*2**30 and ParseSize('1.5gb') == 3*2**29 and ParseSize('2 MiB') == 2*2**20
+        assert ParseDuration(90) == 90 and ParseDuration('90s') == 90 and ParseDuration('30m') == 1800 and ParseDuration('2H') == 7200
+        for (Parse,s) in [(ParseSize,'8X'),(ParseSize,'G'),(ParseDuration,'2w')]:
+            try:
+                Parse(s)
+            except ValueError:
+                pass
+            else:
+                assert False, s
+        R = ParseResources({'threads':0,'memory':'1G','io':1,'timeout':'1m'})
+        assert R == {'threads':1,'memory':2**30,'scratch':0,'io':True,'timeout':60.0}
+        assert ParseResources({}) == budget.DEFAULT_RESOURCES
+
+    def test_limits(self):
+        Free = dict(BUDGET)
+        Whole = GetNeeds(ParseResources({'threads':4,'memory':2**30,'io':True}),1)
+        assert Fits(Whole,Free)
+        Take(Free,Whole)
+        assert Free == {'threads':0,'memory':0,'scratch':10*2**30,'io':0}
+        #nothing more fits, not even a single thread
+        assert not Fits(GetNeeds(ParseResources({}),1),Free)
+        assert Fits(GetNeeds(ParseResources({'scratch':'10G'}),0),Free)
+        Give(Free,Whole)
+        assert Free == BUDGET
+
+        #one byte, thread or i/o operation over is too much
+        for Declared in [{'memory':2**30 + 1},{'threads':5},{'scratch':10*2**30 + 1}]:
+            assert not Fits(GetNeeds(ParseResources(Declared),1),BUDGET), Declared
+        Free = dict(BUDGET)
+        Take(Free,GetNeeds(ParseResources({'io':True}),1))
+        assert not Fits(GetNeeds(ParseResources({'io':True}),1),Free)
+        assert Fits(GetNeeds(ParseResources({'threads':3}),1),Free)
+
+        #an operation asking for more than the whole budget runs alone, and leaves it as it was
+        Free = dict(BUDGET)
+        Over = GetNeeds(ParseResources({'threads':8,'memory':'2G'}),1)
+        Take(Free,Over)
+        assert Free['threads'] == -4 and not Fits(GetNeeds(ParseResources({}),1),Free)
+        Give(Free,Over)
+        assert Free == BUDGET
+
+    def test_threads(self):
+        assert GetDefaultThreads(BUDGET,3) == 1 and GetDefaultThreads(BUDGET,2) == 2 and GetDefaultThreads(BUDGET,0) == 4
+        assert GetDefaultThreads({'threads':2},8) == 1
+        assert GetNeeds(ParseResources({}),2)['threads'] == 2
+        assert GetNeeds(ParseResources({'threads':3}),2)['threads'] == 3
+        assert GetThreadEnv(ParseResources({})) == {}
+        assert GetThreadEnv(ParseResources({}),2) == dict([(v,'2') for v in budget.THREAD_ENV_VARS])
+        assert GetThreadEnv(ParseResources({'threads':3}),2)['OMP_NUM_THREADS'] == '3'
+
+    def test_native_specification(self):
+        Specs = budget.DRMAA_SPECS
+        budget.DRMAA_SPECS = [('threads','-pe smp {threads}'),('memory','-l h_vmem={memory_per_thread_mb}M'),('scratch','')]
+        try:
+            assert budget.NativeSpecification(ParseResources({})) == ''
+            assert budget.NativeSpecification(ParseResources({'threads':4,'memory':'1G','scratch':'1G'})) == '-pe smp 4 -l h_vmem=256M'
+            assert budget.NativeSpecification(ParseResources({'memory':1})) == '-l h_vmem=1M'
+        finally:
+            budget.DRMAA_SPECS = Specs
+
+if __name__ == "__main__":
+    import nose
+    nose.main(module='starflow.tests')
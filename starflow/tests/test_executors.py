@@ -0,0 +1,58 @@
+import os
+import shutil
+import tempfile
+from starflow.tests import StarFlowTest
+import starflow.executors as executors
+import starflow.localdrmaa as localdrmaa
+
+def WaitAll(Executor,JobIds,Timeout = 60):
+    Results = {}
+    while len(Results) < len(JobIds):
+        Ended = Executor.Wait(Timeout)
+        assert Ended is not None, 'jobs did not end'
+        Results[Ended[0]] = Ended[1]
+    return Results
+
+class TestLocalDrmaa(StarFlowTest):
+
+    def setUp(self):
+        self.Dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.Dir)
+
+    def test_placeholders(self):
+        #as in DRMAA, PARAMETRIC_INDEX is replaced in paths, not in arguments
+        Session = localdrmaa.Session(Slots = 2)
+        jt = Session.createJobTemplate()
+        jt.remoteCommand = '/bin/sh'
+        jt.args = ['-c',"echo '" + localdrmaa.JobTemplate.PARAMETRIC_INDEX + "' $SGE_TASK_ID"]
+        jt.workingDirectory = self.Dir
+        jt.outputPath = ':' + os.path.join(self.Dir,'out.' + localdrmaa.JobTemplate.PARAMETRIC_INDEX)
+        JobIds = Session.runBulkJobs(jt,1,2,1)
+        Session.synchronize(JobIds)
+        for i in [1,2]:
+            assert open(os.path.join(self.Dir,'out.' + str(i))).read().split() == [localdrmaa.JobTemplate.PARAMETRIC_INDEX,str(i)]
+
+    def test_batch(self):
+        Executor = executors.GetExecutor('LOCAL_DRMAA',2)
+        Outputs = [os.path.join(self.Dir,'task' + str(i)) for i in range(3)]
+        Scripts = ["open(" + repr(f) + ",'w').write('done')" for f in Outputs]
+        JobIds = Executor.SubmitBatch(Scripts,'batch',os.path.join(self.Dir,'batch_out'))
+        Results = WaitAll(Executor,JobIds)
+        Executor.Close()
+        assert len(JobIds) == 3
+        assert all([Results[j]['ExitStatus'] == 0 and not Results[j]['Aborted'] for j in JobIds])
+        assert [open(f).read() for f in Outputs] == ['done'] * 3
+        assert all([os.path.exists(os.path.join(self.Dir,'batch_out.' + str(i))) for i in [1,2,3]])
+
+    def test_batch_failure(self):
+        Executor = executors.GetExecutor('LOCAL_DRMAA',2)
+        JobIds = Executor.SubmitBatch(["pass","raise ValueError('task failed')"],'batch',os.path.join(self.Dir,'batch_out'))
+        Results = WaitAll(Executor,JobIds)
+        Executor.Close()
+        assert [Results[j]['ExitStatus'] == 0 for j in JobIds] == [True,False]
+
+if __name__ == "__main__":
+    import nose
+    nose.main(module='starflow.tests')
@@ -0,0 +1,101 @@
+import os
+import shutil
+import tempfile
+import starflow.hashing as hashing
+from starflow.tests import StarFlowTest
+from starflow.hashing import MakeManifest, ManifestIsCurrent, SameContents, SubManifest, SaveManifest, LoadManifest
+
+def Write(path,Contents):
+    F = open(path,'w')
+    F.write(Contents)
+    F.close()
+
+def Touch(path,Seconds):
+    s = os.stat(path)
+    os.utime(path,(s.st_atime,s.st_mtime + Seconds))
+
+class TestManifests(StarFlowTest):
+
+    def setUp(self):
+        self.Dir = tempfile.mkdtemp()
+        self.Top = os.path.join(self.Dir,'top')
+        os.makedirs(os.path.join(self.Top,'sub','empty'))
+        Write(os.path.join(self.Top,'a.txt'),'aaaa')
+        Write(os.path.join(self.Top,'sub','b.txt'),'bbbb')
+
+    def tearDown(self):
+        shutil.rmtree(self.Dir)
+
+    def test_manifest(self):
+        M = MakeManifest(self.Top)
+        assert sorted(M.keys()) == ['','a.txt','sub','sub/b.txt','sub/empty']
+        assert [M[r] for r in ['','sub','sub/empty']] == [None,None,None]
+        assert M['a.txt'][0] == 4 and M['a.txt'][2] != M['sub/b.txt'][2]
+        assert MakeManifest(self.Top,Threads = 1) == M
+        F = MakeManifest(os.path.join(self.Top,'a.txt'))
+        assert F.keys() == [''] and F[''] == M['a.txt']
+        assert SubManifest(M,'sub/') == {'':None,'b.txt':M['sub/b.txt'],'empty':None}
+        assert SubManifest(M,'') == M
+
+    def test_mmap(self):
+        Threshold = hashing.MMAP_THRESHOLD
+        path = os.path.join(self.Top,'a.txt')
+        Digest = hashing.HashFile(path)
+        hashing.MMAP_THRESHOLD = 1
+        try:
+            assert hashing.HashFile(path) == Digest
+        finally:
+            hashing.MMAP_THRESHOLD = Threshold
+
+    def test_mtime(self):
+        #a new mtime alone makes a manifest out of date, but not different in contents
+        M = MakeManifest(self.Top)
+        assert ManifestIsCurrent(M,self.Top)
+        Touch(os.path.join(self.Top,'sub','b.txt'),10)
+        assert not ManifestIsCurrent(M,self.Top)
+        N = MakeManifest(self.Top)
+        assert N != M
+        assert SameContents(M,N) and SameContents(N,M)
+
+    def test_contents(self):
+        #same size and mtime, different contents:  only the digest tells
+        path = os.path.join(self.Top,'a.txt')
+        os.utime(path,(1000000000,1000000000))
+        M = MakeManifest(self.Top)
+        Write(path,'abcd')
+        os.utime(path,(1000000000,1000000000))
+        assert ManifestIsCurrent(M,self.Top)
+        assert not SameContents(M,MakeManifest(self.Top))
+        Write(path,'aaaa')
+        assert SameContents(M,MakeManifest(self.Top))
+
+    def test_structure(self):
+        M = MakeManifest(self.Top)
+        Write(os.path.join(self.Top,'sub','c.txt'),'')
+        assert not ManifestIsCurrent(M,self.Top)
+        assert not SameContents(M,MakeManifest(self.Top))
+        os.remove(os.path.join(self.Top,'sub','c.txt'))
+        #a file replaced by a directory of the same name
+        os.remove(os.path.join(self.Top,'a.txt'))
+        os.mkdir(os.path.join(self.Top,'a.txt'))
+        N = MakeManifest(self.Top)
+        assert sorted(N.keys()) == sorted(M.keys())
+        assert not ManifestIsCurrent(M,self.Top)
+        assert not SameContents(M,N)
+        shutil.rmtree(self.Top)
+        assert not ManifestIsCurrent(M,self.Top)
+        assert not ManifestIsCurrent(None,self.Dir)
+
+    def test_save(self):
+        M = MakeManifest(self.Top)
+        ManifestFile = os.path.join(self.Dir,'manifest')
+        assert LoadManifest(ManifestFile) is None
+        SaveManifest(M,ManifestFile)
+        assert LoadManifest(ManifestFile) == M
+        assert sorted(os.listdir(self.Dir)) == ['manifest','top']
+        Write(ManifestFile,'not a pickle')
+        assert LoadManifest(ManifestFile) is None
+
+if __name__ == "__main__":
+    import nose
+    nose.main(module='starflow.tests')
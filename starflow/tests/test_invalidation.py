@@ -0,0 +1,125 @@
+import random
+from starflow.tests import StarFlowTest
+from starflow.linkstore import MakeLinkList
+from starflow.invalidation import PlanGraph, CALLED, CHANGED
+
+SEEDS = 200
+OPS = 8
+
+def DependsOn(p,op):
+    return ('DependsOn',p,p,op,op,'None',op,0)
+
+def CreatedBy(op,p):
+    return ('CreatedBy',op,op,p,p,op,op,0)
+
+def Dummy(p,op):
+    return ('Dummy',p,p,op,op,'None','None',0)
+
+#raw -> A -> a -> B -> b -> C -> c, and raw2 -> D -> d -> C;  E only reached through a dummy link
+PLAN = [DependsOn('../Data/raw','A'),CreatedBy('A','../Data/a'),
+        DependsOn('../Data/a','B'),CreatedBy('B','../Data/b'),
+        DependsOn('../Data/b','C'),CreatedBy('C','../Data/c'),
+        DependsOn('../Data/raw2','D'),CreatedBy('D','../Data/d'),
+        DependsOn('../Data/d','C'),
+        Dummy('../Data/b/dummy','E'),CreatedBy('E','../Data/e')]
+ROOTS = [PLAN[0],PLAN[6],PLAN[9]]
+
+def Called(Plan,View):
+    '''
+    Scripts still activated in View, by brute force:  propagating from the
+    roots of the plan through all the links not excluded.
+    '''
+    Reached = set([])
+    Grew = True
+    while Grew:
+        Grew = False
+        for i in range(len(Plan.Sources)):
+            if i not in Plan.Excluded[View] and (Plan.Root[i] or Plan.Sources[i] in Reached) and Plan.Targets[i] not in Reached:
+                Reached.add(Plan.Targets[i])
+                Grew = True
+    assert Reached == Plan.Reached[View]
+    return set([s for s in Plan.Creates.keys() if any([i not in Plan.Excluded[View] and Plan.Sources[i] in Reached for i in Plan.Creates[s]])])
+
+def RandomPlan():
+    '''
+    Links of a random acyclic plan:  each operation depends on seeds or on
+    outputs of earlier operations, and makes one or two outputs.
+    '''
+    Links = []
+    Roots = []
+    Outputs = []
+    for k in range(OPS):
+        op = 'Ops.m.f%d' % k
+        for c in range(random.randint(1,3)):
+            if Outputs and random.random() < .7:
+                Links.append(DependsOn(random.choice(Outputs),op))
+            else:
+                Links.append(DependsOn('../Data/seed%d' % random.randint(0,2),op))
+                Roots.append(Links[-1])
+        for c in range(random.randint(1,2)):
+            p = '../Data/%d_%d' % (k,c)
+            Links.append(CreatedBy(op,p))
+            Outputs.append(p)
+    return [Links,Roots]
+
+class TestPlanGraph(StarFlowTest):
+
+    def test_fail(self):
+        Plan = PlanGraph(MakeLinkList(PLAN),MakeLinkList(ROOTS))
+        assert Called(Plan,CALLED) == set(['A','B','C','D','E'])
+        #C is still reached through D
+        assert Plan.Fail(['A']).difference(['A']) == set(['B'])
+        assert Called(Plan,CALLED) == set(['C','D','E'])
+        assert Plan.Fail(['D']).difference(['D']) == set(['C'])
+        assert Called(Plan,CALLED) == set(['E'])
+        assert Plan.Fail(['A']) == set([])
+
+    def test_unchanged(self):
+        Plan = PlanGraph(MakeLinkList(PLAN),MakeLinkList(ROOTS))
+        #what is reached through dummy links only is touched, not called
+        assert Called(Plan,CHANGED) == set(['A','B','C','D'])
+        assert Plan.Unchanged(['../Data/a']) == set(['B'])
+        assert Called(Plan,CHANGED) == set(['A','C','D'])
+        assert Called(Plan,CALLED) == set(['A','B','C','D','E'])
+        assert Plan.Unchanged(['../Data/d']) == set(['C'])
+        assert Called(Plan,CHANGED) == set(['A','D'])
+        #C, still reached through B, is still to be touched when D fails
+        assert Plan.Fail(['D']).difference(['D']) == set([])
+        assert Called(Plan,CALLED) == set(['A','B','C','E'])
+        assert Called(Plan,CHANGED) == set(['A'])
+
+    def test_add(self):
+        Plan = PlanGraph(MakeLinkList(PLAN),MakeLinkList(ROOTS))
+        Plan.Fail(['A'])
+        New = [DependsOn('../Data/raw3','F'),CreatedBy('F','../Data/f'),DependsOn('../Data/f','B')]
+        Plan.Add(MakeLinkList(New + PLAN[:2]),MakeLinkList(New[:1]))
+        assert Called(Plan,CALLED) == set(['B','C','D','E','F'])
+        assert Called(Plan,CHANGED) == set(['B','C','D','F'])
+        #a link out of an output of the plan is activated by the operation making it
+        Plan.Add(MakeLinkList([DependsOn('../Data/a','G'),CreatedBy('G','../Data/g')]),MakeLinkList([DependsOn('../Data/a','G')]))
+        assert 'G' not in Called(Plan,CALLED)
+
+    def test_random(self):
+        for seed in range(SEEDS):
+            random.seed(seed)
+            [Links,Roots] = RandomPlan()
+            Plan = PlanGraph(MakeLinkList(Links),MakeLinkList(Roots))
+            Ops = sorted(Plan.Creates.keys())
+            Paths = sorted(set([l[3] for l in Links if l[0] == 'CreatedBy']))
+            for step in range(4):
+                Before = [Called(Plan,CALLED),Called(Plan,CHANGED)]
+                if random.random() < .5:
+                    Failed = random.sample(Ops,random.randint(1,2))
+                    Removed = Plan.Fail(Failed)
+                    After = Called(Plan,CALLED)
+                    assert Removed.intersection(Before[0]) == Before[0].difference(After), (seed,step)
+                    assert not After.intersection(Failed)
+                    Called(Plan,CHANGED)
+                else:
+                    Touched = Plan.Unchanged(random.sample(Paths,random.randint(1,3)))
+                    assert Touched.intersection(Before[1]) == Before[1].difference(Called(Plan,CHANGED)), (seed,step)
+                    assert Called(Plan,CALLED) == Before[0]
+
+if __name__ == "__main__":
+    import nose
+    nose.main(module='starflow.tests')
@@ -0,0 +1,78 @@
+import os
+import shutil
+import tempfile
+from starflow.tests import StarFlowTest
+from starflow.journal import StartJournal, Record, ReadJournal, LoadPlan, IsResumable, GetResumableSessions, GetCommitted, GetInFlight, JOURNALFILE
+
+PLAN = {'LinkListSeq':[['../Data/x.txt']],'Exceptions':[]}
+
+class TestJournal(StarFlowTest):
+
+    def setUp(self):
+        self.Dir = tempfile.mkdtemp()
+        self.SsTemp = os.path.join(self.Dir,'3')
+        os.mkdir(self.SsTemp)
+
+    def tearDown(self):
+        shutil.rmtree(self.Dir)
+
+    def Interrupt(self):
+        '''
+        A session's driver dying midway:  operations A and B committed or
+        failed, C and D launched, and an event only partly written.
+        '''
+        StartJournal(self.SsTemp,PLAN)
+        for (e,j) in [('START','Ops.m.A'),('START','Ops.m.B'),('COMMIT','Ops.m.A'),('START','Ops.m.C'),('FAIL','Ops.m.B'),('START','Ops.m.D')]:
+            Record(self.SsTemp,e,j)
+        F = open(os.path.join(self.SsTemp,JOURNALFILE),'a')
+        F.write('1234.5 COMM')
+        F.close()
+
+    def test_replay(self):
+        self.Interrupt()
+        Events = ReadJournal(self.SsTemp)
+        assert [(e,j) for (t,e,j) in Events] == [('START','Ops.m.A'),('START','Ops.m.B'),('COMMIT','Ops.m.A'),('START','Ops.m.C'),('FAIL','Ops.m.B'),('START','Ops.m.D')]
+        assert [t for (t,e,j) in Events] == sorted([t for (t,e,j) in Events])
+        assert LoadPlan(self.SsTemp) == PLAN
+        assert IsResumable(self.SsTemp)
+        assert GetCommitted(Events) == [['Ops.m.A','Ops.m.B'],{'Ops.m.A':'COMMIT','Ops.m.B':'FAIL'}]
+        assert sorted(GetInFlight(Events).keys()) == ['Ops.m.C','Ops.m.D']
+
+    def test_resume(self):
+        self.Interrupt()
+        #the resumed session finishes the line left partly written, and goes on
+        F = open(os.path.join(self.SsTemp,JOURNALFILE),'a')
+        F.write('\n')
+        F.close()
+        Record(self.SsTemp,'RESUME')
+        Record(self.SsTemp,'START','Ops.m.C')
+        Events = ReadJournal(self.SsTemp)
+        assert Events[-2][1:] == ('RESUME','')
+        assert GetInFlight(Events)['Ops.m.C'] == Events[-1][0]
+        Record(self.SsTemp,'COMMIT','Ops.m.C')
+        Record(self.SsTemp,'COMMIT','Ops.m.D')
+        assert IsResumable(self.SsTemp)
+        Record(self.SsTemp,'END')
+        assert not IsResumable(self.SsTemp)
+        assert GetCommitted(ReadJournal(self.SsTemp))[0] == ['Ops.m.A','Ops.m.B','Ops.m.C','Ops.m.D']
+        assert GetInFlight(ReadJournal(self.SsTemp)) == {}
+
+    def test_sessions(self):
+        assert not IsResumable(self.SsTemp)
+        self.Interrupt()
+        #a session that never launched anything, and one without a plan
+        for s in ['5','7']:
+            os.mkdir(os.path.join(self.Dir,s))
+        StartJournal(os.path.join(self.Dir,'5'),PLAN)
+        Record(os.path.join(self.Dir,'7'),'START','Ops.m.A')
+        assert GetResumableSessions(self.Dir) == [3]
+        Record(os.path.join(self.Dir,'5'),'START','Ops.m.A')
+        assert GetResumableSessions(self.Dir) == [3,5]
+        #a new session with an old one's id starts afresh
+        StartJournal(self.SsTemp,PLAN)
+        assert ReadJournal(self.SsTemp) == []
+        assert GetResumableSessions(self.Dir) == [5]
+
+if __name__ == "__main__":
+    import nose
+    nose.main(module='starflow.tests')
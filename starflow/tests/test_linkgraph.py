@@ -0,0 +1,83 @@
+import random
+import numpy
+from starflow.tests import StarFlowTest
+from starflow.linkstore import MakeLinkList
+from starflow.utils import PathAlong
+from starflow.linkgraph import LinkGraph, GetLinkGraph, GroupBy, UP, DOWN
+
+SEEDS = 100
+#nested directories and same-prefix siblings, with and without their trailing '/'
+PATHS = ['../Data/','../Data/a','../Data/a/','../Data/a/b/','../Data/a/b/c.txt','../Data/a-b','../Data/a-b/x','../Data/a.b','../Data/ab/','../Other/a']
+OPS = ['Ops.m.f','Ops.m.f2','Ops.m2.f']
+
+def RandomLinks(n):
+    Links = []
+    for k in range(n):
+        op = random.choice(OPS)
+        p = random.choice(PATHS)
+        if random.random() < .5:
+            Links.append(('CreatedBy',op,'../Ops/m.py',p,p,op,'../Ops/m.py',0))
+        else:
+            Links.append(('DependsOn',p,p,op,'../Ops/m.py','None','../Ops/m.py',0))
+    return MakeLinkList(Links)
+
+def BruteForce(Links,Field,Names,Contain):
+    '''
+    Pairs (position in Names, link) of the links whose endpoint in Field is
+    the name (Contain None), contains it (UP) or lies under it (DOWN), by
+    comparing each name with each link.
+    '''
+    Pairs = []
+    for (p,n) in enumerate(Names):
+        for (j,e) in enumerate(Links[Field].tolist()):
+            if Contain is None:
+                Match = e == n
+            elif Contain == UP:
+                Match = PathAlong(n,e)
+            else:
+                Match = PathAlong(e,n)
+            if Match:
+                Pairs.append((p,j))
+    return sorted(Pairs)
+
+class TestLinkGraph(StarFlowTest):
+
+    def test_links_from(self):
+        for seed in range(SEEDS):
+            random.seed(seed)
+            Links = RandomLinks(random.randint(1,15))
+            G = LinkGraph(Links)
+            Names = G.Names.tolist()
+            Nodes = numpy.array(random.sample(range(len(Names)),random.randint(1,len(Names))) + [0,0])
+            for Field in ['LinkSource','LinkTarget']:
+                for Contain in [None,UP,DOWN]:
+                    [P,J] = G.LinksFrom(Field,Nodes,Contain)
+                    Pairs = sorted(zip(P.tolist(),J.tolist()))
+                    assert Pairs == BruteForce(Links,Field,[Names[n] for n in Nodes],Contain), (seed,Field,Contain)
+
+    def test_endpoints(self):
+        Links = RandomLinks(10)
+        G = LinkGraph(Links)
+        assert (G.Names[G.Source] == Links['LinkSource']).all() and (G.Names[G.Target] == Links['LinkTarget']).all()
+        Empty = LinkGraph(Links[0:0])
+        assert len(Empty.Names) == 0
+        assert [x.tolist() for x in Empty.LinksFrom('LinkSource',numpy.array([],int),UP)] == [[],[]]
+
+    def test_group_by(self):
+        P = numpy.array([2,0,1,0,2,2])
+        J = numpy.array([5,5,3,5,3,7])
+        assert [(j,p.tolist()) for (j,p) in GroupBy(P,J)] == [(3,[1,2]),(5,[0,2]),(7,[2])]
+        assert GroupBy(P[0:0],J[0:0]) == []
+
+    def test_cache(self):
+        random.seed(0)
+        Links = RandomLinks(10)
+        G = GetLinkGraph(Links)
+        assert GetLinkGraph(Links.copy()) is G
+        Changed = Links.copy()
+        Changed['LinkTarget'][0] = '../Data/new'
+        assert GetLinkGraph(Changed) is not G
+
+if __name__ == "__main__":
+    import nose
+    nose.main(module='starflow.tests')
@@ -0,0 +1,77 @@
+import os
+import shutil
+from starflow.tests import StarFlowTest
+import starflow.linkmanagement as linkmanagement
+from starflow.linkmanagement import LinksFromOperations, WORKING_DE, DE_MANAGER
+from starflow.linkstore import LINKSTOREFILE
+
+PACKAGE = 'StarFlowTestModules'
+
+#a module that writes to the link store while its links are computed:  it fails to load if a transaction is held on the store meanwhile
+WRITER = '''
+import sqlite3
+Conn = sqlite3.connect(%r,timeout = 0,isolation_level = None)
+Conn.execute('BEGIN IMMEDIATE')
+Conn.execute('COMMIT')
+Conn.close()
+
+def Write(depends_on = '../Data/w.txt',creates = '../Data/w2.txt'):
+    pass
+'''
+
+GOOD = '''
+def Make(depends_on = '../Data/x.txt',creates = '../Data/y.txt'):
+    pass
+'''
+
+HANGS = '''
+import time
+time.sleep(60)
+'''
+
+DIES = '''
+import os
+os._exit(3)
+'''
+
+class TestLinksFromOperations(StarFlowTest):
+
+    def setUp(self):
+        self.Cwd = os.getcwd()
+        os.chdir(WORKING_DE.temp_dir)
+        self.Dir = '../' + PACKAGE + '/'
+        os.mkdir(self.Dir)
+        open(self.Dir + '__init__.py','w').close()
+        self.Settings = [DE_MANAGER.link_jobs,DE_MANAGER.link_timeout]
+
+    def tearDown(self):
+        [DE_MANAGER.link_jobs,DE_MANAGER.link_timeout] = self.Settings
+        shutil.rmtree(self.Dir)
+        #the links of the modules, now gone, are dropped from the store
+        LinksFromOperations([])
+        os.chdir(self.Cwd)
+
+    def Write(self,Name,Code):
+        open(self.Dir + Name + '.py','w').write(Code)
+        return self.Dir + Name + '.py'
+
+    def test_no_transaction_while_computing(self):
+        Files = [self.Write('writer',WRITER % os.path.join(WORKING_DE.links_dir,LINKSTOREFILE)),self.Write('good',GOOD)]
+        for Jobs in [1,2]:
+            DE_MANAGER.link_jobs = Jobs
+            Links = LinksFromOperations(Files,Recompute = True)
+            assert sorted(set(Links['UpdateScriptFile'].tolist())) == sorted(Files), Jobs
+
+    def test_failing_modules(self):
+        #modules that hang or kill their process count as failing to load;  the others' links are still computed
+        Files = [self.Write('hangs',HANGS),self.Write('good',GOOD),self.Write('dies',DIES)]
+        DE_MANAGER.link_jobs = 2
+        DE_MANAGER.link_timeout = 2
+        [Links,Succeeded] = linkmanagement.ComputeLinksFromOperations(Files)
+        assert Succeeded == [Files[1]]
+        assert sorted(Links['LinkType'].tolist()) == ['CreatedBy','DependsOn']
+        assert set(Links['UpdateScriptFile'].tolist()) == set([Files[1]])
+
+if __name__ == "__main__":
+    import nose
+    nose.main(module='starflow.tests')
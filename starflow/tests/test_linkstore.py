@@ -0,0 +1,157 @@
+import random
+import shutil
+import tempfile
+import numpy
+from starflow.tests import StarFlowTest
+from starflow.linkstore import LinkStore, MakeLinkList, Records, LINK_FIELDS, STORE_VERSION
+from starflow.linkmanagement import RebuildDerivedLinks, RefreshImpliedLinks, RefreshDummyLinks, GetImpliedLinks, GetDummyLinks
+
+SEEDS = 150
+STEPS = 4
+MODULES = 10
+#nested directories, some named with and some without their trailing '/'
+DIRS = ['../Data/','../Data/a/','../Data/a/b/','../Data/a/b/c/','../Data/d/','../Data/a/e/','../Data/a-b/','../Other/']
+
+#links of a few modules, and the implied and dummy links the algorithm before the link store computed for them
+FIXTURE = [('CreatedBy','Ops.m1.MakeDir','../Ops/m1.py','../Data/d/','../Data/d/','Ops.m1.MakeDir','../Ops/m1.py',0),
+           ('CreatedBy','Ops.m1.MakeFile','../Ops/m1.py','../Data/d/f.txt','../Data/d/f.txt','Ops.m1.MakeFile','../Ops/m1.py',0),
+           ('CreatedBy','Ops.m1.MakeOther','../Ops/m1.py','../Data/d-e','../Data/d-e','Ops.m1.MakeOther','../Ops/m1.py',0),
+           ('DependsOn','../Data/d/f.txt','../Data/d/f.txt','Ops.m2.Use','../Ops/m2.py','None','../Ops/m2.py',0),
+           ('DependsOn','../Data/d','../Data/d','Ops.m2.Use','../Ops/m2.py','None','../Ops/m2.py',0),
+           ('CreatedBy','Ops.m2.Use','../Ops/m2.py','../Data/out/','../Data/out/','Ops.m2.Use','../Ops/m2.py',0),
+           ('DependsOn','../Data/d-e/x','../Data/d-e/x','Ops.m2.Other','../Ops/m2.py','None','../Ops/m2.py',0),
+           ('CreatedBy','Ops.m2.Other','../Ops/m2.py','../Data/out/sub/','../Data/out/sub/','Ops.m2.Other','../Ops/m2.py',1),
+           ('DependsOn','../Data/out/sub/y','../Data/out/sub/y','Ops.m3.G','../Ops/m3.py','None','../Ops/m3.py',0),
+           ('Uses','Ops.m1.MakeDir','../Ops/m1.py','Ops.m3.G','../Ops/m3.py','None','../Ops/m3.py',0)]
+FIXTURE_IMPLIED = [('Implied','../Data/d/','../Data/d/','../Data/d/f.txt','../Data/d/f.txt','Ops.m1.MakeDir','../Ops/m1.py',0),
+                   ('Implied','../Data/out/','../Data/out/','../Data/out/sub/','../Data/out/sub/','Ops.m2.Use','../Ops/m2.py',0),
+                   ('Implied','../Data/out/','../Data/out/','../Data/out/sub/y','../Data/out/sub/y','Ops.m2.Use','../Ops/m2.py',0),
+                   ('Implied','../Data/out/sub/','../Data/out/sub/','../Data/out/sub/y','../Data/out/sub/y','Ops.m2.Other','../Ops/m2.py',0),
+                   #missed before, as '../Data/d-e/' sorts after '../Data/d/' but '../Data/d-e' before it (see GetImpliedLinks)
+                   ('Implied','../Data/d-e','../Data/d-e','../Data/d-e/x','../Data/d-e/x','Ops.m1.MakeOther','../Ops/m1.py',0)]
+FIXTURE_DUMMY = [('Dummy','../Data/d/dummy','../Data/d/dummy','Ops.m1.MakeFile','../Ops/m1.py','None','None',0),
+                 ('Dummy','../Data/out/dummy','../Data/out/dummy','Ops.m2.Other','../Ops/m2.py','None','None',0)]
+
+def RandomPath():
+    d = random.choice(DIRS)
+    r = random.random()
+    if r < .3:
+        return d
+    if r < .45:
+        return d[:-1]
+    return d + random.choice(['x.txt','y.txt','z','b/q.txt'])
+
+def ModuleLinks(m):
+    '''
+    Random links of module m:  operations creating and depending on random
+    paths, some using operations of other modules.
+    '''
+    f = '../Ops/m%d.py' % m
+    L = []
+    for k in range(random.randint(0,4)):
+        op = 'Ops.m%d.f%d' % (m,k)
+        for c in range(random.randint(0,3)):
+            p = RandomPath()
+            L.append(('CreatedBy',op,f,p,p,op,f,0))
+        for c in range(random.randint(0,3)):
+            p = RandomPath()
+            L.append(('DependsOn',p,p,op,f,'None',f,0))
+        if random.random() < .3:
+            n = random.randint(0,MODULES - 1)
+            L.append(('Uses','Ops.m%d.g' % n,'../Ops/m%d.py' % n,op,f,'None',f,0))
+    return L
+
+def Replace(Store,Files,Added):
+    '''
+    Replaces the links of the modules Files in Store by Added, as
+    linkmanagement.RefreshLinkStore does.
+    '''
+    Store.Begin()
+    Deleted = Store.LinksOf('links','UpdateScriptFile',Files)
+    Store.RemoveModules('links',Files)
+    Store.AddLinks('links',Added)
+    RefreshImpliedLinks(Store,Files,Deleted,Added)
+    RefreshDummyLinks(Store,Files,Deleted,Added)
+    Store.Commit()
+
+def Rebuilt(Dir,Links):
+    '''
+    Implied and dummy links RebuildDerivedLinks computes for Links, in a
+    fresh store in Dir.
+    '''
+    Store = LinkStore(Dir)
+    Store.Begin()
+    Store.AddLinks('links',Links)
+    RebuildDerivedLinks(Store)
+    Store.Commit()
+    Derived = [Store.Links('implied'),Store.Links('dummy')]
+    Store.Close()
+    return Derived
+
+def Sorted(LinkList):
+    return sorted(Records(LinkList))
+
+class TestDerivedLinks(StarFlowTest):
+
+    def setUp(self):
+        self.Dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.Dir)
+
+    def test_fixture(self):
+        Links = MakeLinkList(FIXTURE)
+        assert Sorted(GetImpliedLinks(Links,Links[0:0])) == sorted(FIXTURE_IMPLIED)
+        assert Sorted(GetDummyLinks(Links,Links[0:0])) == sorted(FIXTURE_DUMMY)
+        [Implied,Dummy] = Rebuilt(self.Dir,Links)
+        assert Sorted(Implied) == sorted(FIXTURE_IMPLIED)
+        assert Sorted(Dummy) == sorted(FIXTURE_DUMMY)
+
+    def test_incremental(self):
+        for seed in range(SEEDS):
+            random.seed(seed)
+            Dir = tempfile.mkdtemp(dir = self.Dir)
+            Store = LinkStore(Dir)
+            Store.Begin(); Store.SetVersion(STORE_VERSION); Store.Commit()
+            for step in range(STEPS):
+                Replaced = random.sample(range(MODULES),random.randint(1,5))
+                Files = ['../Ops/m%d.py' % m for m in Replaced]
+                Added = MakeLinkList(sum([ModuleLinks(m) for m in Replaced],[]))
+                Replace(Store,Files,Added)
+                [Implied,Dummy] = Rebuilt(tempfile.mkdtemp(dir = self.Dir),Store.Links('links'))
+                assert Sorted(Store.Links('implied')) == Sorted(Implied), (seed,step)
+                assert Sorted(Store.Links('dummy')) == Sorted(Dummy), (seed,step)
+            Store.Close()
+
+    def test_migration(self):
+        random.seed(0)
+        Store = LinkStore(self.Dir)
+        assert Store.Version() == 0
+        Links = MakeLinkList(sum([ModuleLinks(m) for m in range(MODULES)],[]))
+        #implied and dummy links kept the old way:  stale ones left in, current ones missing
+        Stale = MakeLinkList([('CreatedBy','../Data/gone/x','../Data/gone/x','../Data/a/','../Data/a/','Ops.m0.f9','../Ops/m0.py',0)])
+        Store.Begin()
+        Store.AddLinks('links',Links)
+        Store.AddLinks('implied',Stale)
+        Store.AddLinks('dummy',Stale)
+        RebuildDerivedLinks(Store)
+        Store.Commit()
+        assert Store.Version() == STORE_VERSION
+        [Implied,Dummy] = Rebuilt(tempfile.mkdtemp(dir = self.Dir),Links)
+        assert Sorted(Store.Links('implied')) == Sorted(Implied)
+        assert Sorted(Store.Links('dummy')) == Sorted(Dummy)
+        assert len(Implied) > 0 and len(Dummy) > 0
+
+        #and is then kept up to date incrementally
+        for step in range(STEPS):
+            Replaced = random.sample(range(MODULES),3)
+            Files = ['../Ops/m%d.py' % m for m in Replaced]
+            Replace(Store,Files,MakeLinkList(sum([ModuleLinks(m) for m in Replaced],[])))
+            [Implied,Dummy] = Rebuilt(tempfile.mkdtemp(dir = self.Dir),Store.Links('links'))
+            assert Sorted(Store.Links('implied')) == Sorted(Implied), step
+            assert Sorted(Store.Links('dummy')) == Sorted(Dummy), step
+        Store.Close()
+
+if __name__ == "__main__":
+    import nose
+    nose.main(module='starflow.tests')
@@ -0,0 +1,35 @@
+from starflow.tests import StarFlowTest
+from starflow.locking import TargetLocks
+
+def Conflict(First,Second):
+    '''
+    Whether the target locks Second can't be taken while First are held.
+    '''
+    A = TargetLocks(*First)
+    assert A.Acquire(Blocking = False)
+    try:
+        B = TargetLocks(*Second)
+        Free = B.Acquire(Blocking = False)
+        B.Release()
+    finally:
+        A.Release()
+    return not Free
+
+class TestTargetLocks(StarFlowTest):
+
+    def test_creates(self):
+        assert Conflict([['../Data/x']],[['../Data/x']])
+        assert Conflict([['../Data/x']],[['../Data/x/y']])
+        assert Conflict([['../Data/x/y']],[['../Data/x/']])
+        assert not Conflict([['../Data/x']],[['../Data/y']])
+        assert not Conflict([['../Data/x']],[['../Data/xy']])
+
+    def test_reads(self):
+        assert Conflict([['../Data/x']],[['../Data/out'],['../Data/x']])
+        assert Conflict([['../Data/out'],['../Data/x/y']],[['../Data/x']])
+        assert not Conflict([['../Data/a'],['../Data/x']],[['../Data/b'],['../Data/x']])
+        assert not Conflict([['../Data/a'],['../Data/x']],[['../Data/xy']])
+
+if __name__ == "__main__":
+    import nose
+    nose.main(module='starflow.tests')
@@ -0,0 +1,99 @@
+import os
+import time
+import shutil
+import tempfile
+import StringIO
+import starflow.logs as logs
+from starflow.tests import StarFlowTest
+from starflow.logs import LogSink, GetSink, GetSegments, CopyLog, LastLines, LogSize, DROPPED_MARK, CAPPED_MARK
+
+def Line(i):
+    return 'line %04d\n' % i
+
+def Copied(Path):
+    F = StringIO.StringIO()
+    CopyLog(Path,F)
+    return F.getvalue()
+
+class TestLogSinks(StarFlowTest):
+
+    def setUp(self):
+        self.Dir = tempfile.mkdtemp()
+        self.Path = os.path.join(self.Dir,'MostRecentRun.InSession_Ops.m.f')
+
+    def tearDown(self):
+        shutil.rmtree(self.Dir)
+
+    def WriteLines(self,Sink,Lines):
+        for i in Lines:
+            Sink.write(Line(i))
+            #segments are ordered by mtime
+            time.sleep(.02)
+
+    def test_lines(self):
+        Sink = GetSink(self.Path)
+        assert GetSink(self.Path) is Sink
+        Sink.write('no line break yet')
+        assert open(self.Path).read() == ''
+        Sink.write(' ... now\nand')
+        assert open(self.Path).read() == 'no line break yet ... now\nand'
+        Sink.write(u'\xe9\n')
+        Sink.write('x' * logs.LOG_BUFFER_BYTES)
+        assert len(open(self.Path).read()) == len('no line break yet ... now\nand\xc3\xa9\n') + logs.LOG_BUFFER_BYTES
+        Sink.close()
+        assert GetSink(self.Path) is not Sink
+        GetSink(self.Path).close()
+
+    def test_uncapped(self):
+        Sink = LogSink(self.Path)
+        self.WriteLines(Sink,range(100))
+        Sink.close()
+        assert GetSegments(self.Path) == [self.Path]
+        assert Copied(self.Path) == ''.join(map(Line,range(100)))
+
+    def test_capped(self):
+        #with no segments, only the first MaxBytes are kept
+        Sink = LogSink(self.Path,MaxBytes = 25)
+        self.WriteLines(Sink,range(10))
+        Sink.close()
+        assert GetSegments(self.Path) == [self.Path]
+        assert Copied(self.Path) == Line(0) + Line(1) + Line(2) + CAPPED_MARK
+        #a sink opened later marks the drop for itself, and writes nothing more
+        Sink = LogSink(self.Path,MaxBytes = 25)
+        self.WriteLines(Sink,range(10,12))
+        Sink.close()
+        assert Copied(self.Path) == Line(0) + Line(1) + Line(2) + CAPPED_MARK + CAPPED_MARK
+
+    def test_rotation(self):
+        Sink = LogSink(self.Path,MaxBytes = 10,Segments = 2)
+        self.WriteLines(Sink,range(3))
+        assert Copied(self.Path) == Line(0) + Line(1) + Line(2)
+        assert GetSegments(self.Path) == [self.Path,self.Path + '.1',self.Path + '.2']
+        #the ring is full:  the oldest segment is emptied for each line
+        self.WriteLines(Sink,[3])
+        assert GetSegments(self.Path) == [self.Path,self.Path + '.2',self.Path + '.1']
+        assert Copied(self.Path) == Line(0) + Line(2) + DROPPED_MARK + Line(3)
+        self.WriteLines(Sink,[4])
+        Sink.close()
+        assert GetSegments(self.Path) == [self.Path,self.Path + '.1',self.Path + '.2']
+        assert Copied(self.Path) == Line(0) + DROPPED_MARK + Line(3) + DROPPED_MARK + Line(4)
+        assert LogSize(self.Path) == len(Copied(self.Path))
+        assert LastLines(self.Path,2) == ['',Line(4)[:-1]]
+        assert LastLines(self.Path,1) == [Line(4)[:-1]]
+        assert LastLines(self.Path,0) == []
+
+    def test_rotation_resumed(self):
+        #a sink opened on a log already rotating goes on in the segment written last
+        Sink = LogSink(self.Path,MaxBytes = 20,Segments = 3)
+        self.WriteLines(Sink,range(5))
+        Sink.close()
+        Sink = LogSink(self.Path,MaxBytes = 20,Segments = 3)
+        assert Sink.Segment == 2
+        self.WriteLines(Sink,range(5,9))
+        Sink.close()
+        assert [os.path.basename(p)[-2:] for p in GetSegments(self.Path)] == ['.f','.2','.3','.1']
+        assert Copied(self.Path) == ''.join(map(Line,[0,1,4,5,6,7])) + DROPPED_MARK + Line(8)
+
+if __name__ == "__main__":
+    import nose
+    nose.main(module='starflow.tests')
@@ -0,0 +1,60 @@
+import numpy
+from starflow.tests import StarFlowTest
+from starflow.utils import PathIndex, getpathalongs, maximalpathalong
+
+#same-prefix siblings of 'a/b', and paths with and without a trailing '/'
+PATHS = numpy.array(['a/b', 'a/bc', 'a/b.x', 'a/b/c.txt', 'a/b/d/', 'a/b/d/e', 'a/', 'z'])
+
+def Pairs(PI):
+    [P,I] = PI
+    assert (numpy.diff(P) >= 0).all()
+    return sorted(zip(P.tolist(),I.tolist()))
+
+class TestPathIndex(StarFlowTest):
+
+    def test_along(self):
+        Index = PathIndex(PATHS)
+        assert Index.Along(numpy.array(['a/b'])).nonzero()[0].tolist() == [0,3,4,5]
+        assert Index.Along(numpy.array(['a/b/'])).nonzero()[0].tolist() == [0,3,4,5]
+        assert Index.Along(numpy.array(['a/b/d'])).nonzero()[0].tolist() == [4,5]
+        assert Index.Along(numpy.array(['a/b.x','a/bc/'])).nonzero()[0].tolist() == [1,2]
+        assert Index.Along(numpy.array(['a'])).nonzero()[0].tolist() == [0,1,2,3,4,5,6]
+        assert Index.Along(numpy.array(['a/b.','q'])).nonzero()[0].tolist() == []
+        assert Index.Along(numpy.array([],str)).nonzero()[0].tolist() == []
+
+    def test_below(self):
+        Index = PathIndex(PATHS)
+        Q = numpy.array(['a/b','a/'])
+        assert Pairs(Index.Below(Q)) == [(0,0),(0,3),(0,4),(0,5),(1,0),(1,1),(1,2),(1,3),(1,4),(1,5),(1,6)]
+        assert Pairs(Index.Below(Q,Strict = True)) == [(0,3),(0,4),(0,5),(1,0),(1,1),(1,2),(1,3),(1,4),(1,5)]
+        assert Pairs(Index.Below(Q,Levels = 0)) == [(0,0),(1,6)]
+        assert Pairs(Index.Below(Q,Levels = 1)) == [(0,3),(0,4),(1,0),(1,1),(1,2)]
+        assert Pairs(Index.Below(Q,Levels = 2)) == [(0,5),(1,3),(1,4)]
+        assert Pairs(Index.Below(Q,Strict = True,Levels = 0)) == []
+        assert Pairs(Index.Below(numpy.array(['a/b/d/','a/bc']),Levels = 1)) == [(0,5)]
+
+    def test_contain(self):
+        Index = PathIndex(PATHS)
+        Q = numpy.array(['a/b','a/bc/','a/b.','q','a/b/d/e/','a/b/c'])
+        assert Index.Contain(Q).tolist() == [True,True,False,False,True,False]
+
+    def test_deepest(self):
+        Index = PathIndex(PATHS)
+        Q = numpy.array(['a/b/d/e/f','a/b/c.txt','a/bc/x','a/b.xy','a/b/d','q/r','a'])
+        assert Index.Deepest(Q).tolist() == [5,3,1,6,4,-1,6]
+        assert PathIndex(numpy.array(['x/y/','x/y'])).Deepest(numpy.array(['x/y/z'])).tolist() == [0]
+        assert PathIndex(numpy.array([],str)).Deepest(numpy.array(['x'])).tolist() == [-1]
+
+    def test_getpathalongs(self):
+        Z = numpy.array(['a/b','a/b-c','a/b/b/a','a/b.x'])
+        assert getpathalongs(numpy.array(['a/b']),Z).tolist() == [0,2]
+        assert getpathalongs(numpy.array(['a/b-c/','a/b/b']),Z).tolist() == [1,2]
+
+    def test_maximalpathalong(self):
+        Z = numpy.array(['../a-b/','../a-b/c','../a-bc/'])
+        Y = numpy.array(['../a-b/c/x','../a-b/cd','../a-bc','../a-b.x'])
+        assert maximalpathalong(Y,Z).tolist() == ['../a-b/c','../a-b/','../a-bc/','']
+
+if __name__ == "__main__":
+    import nose
+    nose.main(module='starflow.tests')
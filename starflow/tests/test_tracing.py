@@ -0,0 +1,100 @@
+import os
+import json
+import shutil
+import tempfile
+import starflow.tracing as tracing
+from starflow.tests import StarFlowTest
+from starflow.tracing import Span, traced, ReadTrace, Summary, TRACEFILE, SUMMARYFILE
+
+def Event(Name,ts,dur,op = None,pid = 1):
+    return {'name':Name,'ph':'X','ts':ts,'dur':dur,'pid':pid,'tid':0,'args':{'op':op} if op else {}}
+
+@traced
+def Phase(x):
+    '''A traced function.'''
+    return x + 1
+
+class TestTracing(StarFlowTest):
+
+    def setUp(self):
+        self.Dir = tempfile.mkdtemp()
+        tracing.Discard()
+
+    def tearDown(self):
+        while tracing.SESSIONS:
+            tracing.Close()
+        tracing.SetOp(None)
+        tracing.Discard()
+        shutil.rmtree(self.Dir)
+
+    def test_session(self):
+        #spans ended before the session opens are written to its trace
+        Span('Planning').End()
+        tracing.Open(self.Dir)
+        assert Phase(1) == 2 and Phase.__name__ == 'Phase' and Phase.__doc__ == 'A traced function.'
+        tracing.SetOp('Ops.m.f')
+        Span('Execution').End(status = 0)
+        SummaryFile = tracing.Close(Summarize = True)
+        assert SummaryFile == os.path.join(self.Dir,SUMMARYFILE)
+
+        Events = ReadTrace(os.path.join(self.Dir,TRACEFILE))
+        assert [e['name'] for e in Events] == ['process_name','Planning','Phase','Execution','Session']
+        assert Events[0]['args']['name'] == 'updater (' + str(os.getpid()) + ')'
+        assert [e['args'].get('op') for e in Events[1:]] == [None,None,'Ops.m.f','Ops.m.f']
+        assert Events[3]['cat'] == 'user' and Events[3]['args']['status'] == 0
+        S = json.load(open(SummaryFile))
+        assert sorted(S['phases'].keys()) == ['Execution','Phase','Planning','Session']
+        assert S['ops'].keys() == ['Ops.m.f']
+        #spans are no longer written once the session is closed
+        Span('After').End()
+        assert len(ReadTrace(os.path.join(self.Dir,TRACEFILE))) == len(Events)
+        assert [e['name'] for e in tracing.PENDING] == ['After']
+
+    def test_forked(self):
+        tracing.Open(self.Dir)
+        pid = os.fork()
+        if pid == 0:
+            try:
+                tracing.Open(self.Dir,Role = 'worker')
+                Span('Execution').End()
+                tracing.Close()
+            finally:
+                os._exit(0)
+        os.waitpid(pid,0)
+        Span('CheckDiffs').End()
+        tracing.Close()
+        Events = ReadTrace(os.path.join(self.Dir,TRACEFILE))
+        assert [(e['name'],e['pid']) for e in Events] == [('process_name',os.getpid()),('process_name',pid),('Execution',pid),('CheckDiffs',os.getpid())]
+        assert Events[1]['args']['name'] == 'worker (' + str(pid) + ')'
+        assert open(os.path.join(self.Dir,TRACEFILE)).read().startswith('[\n{')
+
+    def test_partial_line(self):
+        tracing.Open(self.Dir)
+        Span('Phase').End()
+        tracing.Close()
+        F = open(os.path.join(self.Dir,TRACEFILE),'a')
+        F.write('{"name": "Cut", "ph": "X", "ts": 1')
+        F.close()
+        assert [e['name'] for e in ReadTrace(os.path.join(self.Dir,TRACEFILE))] == ['process_name','Phase']
+
+    def test_summary(self):
+        #op f: a setup span, its run with the user code nested in it, and a separate check;  op g in another process
+        Events = [Event('SetupOp',0,1000000,'f'),
+                  Event('CallOp',1000000,5000000,'f'),
+                  Event('Execution',2000000,3000000,'f'),
+                  Event('CheckDiffs',6000000,500000,'f'),
+                  Event('Execution',1000000,2000000,'g',pid = 2),
+                  Event('Session',0,8000000)]
+        S = Summary(Events)
+        assert S['wall_seconds'] == 8 and S['session_seconds'] == 8
+        assert S['phases']['Execution'] == {'count':2,'seconds':5.,'max_seconds':3.}
+        assert S['ops']['f']['seconds'] == 6.5 and S['ops']['f']['user_seconds'] == 3.
+        assert S['ops']['f']['framework_seconds'] == 3.5
+        assert S['ops']['f']['phases'] == {'SetupOp':1.,'CallOp':5.,'Execution':3.,'CheckDiffs':.5}
+        assert S['ops']['g'] == {'seconds':2.,'user_seconds':2.,'framework_seconds':0.,'phases':{'Execution':2.}}
+        assert S['user_seconds'] == 5. and S['framework_seconds'] == 3.5
+        assert Summary([])['wall_seconds'] == 0
+
+if __name__ == "__main__":
+    import nose
+    nose.main(module='starflow.tests')
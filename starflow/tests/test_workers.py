@@ -0,0 +1,77 @@
+import os
+import shutil
+import starflow.workers as workers
+from starflow.tests import StarFlowTest
+from starflow.workers import WarmWorker, RunCommand, TIMEOUT_STATUS
+
+PACKAGE = 'StarFlowTestWorkers'
+
+class TestWarmWorker(StarFlowTest):
+
+    def setUp(self):
+        self.Dir = os.path.join(workers.DE_MANAGER.working_de.root_dir,PACKAGE)
+        os.mkdir(self.Dir)
+        open(os.path.join(self.Dir,'__init__.py'),'w').close()
+        open(os.path.join(self.Dir,'mod.py'),'w').write('VALUE = 7\n')
+        self.Worker = WarmWorker(MaxOps = 3,Preload = [])
+
+    def tearDown(self):
+        self.Worker.Stop()
+        shutil.rmtree(self.Dir)
+
+    def test_status(self):
+        W = self.Worker
+        for Fork in [True,False]:
+            assert W.Run('pass','os',Fork = Fork) == 0
+            assert W.Run('import sys; sys.exit(3)','os',Fork = Fork) == 3 << 8
+            assert W.Run("raise ValueError('op failed')",'os',Fork = Fork) == 1 << 8
+
+    def test_env(self):
+        W = self.Worker
+        assert W.Run("import os, sys; sys.exit(int(os.environ['OMP_NUM_THREADS']))",'os',{'OMP_NUM_THREADS':'3'}) == 3 << 8
+        #the thread count variables are put into effect in the operation's child only
+        assert W.Run("import os, sys; sys.exit(os.environ.get('OMP_NUM_THREADS') == '3')",'os') == 0
+
+    def test_warm(self):
+        W = self.Worker
+        Pid = W.Pid
+        Script = 'import sys, ' + PACKAGE + '.mod as m; sys.exit(m.VALUE)'
+        assert W.Run(Script,PACKAGE + '.mod') == 7 << 8
+        assert W.Run(Script,PACKAGE + '.mod',Fork = False) == 7 << 8
+        assert W.Pid == Pid
+        #a worker whose modules changed on disk is replaced, and the operation run in the new one
+        open(os.path.join(self.Dir,'mod.py'),'w').write('VALUE = 8\n')
+        M = os.path.getmtime(os.path.join(self.Dir,'mod.py'))
+        os.utime(os.path.join(self.Dir,'mod.py'),(M + 10,M + 10))
+        assert W.Run(Script,PACKAGE + '.mod') == 8 << 8
+        assert W.Pid != Pid
+
+    def test_recycling(self):
+        W = self.Worker
+        Pid = W.Pid
+        for i in range(3):
+            W.Run('pass','os')
+        assert W.Pid == Pid
+        W.Run('pass','os')
+        assert W.Pid != Pid and W.Count == 1
+
+    def test_worker_taken_down(self):
+        W = self.Worker
+        Pid = W.Pid
+        #an operation run in the worker itself that takes the worker down fails, and is not tried again
+        assert W.Run('import os; os._exit(5)','os',Fork = False) == 1 << 8
+        assert W.Pid != Pid
+        assert W.Run('import sys; sys.exit(2)','os',Fork = False) == 2 << 8
+
+    def test_timeout(self):
+        W = self.Worker
+        for Fork in [True,False]:
+            assert W.Run('import time; time.sleep(30)','os',Fork = Fork,Timeout = .5) == TIMEOUT_STATUS
+            assert W.Run('import time; time.sleep(.1)','os',Fork = Fork,Timeout = 5) == 0
+        assert RunCommand('sleep 30',Timeout = .5) == TIMEOUT_STATUS
+        assert RunCommand('exit 3',Timeout = 5) == 3 << 8
+        assert RunCommand('exit 3') == 3 << 8
+
+if __name__ == "__main__":
+    import nose
+    nose.main(module='starflow.tests')
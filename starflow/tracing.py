@@ -0,0 +1,218 @@
+'''
+Traces of update sessions, in Chrome trace-event format.
+
+Each update session writes a trace of where its time went to TRACEFILE in its
+temp directory:  a span (a "complete" trace event) for each phase of the
+update -- link extraction (LinksFromOperations), filtering
+(FilterForAutomaticUpdates), propagation (PropagateThroughLinkGraphWithTimes),
+and, for each operation called, its setup (SetupOp, MoveToTemp), the run of
+its code (Execution), the comparison of its outputs with their old versions
+(CheckDiffs), its metadata (MakeRuntimeMetaData), and the report emails
+(EmailResults) -- with the operation in the span's args.   The trace can be
+opened in chrome://tracing or https://ui.perfetto.dev;  the updater and each
+process that calls operations show up as processes of their own.
+
+When the session ends, a flat summary of the trace is written to SUMMARYFILE:
+the count and total time of each phase, and, for each operation, how much of
+its time was spent in its own code (Execution) and how much in the framework
+around it.
+
+Spans are made either by decorating a function with traced, or by hand:
+
+    S = Span('Execution')
+    ...
+    S.End()
+
+Spans ended while no session is open (e.g. the planning that comes before a
+session starts) are held, up to MAX_PENDING of them, and written to the trace
+of the next session opened in the process.   Trace events are appended to the
+trace a line at a time, so that the processes of a session can share it, in
+the JSON array format without the closing bracket, which trace viewers
+accept.
+'''
+
+import os
+import time
+import json
+import threading
+
+TRACEFILE = 'TRACE.json'
+SUMMARYFILE = 'TRACE_SUMMARY.json'
+MAX_PENDING = 10000         # spans held while no session is open
+USER_SPAN = 'Execution'     # the span of an operation's own code
+
+SESSIONS = []               # [trace file, fd, start time, pid] of the open sessions of this process, innermost last
+PENDING = []
+CURRENT = {'op':None,'named':None}
+
+
+def Open(SsTemp,Role = 'updater'):
+    '''
+    Starts writing the spans of this process to the trace of the session whose
+    temp directory is SsTemp, under the process name Role.
+    '''
+    TraceFile = os.path.join(SsTemp,TRACEFILE)
+    fd = os.open(TraceFile,os.O_WRONLY | os.O_CREAT | os.O_APPEND,0666)
+    if os.fstat(fd).st_size == 0:
+        os.write(fd,'[\n')
+    SESSIONS.append([TraceFile,fd,time.time(),os.getpid()])
+    if CURRENT['named'] != (os.getpid(),TraceFile):
+        CURRENT['named'] = (os.getpid(),TraceFile)
+        Emit({'name':'process_name','ph':'M','pid':os.getpid(),'tid':0,'args':{'name':Role + ' (' + str(os.getpid()) + ')'}})
+    for e in PENDING:
+        Emit(e)
+    del PENDING[:]
+
+
+def Close(Summarize = False):
+    '''
+    Stops writing to the trace of the innermost open session.   If Summarize
+    (i.e. the session is over), first adds a span of the time the trace was
+    open, then writes the session's summary and returns its path.
+    '''
+    if len(SESSIONS) == 0:
+        return
+    [TraceFile,fd,Start,Pid] = SESSIONS[-1]
+    if Summarize:
+        Emit(MakeEvent('Session',Start,time.time(),{}))
+    SESSIONS.pop()
+    if Pid == os.getpid():
+        os.close(fd)
+    if Summarize:
+        SummaryFile = os.path.join(os.path.dirname(TraceFile),SUMMARYFILE)
+        F = open(SummaryFile,'w')
+        json.dump(Summary(ReadTrace(TraceFile)),F,indent = 1,sort_keys = True)
+        F.close()
+        return SummaryFile
+
+
+def Discard():
+    '''
+    Drops the spans held for the next session.
+    '''
+    del PENDING[:]
+
+
+def SetOp(op):
+    '''
+    Makes op the operation the spans ended in this process are about.
+    '''
+    CURRENT['op'] = op
+
+
+class Span(object):
+    '''
+    A span of time from when it's made until End is called.
+    '''
+    def __init__(self,Name,**Args):
+        self.Name = Name
+        self.Args = Args
+        self.Start = time.time()
+
+    def End(self,**Args):
+        self.Args.update(Args)
+        Emit(MakeEvent(self.Name,self.Start,time.time(),self.Args))
+
+
+def traced(f):
+    '''
+    Decorator making a span of each call to f, named after f.
+    '''
+    def Traced(*args,**kwargs):
+        S = Span(f.__name__)
+        try:
+            return f(*args,**kwargs)
+        finally:
+            S.End()
+    Traced.__name__ = f.__name__
+    Traced.__doc__ = f.__doc__
+    Traced.__module__ = f.__module__
+    Traced.func_dict.update(f.func_dict)
+    return Traced
+
+
+def MakeEvent(Name,Start,End,Args):
+    Args = dict(Args)
+    if CURRENT['op'] is not None and 'op' not in Args:
+        Args['op'] = CURRENT['op']
+    return {'name':Name,
+            'cat':'user' if Name == USER_SPAN else 'starflow',
+            'ph':'X',
+            'ts':int(Start * 1e6),
+            'dur':int((End - Start) * 1e6),
+            'pid':os.getpid(),
+            'tid':threading.current_thread().ident % 2**31,
+            'args':Args}
+
+
+def Emit(Event):
+    #a forked child inherits the sessions of its parent, and appends to their traces through the same descriptors
+    if len(SESSIONS) == 0:
+        PENDING.append(Event)
+        del PENDING[:-MAX_PENDING]
+    else:
+        os.write(SESSIONS[-1][1],json.dumps(Event) + ',\n')
+
+
+def ReadTrace(TraceFile):
+    '''
+    Trace events in a trace file, skipping a partially written last line.
+    '''
+    Events = []
+    for l in open(TraceFile,'r').read().split('\n'):
+        l = l.strip().rstrip(',')
+        if l and l not in ['[',']']:
+            try:
+                Events.append(json.loads(l))
+            except ValueError:
+                pass
+    return Events
+
+
+def Summary(Events):
+    '''
+    Flat summary of the spans of a trace:  for each phase, the number of its
+    spans and their total and longest times;  for each operation, the total
+    time of its spans (not counting those nested in others), the part of it
+    spent in the operation's own code, and the time of each of its phases.
+    Times are in seconds.
+    '''
+    Spans = [e for e in Events if e.get('ph') == 'X']
+    Phases = {}
+    for e in Spans:
+        P = Phases.setdefault(e['name'],{'count':0,'seconds':0.,'max_seconds':0.})
+        P['count'] += 1
+        P['seconds'] += e['dur'] / 1e6
+        P['max_seconds'] = max(P['max_seconds'],e['dur'] / 1e6)
+
+    ByOp = {}
+    for e in Spans:
+        if e.get('args',{}).get('op') is not None:
+            ByOp.setdefault(e['args']['op'],[]).append(e)
+    Ops = {}
+    for (op,OpSpans) in ByOp.items():
+        O = Ops[op] = {'seconds':0.,'user_seconds':0.,'framework_seconds':0.,'phases':{}}
+        for e in OpSpans:
+            O['phases'][e['name']] = O['phases'].get(e['name'],0.) + e['dur'] / 1e6
+            if e['name'] == USER_SPAN:
+                O['user_seconds'] += e['dur'] / 1e6
+            if not any([Contains(f,e) for f in OpSpans if f is not e]):
+                O['seconds'] += e['dur'] / 1e6
+        O['framework_seconds'] = max(O['seconds'] - O['user_seconds'],0.)
+
+    Sessions = [e for e in Spans if e['name'] == 'Session']
+    Start = min([e['ts'] for e in Spans]) if len(Spans) > 0 else 0
+    End = max([e['ts'] + e['dur'] for e in Spans]) if len(Spans) > 0 else 0
+    return {'wall_seconds':(End - Start) / 1e6,
+            'session_seconds':sum([e['dur'] for e in Sessions]) / 1e6,
+            'user_seconds':sum([O['user_seconds'] for O in Ops.values()]),
+            'framework_seconds':sum([O['framework_seconds'] for O in Ops.values()]),
+            'phases':Phases,
+            'ops':Ops}
+
+
+def Contains(f,e):
+    '''
+    Whether span f contains span e, of the same process.
+    '''
+    return f['pid'] == e['pid'] and f['ts'] <= e['ts'] and e['ts'] + e['dur'] <= f['ts'] + f['dur'] and (f['dur'],f['ts']) != (e['dur'],e['ts'])
@@ -103,6 +103,7 @@ import inspect
 import re
 import subprocess
 import traceback
+import multiprocessing
 import cPickle as pickle
 
 import numpy
@@ -111,9 +112,21 @@ import starflow.de as de
 from starflow.gmail import Gmail
 from starflow.utils import *
 from starflow.linkmanagement import *
-from starflow.metadata import MakeRuntimeMetaData
+from starflow.metadata import MakeRuntimeMetaData, RecordExitStatus
 from starflow.config import StarFlowConfig
 from starflow.sge_utils import wait_and_get_statuses
+import starflow.workers as workers
+import starflow.hashing as hashing
+import starflow.cache as cache
+import starflow.archive as archive
+import starflow.locking as locking
+import starflow.journal as journal
+import starflow.planning as planning
+import starflow.budget as budget
+import starflow.executors as executors
+import starflow.logs as logs
+import starflow.tracing as tracing
+import starflow.invalidation as invalidation
 
 nan = numpy.nan 
 
@@ -121,6 +134,7 @@ nan = numpy.nan
 DE_MANAGER = de.DataEnvironmentManager()
 PATH_TO_PYTHON = DE_MANAGER.python_executable
 DEFAULT_CALLMODE = DE_MANAGER.default_callmode
+DEFAULT_JOBS = DE_MANAGER.default_jobs
 WORKING_DE = DE_MANAGER.working_de
 
 
@@ -135,70 +149,66 @@ RUNTEMPOUTPUT = 'RUNTEMP'                       # pickled output before sent to
 TEMPCMDFILE = 'CMDTEMP'                         # file storing command for DRMAA
 TEMPMETAFILE='METATEMP'                         # metadata (e.g. resource-usage) for each job
                                                 # used by the updater
+CACHESTATS = 'CACHESTATS'                       # op result cache hits and misses of the session
+DATAFLOW_WAIT = 1                               # longest wait, in seconds, for a job to end before checking for unblocked ops
+GRID_BATCH_SECONDS = DE_MANAGER.grid_batch_seconds   # ops whose runs are shorter are batched into array jobs (see BatchOps)
+OP_LOG_MAX_BYTES = DE_MANAGER.op_log_max_bytes  # cap on the in-session stdout of each op (see starflow.logs)
+OP_LOG_SEGMENTS = DE_MANAGER.op_log_segments
+WARM_CALLMODES = ['DIRECT','LOCAL_PARALLEL']      # call modes whose ops run in warm workers (see starflow.workers)
+FAST_OPS_IN_PROCESS = DE_MANAGER.fast_ops_in_process   # fast ops are called by the updater itself rather than through the executor (see DataflowUpdate)
+GRID_CALLMODES = ['DRMAA','LOCAL_DRMAA']        # call modes whose ops run as grid jobs (see starflow.executors)
+OP_TIMEOUT_FACTOR = DE_MANAGER.op_timeout_factor     # ops without a declared timeout are stopped after this many times their slowest recent runs (see planning.GetTimeLimits)
+RELAUNCH_STRAGGLERS = DE_MANAGER.relaunch_stragglers # grid ops running far longer than usual are stopped and submitted again (see DataflowUpdate)
+JOB_TIMEOUT_GRACE = 60                          # seconds past its timeout after which the updater cancels the job of an op that hasn't stopped itself
 ARCHIVE_DIR = WORKING_DE.archive_dir
 
-try:
-    import drmaa
-except ImportError:
-    print("DRMAA not available")
-else:
-    print("DRMAA loaded")
-
-def SetupRun(creates=(WORKING_DE.relative_archive_dir,WORKING_DE.relative_tmp_dir)):
 
+def SetupRun(Resume = None,creates=(WORKING_DE.relative_archive_dir,WORKING_DE.relative_tmp_dir)):
+    '''
+    Allocates a session id and sets up the session's temp directory -- or, 
+    if Resume is the id of an interrupted session, reclaims that session's id 
+    and temp directory as they are. 
+    '''
         
-    SsID = GetSessionID()
+    SsID = GetSessionID(Resume)
+    if SsID is None:
+        raise ValueError('Session ' + str(Resume) + ' is still running.')
     SsName=str(SsID)
     SsTemp = os.path.join(TEMPFOLDER, SsName + '/')
-    MakeDir(SsTemp)
+    if Resume is None:
+        MakeDir(SsTemp)
 
     SsRTStore = SsTemp + RUNTIMESTORAGE
     if not PathExists(SsRTStore):
         MakeDirs(SsTemp + RUNTIMESTORAGE)       
         
     TempStdOut = SsTemp + RUNSTDOUT     
-    if PathExists(TempStdOut):
-        delete(TempStdOut)  
+    if Resume is None:
+        if PathExists(TempStdOut):
+            delete(TempStdOut)  
+        if PathExists(SsTemp + CACHESTATS):
+            delete(SsTemp + CACHESTATS)
+        for f in [tracing.TRACEFILE,tracing.SUMMARYFILE]:
+            if PathExists(SsTemp + f):
+                delete(SsTemp + f)
     
     return [SsID,SsName,SsTemp,SsRTStore,TempStdOut]
 
 
-def GetSessionID():
+def GetSessionID(SsID = None):
     if not PathExists(TEMPFOLDER):
         MakeDir(TEMPFOLDER)
-    if not PathExists(SsIDFile):
-        F = open(SsIDFile,'w')
-        F.write('0')
-        F.close()
-        return 0
-    else:
-        F = open(SsIDFile,'a+b')
-        F.seek(0)
-        N = F.read().strip().strip(',').split(',')
-        if N != ['']:
-            SsID = max([int(x) for x in N]) + 1
-            F.write(',' + str(SsID))
-            F.close()
-            return SsID
-        else:
-            F.write('0')
-            F.close()
-            return 0    
+    #the temp directories of interrupted sessions are kept until they're resumed
+    return locking.AllocateSessionID(SsIDFile,SsID = SsID,Reserved = journal.GetResumableSessions(TEMPFOLDER))
         
     
 def ReleaseSessionID(idn):
-    if PathExists(SsIDFile):
-        N = open(SsIDFile,'r').read().strip().strip(',').split(',')
-        if str(idn) in N:
-            N.remove(str(idn))
-            F = open(SsIDFile,'w')
-            F.write(','.join(N))
-            F.close()
+    locking.ReleaseSessionID(SsIDFile,idn)
         
 
 def MakeUpdated(Targets,Exceptions = None, Simple = True, Forced = False,
                        Pruning=True,ProtectComputed = False,EmailWhenDone=None,
-                   CallMode=DEFAULT_CALLMODE,depends_on = WORKING_DE.relative_root_dir):    
+                   CallMode=DEFAULT_CALLMODE,Jobs=DEFAULT_JOBS,depends_on = WORKING_DE.relative_root_dir):    
     '''
     Implements the upstream updating style 
     
@@ -215,6 +225,8 @@ def MakeUpdated(Targets,Exceptions = None, Simple = True, Forced = False,
         corrupted.
     --EmailWhenDone = email address to send report of system update to,
         upon completion (including error reports of scripts that fail)
+    --Jobs = number of operations run at once when CallMode is 'LOCAL_PARALLEL'
+        (0 means one per cpu)
         
     '''
     
@@ -223,10 +235,10 @@ def MakeUpdated(Targets,Exceptions = None, Simple = True, Forced = False,
     if Exceptions is None:
         Exceptions = []
     Exceptions += list(set(USL['UpdateScript']).difference(['None']))
-    LinkUpdate(USFs, Exceptions = Exceptions, Simple =Simple, Forced=Forced,Pruning=Pruning,ProtectComputed=ProtectComputed,EmailWhenDone=EmailWhenDone,CallMode=CallMode)
+    LinkUpdate(USFs, Exceptions = Exceptions, Simple =Simple, Forced=Forced,Pruning=Pruning,ProtectComputed=ProtectComputed,EmailWhenDone=EmailWhenDone,CallMode=CallMode,Jobs=Jobs)
 
 
-def FullUpdate(Seed = ['../'],AU = None,Exceptions = None,Simple = True,Forced=False,Pruning=True,ProtectComputed = False,EmailWhenDone=None,CallMode=DEFAULT_CALLMODE):    
+def FullUpdate(Seed = ['../'],AU = None,Exceptions = None,Simple = True,Forced=False,Pruning=True,ProtectComputed = False,EmailWhenDone=None,CallMode=DEFAULT_CALLMODE,Jobs=DEFAULT_JOBS):    
     '''
     Implements the downstream updating style.
     
@@ -243,16 +255,50 @@ def FullUpdate(Seed = ['../'],AU = None,Exceptions = None,Simple = True,Forced=F
         might be corrupted.
     --EmailWhenDone = email address to send report of system update to,
         upon completion (including error reports of scripts that fail)
+    --Jobs = number of operations run at once when CallMode is 'LOCAL_PARALLEL'
+        (0 means one per cpu)
     '''
     if isinstance(Seed,str):
         Seed = Seed.split(',')
-    LinkUpdate(Seed, AU = AU, Exceptions = Exceptions, Simple = Simple,Forced=Forced,Pruning=Pruning,ProtectComputed = ProtectComputed,EmailWhenDone=EmailWhenDone,CallMode=CallMode)
+    LinkUpdate(Seed, AU = AU, Exceptions = Exceptions, Simple = Simple,Forced=Forced,Pruning=Pruning,ProtectComputed = ProtectComputed,EmailWhenDone=EmailWhenDone,CallMode=CallMode,Jobs=Jobs)
 
 
-def FindOutWhatWillUpdate(Seed = ['../'], AU = None, Exceptions = None, Simple = True, Forced = False, Pruning=True,ProtectComputed = False):
+def ResumeUpdate(SsID,EmailWhenDone=None,CallMode=None,Jobs=None,depends_on=WORKING_DE.relative_root_dir):
+    '''
+    Resumes the update session SsID, which was interrupted (e.g. by a reboot, 
+    a Ctrl-C or preemption of the updater's grid job), using its journal:  
+    operations it committed are not called again, and operations that were 
+    in flight are either finished or restored to their previous outputs and 
+    called again.   See UpdateLinks and starflow.journal. 
+    
+    ARGUMENTS:
+    --SsID = id of the interrupted session (the name of its directory in the 
+        updater's temp folder)
+    --EmailWhenDone, CallMode, Jobs = as for FullUpdate;  CallMode and Jobs 
+        default to those the session was started with. 
+        
+    Note that operations the interrupted session submitted to the grid engine 
+    may still be running;  they should be allowed to finish (or be killed) 
+    before the session is resumed. 
+    '''
+    SsTemp = os.path.join(TEMPFOLDER,str(SsID) + '/')
+    if not journal.IsResumable(SsTemp):
+        print 'Session', SsID, 'is not an interrupted update session.  Interrupted sessions are:', journal.GetResumableSessions(TEMPFOLDER)
+        return
+    Plan = journal.LoadPlan(SsTemp)
+    UpdateLinks(Plan['ActivatedLinkListSequence'],Plan['Seed'],AU = Plan['AU'],Exceptions = Plan['Exceptions'],Simple=Plan['Simple'],Pruning=Plan['Pruning'],Forced=Plan['Forced'],ProtectComputed = Plan['ProtectComputed'],
+                EmailWhenDone = EmailWhenDone if EmailWhenDone is not None else Plan['EmailWhenDone'],
+                CallMode = CallMode if CallMode is not None else Plan['CallMode'],
+                Jobs = Jobs if Jobs is not None else Plan['Jobs'],Resume = SsID)
+
+
+def FindOutWhatWillUpdate(Seed = ['../'], AU = None, Exceptions = None, Simple = True, Forced = False, Pruning=True,ProtectComputed = False,Jobs=DEFAULT_JOBS):
     '''
     Determine and print out readable report indicating which files 
-    downstream of a seed will update (without making the actual update). 
+    downstream of a seed will update (without making the actual update), 
+    with the runtimes predicted for them from their run history, the 
+    critical path through the update and its predicted wall time in each 
+    call mode (see starflow.planning). 
     
     ARGUMENTS:
     --Seed = set of initial targets to go downstream from.  
@@ -264,10 +310,22 @@ def FindOutWhatWillUpdate(Seed = ['../'], AU = None, Exceptions = None, Simple =
         appears to be need rebuilding to handle changes. 
     --ProtectComputed = include downstream things that appear to have 
         changed since their last official build and therefore might be corrupted.
+    --Jobs = number of workers to predict the 'LOCAL_PARALLEL' wall time for
+        (0 means one per cpu)
     '''
-    ScriptsToCall = WhatWillUpdate(Seed, AU = AU, Exceptions=Exceptions, Simple=Simple, Forced=Forced, Pruning=Pruning,ProtectComputed=ProtectComputed)
+    if isinstance(Seed,str):
+        Seed = Seed.split(',')
+    ActivatedLinkListSequence = GetLinksBelow(Seed, AU = AU, Exceptions = Exceptions , Forced=Forced , Simple = Simple, Pruning=Pruning,ProtectComputed = ProtectComputed)
+    ScriptsToCall = ReduceListOfSetsOfScripts([set(l['UpdateScript']) for l in ActivatedLinkListSequence])
     if len(Union(ScriptsToCall)) > 0:
+        RemainingLinkList = numpy.rec.fromrecords(uniqify(ListUnion([l.tolist() for l in ActivatedLinkListSequence])), names = ActivatedLinkListSequence[0].dtype.names)   
+        RemoveScriptsToBeCreated(RemainingLinkList,ScriptsToCall)
+        [CreateDict,IsFastDict] = GetCreatesAndIsFast(RemainingLinkList)
+        Upstream = GetOpDependencies(RemainingLinkList,ScriptsToCall,CreateDict)
         print '\nThe system would call the following operations, in ' + str(len([l for l in ScriptsToCall if len(l) > 0])) + ' round(s):\n' + printscriptrounds(ScriptsToCall)
+        Resources = dict([(j,GetResources(j)) for j in Union(ScriptsToCall)])
+        Batch = (lambda Ops,Durations,Unknown : BatchOps(Ops,Durations,Unknown,Resources)) if GRID_BATCH_SECONDS > 0 else None
+        print '\n' + planning.PlanReport(ScriptsToCall,Upstream,GetNumJobs(Jobs),Batch)
     else:
         print '\nNothing would be called.'
 
@@ -282,7 +340,7 @@ def WhatWillUpdate(Seed = ['../'], AU = None, Exceptions = None, Simple = True,
 
 def LinkUpdate(Seed,AU = None, Exceptions = None,Simple=False,Forced = False,
                  Pruning = True,ProtectComputed = False,EmailWhenDone = None,
-CallMode=DEFAULT_CALLMODE,depends_on=WORKING_DE.relative_root_dir,creates = WORKING_DE.relative_config_dir):    
+CallMode=DEFAULT_CALLMODE,Jobs=DEFAULT_JOBS,depends_on=WORKING_DE.relative_root_dir,creates = WORKING_DE.relative_config_dir):    
     '''
     Given a seed and some options, call GetLinksBelow routine from LinkManagement, 
     and feed the result of that to the automatic updater. 
@@ -304,13 +362,15 @@ CallMode=DEFAULT_CALLMODE,depends_on=WORKING_DE.relative_root_dir,creates = WORK
     '''
     if isinstance(Seed,str):
         Seed = Seed.split(',')
+    #spans held from before this update (e.g. from FindOutWhatWillUpdate) aren't part of its trace
+    tracing.Discard()
     ActivatedLinkListSequence = GetLinksBelow(Seed, AU = AU, Exceptions = Exceptions , Forced=Forced , Simple = Simple, Pruning=Pruning,ProtectComputed = ProtectComputed)
-    UpdateLinks(ActivatedLinkListSequence,Seed,AU = AU, Exceptions = Exceptions,Simple=Simple,Pruning=Pruning,Forced=Forced,ProtectComputed = ProtectComputed,EmailWhenDone=EmailWhenDone,CallMode=CallMode)
+    UpdateLinks(ActivatedLinkListSequence,Seed,AU = AU, Exceptions = Exceptions,Simple=Simple,Pruning=Pruning,Forced=Forced,ProtectComputed = ProtectComputed,EmailWhenDone=EmailWhenDone,CallMode=CallMode,Jobs=Jobs)
 
      
 def UpdateLinks(ActivatedLinkListSequence, Seed, AU = None, Exceptions = None, 
                  Simple=None,Pruning=None,Forced=None,ProtectComputed = False, 
-  EmailWhenDone = None,CallMode=DEFAULT_CALLMODE,depends_on=WORKING_DE.relative_root_dir,
+  EmailWhenDone = None,CallMode=DEFAULT_CALLMODE,Jobs=DEFAULT_JOBS,Resume=None,depends_on=WORKING_DE.relative_root_dir,
   creates = WORKING_DE.relative_config_dir):    
     ''' This function is the main driver of automatic updating in the system.  It takes in a
     sequence of sets of links, and applies the scripts indicated by those links in the 
@@ -329,7 +389,30 @@ def UpdateLinks(ActivatedLinkListSequence, Seed, AU = None, Exceptions = None,
     --ActivatedLinkListSequence -- a sequence of recarrays of 
         links (as produced, e.g. by GetLinksBelow).  
     --Seed:  the original files updates to which set off the linklist activation.  
-        This is used for recomputing when failure or no difference occurs. 
+        This is used for the update that follows when newly created operations 
+        can't be merged into the running one (see SpliceNewScripts).   (When 
+        failure or no difference occurs, the plan is revised incrementally 
+        instead, see starflow.invalidation.) 
+    --CallMode: how the operations are executed -- 'DIRECT' calls them 
+        one after another, 'LOCAL_PARALLEL' runs them concurrently in a pool of 
+        Jobs local processes, 'DRMAA' submits them to the grid engine as jobs, 
+        and 'LOCAL_DRMAA' submits them to a local stand-in for a grid engine 
+        that runs Jobs of them at once (see starflow.executors).   There are 
+        no round barriers: each operation is launched as soon as the 
+        operations it depends on are done (see DataflowUpdate). 
+        
+    Several updates can run at once in the same data environment: while an 
+    operation is being called, the session holds locks on the paths it creates 
+    and depends on (see starflow.locking), so an operation whose outputs 
+    overlap the outputs or inputs of an operation running in another session 
+    waits for it to finish. 
+    
+    Each session records its plan and the start and commit of every operation 
+    in a journal (see starflow.journal).   If the updater is interrupted, 
+    the session can be resumed by calling UpdateLinks again with the same 
+    plan and Resume set to the session's id (as ResumeUpdate does): committed 
+    operations are then skipped, and in-flight ones are finished or restored 
+    to their previous outputs and called again (see ReplayJournal). 
                 
     '''
 
@@ -337,95 +420,56 @@ def UpdateLinks(ActivatedLinkListSequence, Seed, AU = None, Exceptions = None,
     
     if len(Union(ScriptsToCall)) > 0:
     
-        [SsID,SsName,SsTemp,SsRTStore,TempStdOut] = SetupRun()
-        sys.stdout = multicaster(TempStdOut,sys.__stdout__,New=True)
-        print '\nThe system is planning to call the following operations, in ' + str(len([l for l in ScriptsToCall if len(l) > 0])) + ' round(s):\n' + printscriptrounds(ScriptsToCall)
-        print 'Output during the run will be stored in', SsTemp
-        RemainingLinkList = numpy.rec.fromrecords(uniqify(ListUnion([l.tolist() for l in ActivatedLinkListSequence])), names = ActivatedLinkListSequence[0].dtype.names)   
-        RemoveScriptsToBeCreated(RemainingLinkList,ScriptsToCall)
-        [CreateDict,IsFastDict] = GetCreatesAndIsFast(RemainingLinkList)
-        DepList = numpy.array(uniqify(RemainingLinkList[RemainingLinkList['LinkType'] == 'DependsOn']['LinkSource']))
-        TouchList = set([])  
-        Round = 0
-        TotalNoDiff = {}
-        NewlyCreatedScripts = set([])
-        MetaDataObject = []
-
-        for J in ScriptsToCall:  #for each "round" of scripts to call,  
-    
-            if len(J) > 0:
-                print 'Calling round', Round, '... '
-                ToRemove = []  
-                NoDiff = {}
-                ResourceUsageDict = {}
-        
-                DepListJ = dict([(k,DepList[getpathalongs(numpy.array(CreateDict[k]),DepList)]) for k in J])
-
-                if CallMode == 'DIRECT':
-                    for (i,j) in enumerate(J):
-                        
-                        DoOp(i,j,SsName,SsTemp,SsRTStore,CreateDict[j],IsFastDict[j],CallMode,TouchList,DepListJ[j].tolist(), EmailWhenDone)
-                        ResourceUsageDict[j] = {}
-                        HandleChildJobs(j,SsTemp,EmailWhenDone,SsName,SsRTStore,IsFastDict[j],CallMode)
-                
-                elif CallMode == 'DRMAA':
-                    Session = drmaa.Session()
-                    Session.initialize()
-                    
-                    jobids = {}
-                    for (i,j) in enumerate(J):
-                        jt = Session.createJobTemplate()
-                        jt.remoteCommand = PATH_TO_PYTHON
-                        jt.workingDirectory = os.getcwd() 
-                        argstr = "from starflow.production import *; import starflow.update as U ; U.DoOp(" + ",".join([repr(x) for x in [i,j,SsName,SsTemp,SsRTStore,CreateDict[j],IsFastDict[j],CallMode,TouchList,DepListJ[j].tolist(), EmailWhenDone]]) + ")"
-                        jt.args = ["-c",argstr]
-                        jt.joinFiles = True
-                        jt.jobEnvironment = dict([(k,os.environ[k]) for k in ['PYTHONPATH','PATH'] if k in os.environ])
-                        TempSOIS = os.path.join(SsTemp , RUNSTDOUTINSESSION + '_' + j)
-                        jt.outputPath = ':' + TempSOIS
-                        jt.jobName = j
-                        jobids[j] = Session.runJob(jt)
-                        print 'Loading job', j , 'with job id', jobids[j]
-                        
-                    for j in jobids.keys():
-                        retval = Session.wait(jobids[j],drmaa.Session.TIMEOUT_WAIT_FOREVER)
-                        print 'Job', j, 'returned.'
-                        ResourceUsageDict[j] = retval.resourceUsage 
-                
-                        HandleChildJobs(j,SsTemp,EmailWhenDone,SsName,SsRTStore,IsFastDict[j],CallMode)
-                        
-                        #TODO:  make resource usage reflect child jobs if any
-                    
-                    Session.exit()  
-
-
-                for (i,j) in enumerate(J):
-                    TempSOIS = SsTemp + RUNSTDOUTINSESSION + '_' + j
-                    InSessionStdOutToStdOut(TempSOIS,TempStdOut)
-                    TempMetaFile = SsTemp + TEMPMETAFILE + '_' + j
-                    if PathExists(TempMetaFile):
-                        MetaData = pickle.load(open(TempMetaFile,'r'))
-                        NewlyCreatedScripts.update(MetaData['NCS'])
-                        NoDiff.update(dict([(f,MetaData['OriginalTimes'][f]) for f in MetaData['IsDifferent'].keys() if not MetaData['IsDifferent'][f]]))
-                        if MetaData['ExitType'] == 'Failure':
-                            ToRemove.append(j)
-
-                RemainingLinkList = RemoveDownstreamOfFailures(RemainingLinkList,ScriptsToCall,Round,ToRemove,Seed,Simple,Pruning,ProtectComputed)          
-                RemainingLinkList = MakeTouchList(RemainingLinkList,ScriptsToCall,TouchList,TotalNoDiff,NoDiff,Seed,Simple,Pruning,ProtectComputed)
-                Round += 1
+        [SsID,SsName,SsTemp,SsRTStore,TempStdOut] = SetupRun(Resume)
+        Output = multicaster(TempStdOut,sys.__stdout__,New=Resume is None)
+        sys.stdout = Output
+        tracing.Open(SsTemp)
+        try:
+            if Resume is None:
+                journal.StartJournal(SsTemp,{'ActivatedLinkListSequence':ActivatedLinkListSequence,'Seed':Seed,'AU':AU,'Exceptions':Exceptions,'Simple':Simple,'Pruning':Pruning,'Forced':Forced,'ProtectComputed':ProtectComputed,'EmailWhenDone':EmailWhenDone,'CallMode':CallMode,'Jobs':Jobs})
+                print '\nThe system is planning to call the following operations, in ' + str(len([l for l in ScriptsToCall if len(l) > 0])) + ' round(s):\n' + printscriptrounds(ScriptsToCall)
             else:
-                Round += 1
+                journal.Record(SsTemp,'RESUME')
+                print '\nResuming update session', SsName, '...'
+            print 'Output during the run will be stored in', SsTemp
+            RemainingLinkList = numpy.rec.fromrecords(uniqify(ListUnion([l.tolist() for l in ActivatedLinkListSequence])), names = ActivatedLinkListSequence[0].dtype.names)   
+            RemoveScriptsToBeCreated(RemainingLinkList,ScriptsToCall)
+            [CreateDict,IsFastDict] = GetCreatesAndIsFast(RemainingLinkList)
+            DepList = numpy.array(uniqify(RemainingLinkList[RemainingLinkList['LinkType'] == 'DependsOn']['LinkSource']))
+            Plan = invalidation.PlanGraph(RemainingLinkList,ActivatedLinkListSequence[0])
+            TouchList = set([])  
+            TotalNoDiff = {}
+            NewlyCreatedScripts = set([])
+            MetaDataObject = []
         
-        if len(NewlyCreatedScripts) > 0:
-            print '\n\nDuring the update just completed, the following python operation files were either created newly or overwritten:\n\n', NewlyCreatedScripts, '\n\nThe system will now perform an update on these scripts.\n\n'
+            if Resume is not None:
+                ReplayJournal(Plan,ScriptsToCall,CreateDict,IsFastDict,TouchList,TotalNoDiff,NewlyCreatedScripts,SsName,SsTemp,SsRTStore,TempStdOut,EmailWhenDone,CallMode)
+                print '\nThe system will call the following remaining operations, in ' + str(len([l for l in ScriptsToCall if len(l) > 0])) + ' round(s):\n' + printscriptrounds(ScriptsToCall)
 
-            LinkUpdate(list(NewlyCreatedScripts) + Seed, AU = AU, Exceptions = Exceptions,Simple=Simple,Pruning=Pruning,Forced=Forced,ProtectComputed = ProtectComputed,EmailWhenDone = EmailWhenDone,CallMode=CallMode)
-    
-        sys.stdout = sys.__stdout__
+            Deferred = DataflowUpdate(RemainingLinkList,Plan,ScriptsToCall,CreateDict,IsFastDict,DepList,TouchList,TotalNoDiff,NewlyCreatedScripts,AU,Exceptions,Simple,Pruning,ProtectComputed,SsName,SsTemp,SsRTStore,TempStdOut,EmailWhenDone,CallMode,Jobs)
         
-        EmailResults(EmailWhenDone,SsName,TempStdOut)
+            journal.Record(SsTemp,'END')
             
-        ReleaseSessionID(SsID)
+            if len(Deferred) > 0:
+                print '\n\nDuring the update just completed, the following python operation files were either created newly or overwritten, and their operations could not be merged into it:\n\n', Deferred, '\n\nThe system will now perform an update on these scripts.\n\n'
+        
+            CacheSummary = cache.SummarizeStats(SsTemp + CACHESTATS)
+            if CacheSummary:
+                print CacheSummary
+        finally:
+            #the session's own log is closed (and its trace and id given up) 
+            #before any follow-up update, which installs its own in their place
+            Output.close()
+            sys.stdout = sys.__stdout__
+            Summary = tracing.Close(Summarize = True)
+            ReleaseSessionID(SsID)
+        
+        EmailResults(EmailWhenDone,SsName,TempStdOut)
+        
+        print 'A trace of the run is in', os.path.join(SsTemp,tracing.TRACEFILE), '(summary in', str(Summary) + ')'
+
+        if len(Deferred) > 0:
+            LinkUpdate(list(Deferred) + Seed, AU = AU, Exceptions = Exceptions,Simple=Simple,Pruning=Pruning,Forced=Forced,ProtectComputed = ProtectComputed,EmailWhenDone = EmailWhenDone,CallMode=CallMode,Jobs=Jobs)
 
     else:
         print "No scripts to be called."
@@ -433,7 +477,533 @@ def UpdateLinks(ActivatedLinkListSequence, Seed, AU = None, Exceptions = None,
     sys.stdout = sys.__stdout__
 
 
-def DoOp(i,j,SsName,SsTemp,SsRTStore,CreatesList,IsFast,CallMode,TouchList,DepListj, EmailWhenDone,creates = WORKING_DE.relative_root_dir):
+def DataflowUpdate(RemainingLinkList,Plan,ScriptsToCall,CreateDict,IsFastDict,DepList,TouchList,TotalNoDiff,NewlyCreatedScripts,AU,Exceptions,Simple,Pruning,ProtectComputed,SsName,SsTemp,SsRTStore,TempStdOut,EmailWhenDone,CallMode,Jobs):
+    '''
+    Calls the operations in ScriptsToCall through the executor of CallMode 
+    (see starflow.executors) without waiting on round barriers.   The op-level 
+    dependency graph is computed by GetOpDependencies, and each operation is 
+    submitted as soon as none of its upstream operations is still pending or 
+    running, no other operation -- of this session or another -- holds locks 
+    on what it creates (see starflow.locking), the executor has a slot for 
+    it, and, if the executor runs operations on this machine, its resource 
+    requests fit in what's left of the machine's budget (see starflow.budget).   
+    The updater then waits for whichever job ends first and takes in its 
+    results at once -- so that failures cancel downstream calls and no-diff 
+    outputs cause downstream touching -- and submits the operations that were 
+    waiting on it.   An operation whose job ended without results (e.g. 
+    because it was aborted) has its previous outputs restored and counts as 
+    failed. 
+    
+    If the executor runs array jobs, operations whose runs on record are 
+    shorter than GRID_BATCH_SECONDS are not given a job each: those that 
+    become ready together are packed into the tasks of one array job, each 
+    task calling several of them one after another in one interpreter (see 
+    BatchOps and DoOpBatch). 
+    
+    If FAST_OPS_IN_PROCESS, fast operations (those marked IsFast, e.g. by 
+    protocols.protocolize) aren't handed to the executor at all:  the 
+    updater calls them itself, as they become ready, and runs each one in 
+    its warm worker without forking (see workers.RunInWorker), so they cost 
+    neither a job nor an interpreter's startup.   They aren't held to the 
+    executor's slots or the budget. 
+    
+    Failures and no-diff outputs are taken into the plan incrementally, 
+    through Plan (see starflow.invalidation). 
+    
+    No operation can hold up the update forever:  each one is given a 
+    timeout, declared or made from its history (see planning.GetTimeLimits), 
+    at which it's stopped and counts as failed (its ExitType in the runtime 
+    metadata is 'Timeout').   Operations stop themselves (see CallOp);  on a 
+    grid, the updater also cancels jobs that don't, and can submit 
+    straggling ones again (see WatchJobs). 
+    
+    When operations create (or overwrite) python modules, the calls to the 
+    operations in them are merged into the running update as soon as the 
+    operations that made them are done (see SpliceNewScripts), so that 
+    pipelines that generate operations (e.g. protocol instances) run in one 
+    session.   Returns the newly created modules whose calls could not be 
+    merged, which are left to an update of their own. 
+    '''
+    
+    Upstream = GetOpDependencies(RemainingLinkList,ScriptsToCall,CreateDict)
+    ReadDict = GetReads(RemainingLinkList)
+    RoundOf = dict([(j,i) for (i,J) in enumerate(ScriptsToCall) for j in J])
+    Pending = Union(ScriptsToCall)
+    Running = {}        #job id -> operations
+    OpLocks = {}
+    Blocked = set([])
+    OverBudget = set([])
+    Count = 0
+    
+    Workers = max(min(GetNumJobs(Jobs),len(Pending)),1)
+    Executor = executors.GetExecutor(CallMode,Workers)
+    Inline = executors.InlineExecutor()
+    InProcess = dict([(j,bool(FAST_OPS_IN_PROCESS and IsFastDict[j])) for j in Pending])
+    Free = budget.GetBudget(Workers)
+    Resources = dict([(j,GetResources(j)) for j in Pending])
+    Needs = dict([(j,budget.GetNeeds(Resources[j],Executor.DefaultThreads or 1)) for j in Pending])
+    Batching = Executor.CanBatch and GRID_BATCH_SECONDS > 0
+    [Durations,Unknown] = planning.PredictRuntimes(Pending) if Batching else [{},set([])]
+    Limits = dict([(j,planning.GetTimeLimits(j,Resources[j]['timeout'],OP_TIMEOUT_FACTOR)) for j in Pending])
+    Submitted = {}      #job id -> when it was submitted
+    Started = {}        #job id -> when it was seen to start running
+    Stopped = {}        #job id -> why the updater stopped it
+    Relaunched = set([])
+    Spliced = set([])
+    Deferred = set([])
+    
+    try:
+        while len(Pending) > 0 or len(Running) > 0 or len(NewlyCreatedScripts.difference(Spliced)) > 0:
+            NewScripts = sorted(NewlyCreatedScripts.difference(Spliced))
+            if len(NewScripts) > 0:
+                Spliced.update(NewScripts)
+                Called = set(RoundOf.keys()).difference(Pending)
+                [RemainingLinkList,Added,Unmerged] = SpliceNewScripts(NewScripts,RemainingLinkList,Plan,ScriptsToCall,CreateDict,IsFastDict,Called,AU,Exceptions,Simple,Pruning,ProtectComputed)
+                Deferred.update(Unmerged)
+                if len(Added) > 0:
+                    DepList = numpy.array(uniqify(RemainingLinkList[RemainingLinkList['LinkType'] == 'DependsOn']['LinkSource']))
+                    Upstream = GetOpDependencies(RemainingLinkList,ScriptsToCall,CreateDict)
+                    ReadDict = GetReads(RemainingLinkList)
+                    RoundOf = dict([(j,i) for (i,J) in enumerate(ScriptsToCall) for j in J])
+                    Pending.update(Added)
+                    for j in Added.difference(Resources.keys()):
+                        InProcess[j] = bool(FAST_OPS_IN_PROCESS and IsFastDict[j])
+                        Resources[j] = GetResources(j)
+                        Needs[j] = budget.GetNeeds(Resources[j],Executor.DefaultThreads or 1)
+                        Limits[j] = planning.GetTimeLimits(j,Resources[j]['timeout'],OP_TIMEOUT_FACTOR)
+                    if Batching:
+                        [D,U] = planning.PredictRuntimes(Added)
+                        Durations.update(D)
+                        Unknown.update(U)
+                continue
+            
+            OpArgs = {}
+            Slots = Executor.Slots()
+            for j in GetReadyOps(Pending,Union(Running.values()),Upstream,RoundOf):
+                if not InProcess[j] and len([k for k in OpArgs if not InProcess[k]]) >= Slots:
+                    continue
+                if Executor.Local and not InProcess[j] and len(Running) + len(OpArgs) > 0 and not budget.Fits(Needs[j],Free):
+                    #wait for running operations to give back enough of the budget
+                    if j not in OverBudget:
+                        print 'Waiting for resources to call', j, '...'
+                        OverBudget.add(j)
+                    continue
+                OpLocks[j] = locking.TargetLocks(CreateDict[j],ReadDict.get(j,[]))
+                if not OpLocks[j].Acquire(Blocking = False):
+                    #another operation (of this or another session) is working on overlapping outputs or inputs
+                    OpLocks.pop(j)
+                    if j not in Blocked:
+                        print 'Waiting for locks on the outputs and inputs of', j, '...'
+                        Blocked.add(j)
+                    continue
+                Pending.remove(j)
+                if Executor.Local and not InProcess[j]:
+                    budget.Take(Free,Needs[j])
+                DepListj = DepList[getpathalongs(numpy.array(CreateDict[j]),DepList)].tolist()
+                OpArgs[j] = [Count,j,SsName,SsTemp,SsRTStore,CreateDict[j],IsFastDict[j],CallMode,set(TouchList),DepListj,EmailWhenDone,budget.GetThreadEnv(Resources[j],Executor.DefaultThreads),Limits[j][0]]
+                Count += 1
+                
+            Ready = sorted([j for j in OpArgs.keys() if not InProcess[j]],key = lambda j : (RoundOf[j],j))
+            for Tasks in (BatchOps(Ready,Durations,Unknown,Resources) if Batching else [[[j]] for j in Ready]):
+                for j in Union(Tasks):
+                    journal.Record(SsTemp,'START',j)
+                if len(Tasks) == 1 and len(Tasks[0]) == 1:
+                    j = Tasks[0][0]
+                    print 'Loading job', j, '...'
+                    JobId = Executor.Submit(GetDoOpScript(OpArgs[j]),j,SsTemp + RUNSTDOUTINSESSION + '_' + j,Resources[j])
+                    Running[JobId] = [j]
+                    Submitted[JobId] = time.time()
+                else:
+                    Name = Tasks[0][0] + '_batch'
+                    JobIds = Executor.SubmitBatch([GetDoOpBatchScript([OpArgs[j] for j in T]) for T in Tasks],Name,SsTemp + RUNSTDOUTINSESSION + '_' + Name,Resources[Tasks[0][0]])
+                    for (JobId,T) in zip(JobIds,Tasks):
+                        Running[JobId] = T
+                        print 'Loading job', ', '.join(T), 'as task', JobId, 'of an array job'
+            #fast ops run to their end here, so they go after the jobs that can run meanwhile
+            for j in sorted([j for j in OpArgs.keys() if InProcess[j]],key = lambda j : (RoundOf[j],j)):
+                journal.Record(SsTemp,'START',j)
+                print 'Calling fast op', j, 'in process ...'
+                Running['inline-' + Inline.Submit(GetDoOpScript(OpArgs[j] + [True]),j,SsTemp + RUNSTDOUTINSESSION + '_' + j)] = [j]
+            
+            if len(Running) == 0:
+                #everything that's ready is waiting on locks held by another session
+                time.sleep(locking.LOCK_POLL_INTERVAL)
+                continue
+            if not Executor.Local:
+                WatchJobs(Running,Submitted,Started,Stopped,Limits,Relaunched,Executor,SsTemp)
+            Ended = Inline.Wait(0)
+            if Ended is not None:
+                Ended = ('inline-' + Ended[0],Ended[1])
+            else:
+                Ended = Executor.Wait(DATAFLOW_WAIT)
+            if Ended is None:
+                continue
+                
+            (JobId,Result) = Ended
+            Usage = executors.FormatUsage(Result['ResourceUsage'])
+            Why = Stopped.pop(JobId,None)
+            for j in Running.pop(JobId):
+                Finished = PathExists(SsTemp + TEMPMETAFILE + '_' + j)
+                if Finished:
+                    print 'Job', j, 'returned' + (' (' + Usage + ').' if Usage else '.')
+                    HandleChildJobs(j,SsTemp,EmailWhenDone,SsName,SsRTStore,IsFastDict[j],CallMode)
+                OpLocks.pop(j).Release()
+                if Executor.Local and not InProcess[j]:
+                    budget.Give(Free,Needs[j])
+                if not Finished:
+                    print 'Job', j, 'ended without results' + (' (it was aborted).' if Result['Aborted'] else '.')
+                    RestoreInterruptedOutputs(CreateDict[j],IsFastDict[j],SsRTStore)
+                    if Why == 'straggling':
+                        RecordExitStatus(j,CreateDict[j],'Relaunched',Result['ExitStatus'],Started.get(JobId,Submitted[JobId]),time.time())
+                        print 'Submitting', j, 'again.'
+                        Relaunched.add(j)
+                        Pending.add(j)
+                        continue
+                ToRemove = []
+                NoDiff = {}
+                GatherOpResults(j,SsTemp,TempStdOut,NewlyCreatedScripts,NoDiff,ToRemove,Failed = not Finished)
+                RemoveDownstreamOfFailures(Plan,ScriptsToCall,None,ToRemove,Pending=Pending)
+                MakeTouchList(Plan,ScriptsToCall,TouchList,TotalNoDiff,NoDiff)
+    except:
+        for JobId in Running.keys():
+            if not JobId.startswith('inline-'):
+                Executor.Cancel(JobId)
+        Executor.Close(Abort = True)
+        for j in OpLocks.keys():
+            OpLocks.pop(j).Release()
+        raise
+    else:
+        Executor.Close()
+    return Deferred
+
+
+def WatchJobs(Running,Submitted,Started,Stopped,Limits,Relaunched,Executor,SsTemp):
+    '''
+    Looks after the jobs of single operations in Running that run on other 
+    machines (see DataflowUpdate):  a job that has run JOB_TIMEOUT_GRACE 
+    seconds past its operation's timeout -- i.e. that its operation didn't 
+    stop itself at its timeout, e.g. because its node is down -- is 
+    cancelled, and, if RELAUNCH_STRAGGLERS, one that is straggling (see 
+    planning.GetTimeLimits) is stopped so that it can be submitted again, 
+    once, in the hope of a better node.   Jobs stopped are added to Stopped, 
+    with the reason. 
+    
+    How long a job has run is measured from when its output file (the op 
+    log, which the grid engine opens as the job starts) was first written. 
+    '''
+    Now = time.time()
+    for (JobId,J) in Running.items():
+        if JobId not in Submitted or JobId in Stopped:
+            continue
+        j = J[0]
+        if JobId not in Started:
+            Log = SsTemp + RUNSTDOUTINSESSION + '_' + j
+            if PathExists(Log) and os.path.getmtime(Log) >= Submitted[JobId]:
+                Started[JobId] = Now
+            continue
+        [Timeout,Straggling] = Limits[j]
+        Ran = Now - Started[JobId]
+        if Timeout is not None and Ran > Timeout + JOB_TIMEOUT_GRACE:
+            print 'Cancelling job', j, ':  it has run for', int(Ran), 'seconds, past its timeout of', int(Timeout), 'seconds.'
+            Executor.Cancel(JobId)
+            Stopped[JobId] = 'timeout'
+        elif RELAUNCH_STRAGGLERS and Straggling is not None and Ran > Straggling and j not in Relaunched:
+            print 'Job', j, 'is straggling:  it has run for', int(Ran), 'seconds, over', planning.STRAGGLER_FACTOR, 'times as long as usual.   Stopping it to submit it again ...'
+            Executor.Cancel(JobId)
+            Stopped[JobId] = 'straggling'
+    
+
+def SpliceNewScripts(NewScripts,RemainingLinkList,Plan,ScriptsToCall,CreateDict,IsFastDict,Called,AU,Exceptions,Simple,Pruning,ProtectComputed):
+    '''
+    Merges the calls to the operations of the newly created (or overwritten) 
+    python modules NewScripts into a running update.   The link graph is 
+    loaded as GetLinksBelow loads it -- only the new modules are analyzed, 
+    the links of the others coming from the link cache (see 
+    LinksFromOperations) -- and propagated through from just NewScripts.   
+    The links activated are added to RemainingLinkList and Plan, the links 
+    into the operations they activate calls to are added to RemainingLinkList 
+    too (so that the calls wait for their inputs, see GetOpDependencies), and 
+    the calls are added to ScriptsToCall, in rounds of their own after those 
+    already there (calls still pending are moved to the new rounds, so that 
+    they wait for what the new operations make). 
+    
+    If the propagation activates calls to operations in Called (those the 
+    update already called, or cancelled), nothing is merged:  NewScripts are 
+    left to an update of their own, as before. 
+    
+    Returns [RemainingLinkList,Added,Deferred], where Added is the set of 
+    scripts to call that were added (or moved) and Deferred the modules not 
+    merged. 
+    '''
+    LinkList = LinksFromOperations(WORKING_DE.load_live_modules(),AddDummies=True)
+    LinkList = FilterForAutomaticUpdates(LinkList,AU=AU,Exceptions=Exceptions)
+    T = PropagateThroughLinkGraphWithTimes(NewScripts,LinkList,Simple=Simple,Pruning=Pruning,ProtectComputed=ProtectComputed)
+    Sequence = [ll[ll['Activated']] for ll in T]
+    Rounds = ReduceListOfSetsOfScripts([set(l['UpdateScript']) for l in Sequence])
+    if len(Union(Rounds)) == 0:
+        return [RemainingLinkList,set([]),set([])]
+    if len(Union(Rounds).intersection(Called)) > 0:
+        print '\nThe following newly created (or overwritten) python operation files activate calls to operations this update has already called, and will be updated after it:\n', NewScripts, '\n'
+        return [RemainingLinkList,set([]),set(NewScripts)]
+    
+    NewLinks = numpy.rec.fromrecords(uniqify(ListUnion([l.tolist() for l in Sequence])),names = Sequence[0].dtype.names)
+    RemoveScriptsToBeCreated(NewLinks,Rounds)
+    Added = Union(Rounds)
+    for J in ScriptsToCall:
+        J.difference_update(Added)
+    ScriptsToCall += [J for J in Rounds if len(J) > 0]
+    #the inputs of the new calls are what they wait for, whether or not they activated them
+    Inputs = LinkList[(LinkList['LinkType'] != 'CreatedBy') & fastisin(LinkList['LinkTarget'],numpy.array(list(Added)))]
+    #the stages of propagations have columns of their own, of which only the links' are kept
+    Records = ListUnion([zip(*[L[n].tolist() for n in LinkList.dtype.names]) for L in [RemainingLinkList,NewLinks,Inputs] if len(L) > 0])
+    RemainingLinkList = numpy.rec.fromrecords(uniqify(Records),names = LinkList.dtype.names)
+    [NewCreateDict,NewIsFastDict] = GetCreatesAndIsFast(NewLinks)
+    CreateDict.update(NewCreateDict)
+    IsFastDict.update(NewIsFastDict)
+    Plan.Add(NewLinks,Sequence[0])
+    print '\nMerging the calls to the operations of the following newly created (or overwritten) python operation files into the update:\n', NewScripts, '\n\nin ' + str(len([l for l in Rounds if len(l) > 0])) + ' further round(s):\n' + printscriptrounds(Rounds)
+    return [RemainingLinkList,Added,set([])]
+    
+    
+def GetDoOpScript(Args):
+    '''
+    Job script calling DoOp with arguments Args. 
+    '''
+    return "import starflow.update as U ; U.DoOp(" + ",".join([repr(x) for x in Args]) + ")"
+    
+    
+def GetDoOpBatchScript(ArgsList):
+    '''
+    Job script calling DoOp with each of the arguments in ArgsList, one after 
+    another (see DoOpBatch). 
+    '''
+    return "import starflow.update as U ; U.DoOpBatch([" + ",".join(["[" + ",".join([repr(x) for x in Args]) + "]" for Args in ArgsList]) + "])"
+    
+    
+def BatchOps(Ops,Durations,Unknown,Resources):
+    '''
+    Groups operations to be submitted at once into jobs, each given as a list 
+    of tasks, each task a list of operations.   Operations whose predicted 
+    runtime (see planning.PredictRuntimes) is known and shorter than 
+    GRID_BATCH_SECONDS, and that ask for the same resources, are packed in 
+    the order of Ops into tasks of up to GRID_BATCH_SECONDS of predicted 
+    runtime, one array job for each kind of request; every other operation 
+    gets a job of its own. 
+    '''
+    Small = [j for j in Ops if j not in Unknown and Durations[j] < GRID_BATCH_SECONDS]
+    Jobs = [[[j]] for j in Ops if j not in Small]
+    Kinds = {}
+    for j in Small:
+        Kinds.setdefault(budget.NativeSpecification(Resources[j]),[]).append(j)
+    for Kind in sorted(Kinds.keys()):
+        Tasks = [[]] ; Length = 0
+        for j in Kinds[Kind]:
+            if len(Tasks[-1]) > 0 and Length + Durations[j] > GRID_BATCH_SECONDS:
+                Tasks.append([]) ; Length = 0
+            Tasks[-1].append(j) ; Length += Durations[j]
+        Jobs.append(Tasks)
+    return Jobs
+    
+    
+def GetReadyOps(Pending,Running,Upstream,RoundOf):
+    '''
+    Pending operations none of whose upstream operations is pending or 
+    running, in round order. 
+    '''
+    Waiting = Pending.union(Running)
+    Ready = [j for j in Pending if len(Upstream[j].intersection(Waiting)) == 0]
+    if len(Ready) == 0 and len(Running) == 0 and len(Pending) > 0:
+        #should not happen for an acyclic plan, but never stall -- fall back to round order 
+        First = min([RoundOf[j] for j in Pending])
+        Ready = [j for j in Pending if RoundOf[j] == First]
+    Ready.sort(key = lambda j : RoundOf[j])
+    return Ready
+    
+
+def GetOpDependencies(LinkList,ScriptsToCall,CreateDict):
+    '''
+    Op-level dependency graph of an update plan.   Operation k is upstream of 
+    operation j if some DependsOn, Uses or Dummy link into j has a source file 
+    that lies in the directory tree of something k creates (or whose directory 
+    tree contains something k creates), and k is called in an earlier round 
+    than j.  
+    
+    Returns a dictionary mapping each operation in ScriptsToCall to the set of 
+    operations that must finish before it can be called. 
+    '''
+    
+    RoundOf = dict([(j,i) for (i,J) in enumerate(ScriptsToCall) for j in J])
+    Upstream = dict([(j,set([])) for j in RoundOf.keys()])
+
+    Creators = [(t,k) for k in RoundOf.keys() for t in CreateDict.get(k,[])]
+    Inputs = LinkList[(LinkList['LinkType'] != 'CreatedBy') & fastisin(LinkList['LinkTarget'],numpy.array(RoundOf.keys()))]
+    if len(Creators) > 0 and len(Inputs) > 0:
+        Targets = numpy.array([t for (t,k) in Creators])
+        Makers = numpy.array([k for (t,k) in Creators])
+        s = Targets.argsort() ; Targets = Targets[s] ; Makers = Makers[s]
+        Sources = Inputs['SourceFile']
+        Consumers = Inputs['LinkTarget']
+        s = Sources.argsort() ; Sources = Sources[s] ; Consumers = Consumers[s]
+        
+        [A,B] = getpathalong(Targets,Sources)
+        Pairs = [(Makers[i],Consumers[l]) for i in range(len(A)) for l in range(A[i],B[i])]
+        [A,B] = getpathalong(Sources,Targets)
+        Pairs += [(Makers[l],Consumers[i]) for i in range(len(A)) for l in range(A[i],B[i])]
+        
+        for (k,j) in Pairs:
+            if RoundOf[k] < RoundOf[j]:
+                Upstream[j].add(k)
+    
+    return Upstream
+    
+
+def GatherOpResults(j,SsTemp,TempStdOut,NewlyCreatedScripts,NoDiff,ToRemove,Failed = False):
+    '''
+    Takes in the results an operation left in the session temp directory: 
+    moves its in-session output to the run's output, adds its results to the 
+    NewlyCreatedScripts set, NoDiff dictionary and ToRemove list (see 
+    ReadOpResults), and commits it to the session journal.   If Failed, the 
+    operation is taken to have failed whatever its results say. 
+    '''
+    TempSOIS = SsTemp + RUNSTDOUTINSESSION + '_' + j
+    InSessionStdOutToStdOut(TempSOIS,TempStdOut)
+    ReadOpResults(j,SsTemp,NewlyCreatedScripts,NoDiff,ToRemove)
+    if Failed and j not in ToRemove:
+        ToRemove.append(j)
+    journal.Record(SsTemp,'FAIL' if j in ToRemove else 'COMMIT',j)
+
+
+def ReadOpResults(j,SsTemp,NewlyCreatedScripts,NoDiff,ToRemove):
+    '''
+    Reads the results an operation left in the session temp directory, adding 
+    them to the NewlyCreatedScripts set, NoDiff dictionary and ToRemove list. 
+    '''
+    TempMetaFile = SsTemp + TEMPMETAFILE + '_' + j
+    if PathExists(TempMetaFile):
+        MetaData = pickle.load(open(TempMetaFile,'r'))
+        NewlyCreatedScripts.update(MetaData['NCS'])
+        NoDiff.update(dict([(f,MetaData['OriginalTimes'][f]) for f in MetaData['IsDifferent'].keys() if not MetaData['IsDifferent'][f]]))
+        if MetaData['ExitType'] in ['Failure','Timeout']:
+            ToRemove.append(j)
+
+
+def ReplayJournal(Plan,ScriptsToCall,CreateDict,IsFastDict,TouchList,TotalNoDiff,NewlyCreatedScripts,SsName,SsTemp,SsRTStore,TempStdOut,EmailWhenDone,CallMode):
+    '''
+    Brings a resumed session back to the state it was in when it was 
+    interrupted.   The results of the operations its journal shows were 
+    committed (or failed) are taken in again, in order, cancelling downstream 
+    calls and causing downstream touching just as they did in the run.   Of 
+    the operations that were in flight, those that finished (leaving fresh 
+    results in the session temp directory) are committed now, and the others 
+    have their partial outputs archived and their previous outputs moved back 
+    from runtime storage, to be called again. 
+    
+    Removes all the committed operations from ScriptsToCall, and takes their 
+    failures and no-diff outputs into Plan. 
+    '''
+    Events = journal.ReadJournal(SsTemp)
+    [Committed,EndedAs] = journal.GetCommitted(Events)
+    InFlight = journal.GetInFlight(Events)
+    Pending = Union(ScriptsToCall)
+    
+    Finished = []
+    for j in sorted(InFlight.keys()):
+        if j not in Pending:
+            continue
+        TempMetaFile = SsTemp + TEMPMETAFILE + '_' + j
+        if PathExists(TempMetaFile) and os.path.getmtime(TempMetaFile) >= InFlight[j]:
+            print 'Operation', j, 'finished before the interruption.'
+            HandleChildJobs(j,SsTemp,EmailWhenDone,SsName,SsRTStore,IsFastDict[j],CallMode)
+            Finished.append(j)
+        else:
+            print 'Operation', j, 'was interrupted and will be called again.'
+            RestoreInterruptedOutputs(CreateDict[j],IsFastDict[j],SsRTStore)
+    
+    for j in Committed + Finished:
+        if j not in Pending:
+            continue
+        ToRemove = []
+        NoDiff = {}
+        if j in Finished:
+            GatherOpResults(j,SsTemp,TempStdOut,NewlyCreatedScripts,NoDiff,ToRemove)
+        else:
+            ReadOpResults(j,SsTemp,NewlyCreatedScripts,NoDiff,ToRemove)
+            if EndedAs[j] == 'FAIL' and j not in ToRemove:
+                ToRemove.append(j)
+        Pending.remove(j)
+        RemoveDownstreamOfFailures(Plan,ScriptsToCall,None,ToRemove,Pending=Pending)
+        MakeTouchList(Plan,ScriptsToCall,TouchList,TotalNoDiff,NoDiff)
+    
+    for J in ScriptsToCall:
+        J.intersection_update(Pending)
+
+
+def RestoreInterruptedOutputs(Creates,IsFast,SsRTStore,creates = WORKING_DE.relative_root_dir):
+    '''
+    Undoes what an interrupted call to an operation did to its outputs, where 
+    possible:  if MoveToTemp had moved the previous version of an output to 
+    runtime storage, whatever the operation left in its place is archived as 
+    garbage and the previous version moved back.   (Fast operations work on 
+    their outputs in place, so theirs can't be restored.) 
+    '''
+    if IsFast:
+        return
+    Locks = locking.TargetLocks(Creates)
+    Locks.Acquire()
+    try:
+        for f in Creates:
+            temp_name = redirect(f,SsRTStore)
+            temp_name = temp_name[:-1] if temp_name[-1] == '/' else temp_name
+            if PathExists(temp_name):
+                MoveOutGarbage([f],SsRTStore)
+                print 'Reverting to most recent previous version of', f
+                os.rename(temp_name,f)
+    finally:
+        Locks.Release()
+
+
+def DoOpBatch(ArgsList):
+    '''
+    Runs a task of an array job:  calls DoOp with each of the arguments in 
+    ArgsList, one after another, in warm workers, with the output of each 
+    call going to the operation's in-session stdout file.   An operation 
+    whose call fails is left without results for the updater to find, and 
+    the task goes on with the next one. 
+    '''
+    for Args in ArgsList:
+        TempSOIS = os.path.join(Args[3] , RUNSTDOUTINSESSION + '_' + Args[1])
+        sys.stdout = logs.GetSink(TempSOIS,OP_LOG_MAX_BYTES,OP_LOG_SEGMENTS)
+        try:
+            DoOp(*Args,**{'Warm':True})
+        except:
+            traceback.print_exc(file = sys.stdout)
+        finally:
+            sys.stdout.close()
+            sys.stdout = sys.__stdout__
+
+
+def DoOp(i,j,SsName,SsTemp,SsRTStore,CreatesList,IsFast,CallMode,TouchList,DepListj, EmailWhenDone,Env = None,Timeout = None,Warm = None,creates = WORKING_DE.relative_root_dir):
+    '''
+    Calls operation j (see CallOp), as a span of the session's trace (see 
+    starflow.tracing). 
+    '''
+    tracing.Open(SsTemp,'op runner')
+    tracing.SetOp(j)
+    S = tracing.Span('DoOp')
+    try:
+        CallOp(i,j,SsName,SsTemp,SsRTStore,CreatesList,IsFast,CallMode,TouchList,DepListj,EmailWhenDone,Env = Env,Timeout = Timeout,Warm = Warm)
+    finally:
+        S.End()
+        tracing.SetOp(None)
+        tracing.Close()
+
+
+def CallOp(i,j,SsName,SsTemp,SsRTStore,CreatesList,IsFast,CallMode,TouchList,DepListj, EmailWhenDone,Env = None,Timeout = None,Warm = None,creates = WORKING_DE.relative_root_dir):
+    '''
+    Calls operation j, which makes CreatesList, in a production interpreter 
+    -- a warm worker's if it can (see starflow.workers) -- stopping it if it 
+    runs longer than Timeout seconds, and takes in its results (see FinishUp). 
+    '''
 
     Creates = CreatesList
 
@@ -453,13 +1023,31 @@ def DoOp(i,j,SsName,SsTemp,SsRTStore,CreatesList,IsFast,CallMode,TouchList,DepLi
     if j not in TouchList:
         print '\n\nCalling ' , j, ', which makes ',  ','.join(Creates) , '...\n'
         Before = time.time()
-        ExitStatus = os.system(PATH_TO_PYTHON + " -c " + Command)
+        ExitStatus = None
+        CacheKey = GetCacheKey(j,IsFast)
+        Restored = bool(CacheKey) and cache.Restore(CacheKey,Creates,TempOutput)
+        if Restored:
+            print 'Restored outputs of', j, 'from the op result cache.'
+            F = open(TempSOIS,'a') ; F.write('Outputs restored from the op result cache (key ' + CacheKey + ').\n') ; F.close()
+            cache.RecordStat(SsTemp + CACHESTATS,j,'hit')
+            ExitStatus = 0
+        elif CacheKey:
+            cache.RecordStat(SsTemp + CACHESTATS,j,'miss')
+        Run = tracing.Span(tracing.USER_SPAN) if ExitStatus is None else None
+        if ExitStatus is None and (CallMode in WARM_CALLMODES if Warm is None else Warm) and workers.UseWarmWorkers(PATH_TO_PYTHON):
+            ExitStatus = workers.RunOp(GetOpScript(j,ModName,OpName,TempSOIS,TempOutput),ModName,Env,Fork = not (IsFast and FAST_OPS_IN_PROCESS),Timeout = Timeout)
+        if ExitStatus is None:
+            ExitStatus = workers.RunCommand(''.join([k + '=' + Env[k] + ' ' for k in sorted(Env.keys())] if Env else []) + PATH_TO_PYTHON + " -c " + Command,Timeout)
         After = time.time()
+        if Run:
+            Run.End(ExitStatus = ExitStatus)
         os.utime(ModDirName,(OldATime,OldMTime))
         RunOutput = pickle.load(open(TempOutput,'r')) if PathExists(TempOutput) else None   
         child_jobs = isinstance(RunOutput,dict) and RunOutput.get('child_jobs') 
         if not child_jobs:
-            FinishUp(j,ExitStatus,RunOutput,Before,After,Creates,DepListj,OriginalTimes,OrigDirInfo,TempSOIS,TempMetaFile,CallMode,EmailWhenDone,SsName,SsRTStore,IsFast)        
+            FinishUp(j,ExitStatus,RunOutput,Before,After,Creates,DepListj,OriginalTimes,OrigDirInfo,TempSOIS,TempMetaFile,CallMode,EmailWhenDone,SsName,SsRTStore,IsFast,TimedOut = ExitStatus == workers.TIMEOUT_STATUS,Restored = Restored)        
+            if CacheKey and not Restored and ExitStatus == 0 and all([PathExists(f) for f in Creates]):
+                cache.Store(CacheKey,j,Creates,TempOutput)
         else:
             RecordPendingStatus(ExitStatus,RunOutput,child_jobs,Before,After,Creates,DepListj,OriginalTimes,OrigDirInfo,TempSOIS,TempMetaFile)
     
@@ -472,6 +1060,46 @@ def DoOp(i,j,SsName,SsTemp,SsRTStore,CreatesList,IsFast,CallMode,TouchList,DepLi
         FinishUp(j,ExitStatus,RunOutput,Before,After,Creates,DepListj,OriginalTimes,OrigDirInfo,TempSOIS,TempMetaFile,CallMode,EmailWhenDone,SsName,SsRTStore,IsFast)
 
 
+def GetCacheKey(j,IsFast):
+    '''
+    Op result cache key of a call to j (see starflow.cache), or None if the 
+    cache is off, j is a fast operation (which works on its outputs in place), 
+    or the key can't be computed. 
+    '''
+    if IsFast or not cache.CacheEnabled():
+        return None
+    try:
+        return cache.GetCacheKey(j)
+    except Exception:
+        print 'Could not compute op result cache key for', j
+        traceback.print_exc()
+        return None
+
+
+def GetResources(j):
+    '''
+    Resource requests declared by j (see starflow.budget), or the defaults if 
+    they can't be read. 
+    '''
+    try:
+        return budget.GetResources(j)
+    except Exception:
+        print 'Could not read the resource requests of', j
+        traceback.print_exc()
+        return budget.ParseResources({})
+
+
+def GetNumJobs(Jobs):
+    '''
+    Number of local worker processes to use for a requested number of jobs, 
+    where a non-positive request means one worker per cpu. 
+    '''
+    if Jobs is None or Jobs <= 0:
+        return multiprocessing.cpu_count()
+    else:
+        return int(Jobs)
+
+
 def HandleChildJobs(j,SsTemp,EmailWhenDone,SsName,SsRTStore,IsFast,CallMode):
     TempMetaFile = os.path.join(SsTemp , TEMPMETAFILE + '_' + j)
     if PathExists(TempMetaFile):
@@ -501,7 +1129,13 @@ def HandleChildJobs(j,SsTemp,EmailWhenDone,SsName,SsRTStore,IsFast,CallMode):
 
 
 
-def FinishUp(j,ExitStatus,RunOutput,Before,After,Creates,DepListj,OriginalTimes,OrigDirInfo,TempSOIS,TempMetaFile,CallMode,EmailWhenDone,SsName,SsRTStore,IsFast,child_jobs = None):
+def FinishUp(j,ExitStatus,RunOutput,Before,After,Creates,DepListj,OriginalTimes,OrigDirInfo,TempSOIS,TempMetaFile,CallMode,EmailWhenDone,SsName,SsRTStore,IsFast,child_jobs = None,TimedOut = False,Restored = False):
+    '''
+    Takes in the results of a call to j:  its ExitType is 'Touch' if it was 
+    only touched, 'Timeout' or 'Failure' if it failed, 'CacheHit' if its 
+    outputs were Restored from the op result cache and 'Success' otherwise 
+    (see metadata.SUCCESS_TYPES). 
+    '''
 
     Targets = uniqify(Creates + DepListj)
 
@@ -512,19 +1146,21 @@ def FinishUp(j,ExitStatus,RunOutput,Before,After,Creates,DepListj,OriginalTimes,
         ExitType = 'Touch'  
         for f in Creates:
             if PathExists(f):                   
+                Refresh = TouchManifest(f)
                 os.utime(f,(FindAtime(f),max(FindMtime(f),Before)))     
+                Refresh()
                 
     else:  
         TrueSuccess = (ExitStatus == 0) and all([PathExists(f) for f in Creates])
         
         if not TrueSuccess:  
-            ExitType = 'Failure'
+            ExitType = 'Timeout' if TimedOut else 'Failure'
             printfailuremessage(j,Creates,ExitStatus)               
             MoveOutGarbage(Creates,SsRTStore)
             RevertToOldFiles(Creates,SsRTStore,IsFast,OrigDirInfo)                      
             
         else:  
-            ExitType = 'Success'
+            ExitType = 'CacheHit' if Restored else 'Success'
             printsuccessmessage(j,Creates)
             for f in Creates:
                 os.utime(f,(FindAtime(f),max(FindMtime(f),Before)))  
@@ -545,7 +1181,7 @@ def FinishUp(j,ExitStatus,RunOutput,Before,After,Creates,DepListj,OriginalTimes,
     
     print("FINISH UP",TempMetaFile,TempMetaData)
     
-    if CallMode == 'DRMAA':
+    if CallMode in GRID_CALLMODES:
         EmailResults(EmailWhenDone,'Call to ' + j + ', run ' + SsName ,TempSOIS)
         
 
@@ -567,16 +1203,36 @@ def RecordPendingStatus(ExitStatus,RunOutput,child_jobs,Before,After,Creates,Dep
     pickle.dump(TempMetaData,F) 
     F.close()
     
+@tracing.traced
 def CheckDiffs(j,Creates,SsRTStore,IsFast,RunOutput,IsDifferent,Targets):
+    '''
+    Decides, for each target, whether the newly created version differs from the 
+    most recent previous version (stored under SsRTStore).   This is done by 
+    comparing content manifests (see starflow.hashing): the manifest of the new 
+    version is made now and stored for next time, and the manifest stored 
+    when the previous version was created is used for it as long as it still 
+    matches that version on disk -- so the previous version is only re-read 
+    if it has no (current) manifest. 
+    '''
     
     for f in Creates:
         temp_name = redirect(f,SsRTStore)
         tset = [t for t in Targets if PathAlong(t,f)]
+        if not IsFast and PathExists(f):
+            NewManifest = hashing.MakeManifest(f)
+        else:
+            NewManifest = None
+        if NewManifest is not None and PathExists(temp_name):
+            OldManifest = hashing.LoadManifest(hashing.GetManifestFile(f))
+            if not hashing.ManifestIsCurrent(OldManifest,temp_name):
+                OldManifest = hashing.MakeManifest(temp_name)
+        else:
+            OldManifest = None
+                
         for t in tset:  
             temp_path = temp_name if f == t else temp_name + ('/' if not temp_name.endswith('/') else '') + t[len(f):]
-            if PathExists(temp_path):
-                Differences = os.popen('diff -rq ' + temp_path + ' ' + t,'r').read()
-                IsDifferent[t] = len(Differences) > 0
+            if OldManifest is not None and PathExists(temp_path):
+                IsDifferent[t] = not hashing.SameContents(hashing.SubManifest(OldManifest,t[len(f):]),hashing.SubManifest(NewManifest,t[len(f):]))
                 if not IsDifferent[t]: 
                     print 'No differences were detected between the newly created version of', t, 'and the most recent previous version.' 
                 
@@ -585,14 +1241,32 @@ def CheckDiffs(j,Creates,SsRTStore,IsFast,RunOutput,IsDifferent,Targets):
             elif PathExists(t):
                 IsDifferent[t] = True
         
-        if PathExists(temp_name):
-            TS = TimeStamp(FindMtime(temp_name)) #move stored version to archive if it hasn't already been moved
-            archive_name = os.path.join(WORKING_DE.archive_dir,f[3:].replace('/','__') + TS)
-            if not PathExists(archive_name):
-                os.rename(temp_name,archive_name)
+        if NewManifest is not None:
+            hashing.SaveManifest(NewManifest,hashing.GetManifestFile(f))
+        
+        if PathExists(temp_name):   #move stored version to archive 
+            archive.ArchiveVersion(f,temp_name,Manifest = OldManifest)
 
     return IsDifferent
 
+
+def TouchManifest(f):
+    '''
+    Keeps the stored manifest of f current across a touch of f, which changes 
+    only its mtime.  Call just before the touch; returns a function to call after.
+    '''
+    ManifestFile = hashing.GetManifestFile(f)
+    Manifest = hashing.LoadManifest(ManifestFile)
+    if hashing.ManifestIsCurrent(Manifest,f) and Manifest[''] is not None:
+        def Refresh():
+            Manifest[''] = (Manifest[''][0],os.path.getmtime(f),Manifest[''][2])
+            hashing.SaveManifest(Manifest,ManifestFile)
+    else:
+        def Refresh():
+            pass
+    return Refresh
+
+
 def RevertToOldFiles(Creates,SsRTStore,IsFast,OriginalDirInfo):                 
     if not IsFast:  
         for f in Creates:
@@ -604,59 +1278,70 @@ def RevertToOldFiles(Creates,SsRTStore,IsFast,OriginalDirInfo):
             os.utime(g,(FindAtime(g),OriginalDirInfo[g][0]))    
 
 def MoveOutGarbage(Creates,SsRTStore,creates = WORKING_DE.relative_root_dir):
+    '''
+    Archives partial outputs of a failed operation (see starflow.archive). 
+    '''
     for f in Creates: 
         if PathExists(f):
-            temp_name = redirect(f,SsRTStore) 
-            garbagename = (temp_name[:-1] if temp_name[-1] == '/' else temp_name) +  '_Garbage_' + TimeStamp(time.time())
-            print 'Moving partially created output to', garbagename
-            os.rename(f,garbagename)
+            print 'Moving partially created output', f, 'to archive.'
+            archive.ArchiveVersion(f,f,Kind = 'Garbage')
 
 def printsuccessmessage(op,Creates):
     print '... appears to have successfully run', op, ', creating' , ','.join(Creates)
 
 def printfailuremessage(op,Creates,ExitStatus):
     UncreatedFiles = [f for f in Creates if not PathExists(f)]              
-    FailureStatement = 'threw an exception during attempted execution (see above for details).' if ExitStatus != 0 else 'ran without throwing an exception, but for some reason the outputs ' + ', '.join(UncreatedFiles) + ' never got created.'
+    FailureStatement = 'was stopped because it ran past its timeout.' if ExitStatus == workers.TIMEOUT_STATUS else 'threw an exception during attempted execution (see above for details).' if ExitStatus != 0 else 'ran without throwing an exception, but for some reason the outputs ' + ', '.join(UncreatedFiles) + ' never got created.'
     print op , FailureStatement , 'System will consider this run a failure and (if possible) will revert to old versions of ' , ','.join(Creates) , '.  Downstream updates will be cancelled.'  
 
     
 
 def InSessionStdOutToStdOut(TempStdOutInSession,TempStdOut):
+    '''
+    Appends an operation's in-session stdout/stderr to the run's output, 
+    streaming it over (see starflow.logs) rather than reading it whole. 
+    '''
 
-    if PathExists(TempStdOutInSession):
-        runstdtext = open(TempStdOutInSession,'r').read() 
-    else:
-        runstdtext = None
-    if runstdtext:
-        statement = 'During the run, the following output was printed to stdout and stderr:\n\n\n' + runstdtext +  '\n\n'
-    else:
-        statement = 'During the run, no output was written to stdout or stderr.\n\n'
+    sys.stdout.flush()
     F = open(TempStdOut,'a')
-    F.write(statement)
+    if logs.LogSize(TempStdOutInSession) > 0:
+        F.write('During the run, the following output was printed to stdout and stderr:\n\n\n')
+        logs.CopyLog(TempStdOutInSession,F)
+        F.write('\n\n')
+    else:
+        F.write('During the run, no output was written to stdout or stderr.\n\n')
     F.close()
 
 
-def GetCommand(j,ModuleName,OpName,TempStdOutInSession,TempOutput,CallMode=DEFAULT_CALLMODE):
-
+def GetOpScript(j,ModuleName,OpName,TempStdOutInSession,TempOutput):
+    '''
+    Python source that calls operation j in a production interpreter, capturing
+    its stdout/stderr to TempStdOutInSession and pickling its output to TempOutput.
+    '''
 
-    Commands = ["'import pickle,traceback",
+    Commands = ["import pickle,traceback",
             "creates = (\"" + TempStdOutInSession + "\",\"" + TempOutput + "\")", 
             "from starflow.production import *",
             "import starflow.utils",
-            "sys.stdout = starflow.utils.multicaster(\"" + TempStdOutInSession + "\",sys.__stdout__)",
-            "sys.stderr = starflow.utils.multicaster(\"" + TempStdOutInSession + "\",sys.__stderr__)",          
+            "sys.stdout = starflow.utils.multicaster(\"" + TempStdOutInSession + "\",sys.__stdout__,MaxBytes=" + str(OP_LOG_MAX_BYTES) + ",Segments=" + str(OP_LOG_SEGMENTS) + ")",
+            "sys.stderr = starflow.utils.multicaster(\"" + TempStdOutInSession + "\",sys.__stderr__,MaxBytes=" + str(OP_LOG_MAX_BYTES) + ",Segments=" + str(OP_LOG_SEGMENTS) + ")",          
             "from " + ModuleName + " import " + OpName,
 #           "exec \"V = " + OpName + "()",
             "try:\n\texec \"V = " + OpName + "()\"\nexcept:\n\ttraceback.print_exc()\n\traise Error",
             "F = open(\"" + TempOutput + "\",\"w\")", 
             "try:\n\tpickle.dump(V,F)\nexcept:\n\tprint \"Output of " + j + " cannot be pickled\"", 
-            "F.close()'"]
-    Command = '\n'.join(Commands)
+            "F.close()"]
 
+    return '\n'.join(Commands)
+    
+
+def GetCommand(j,ModuleName,OpName,TempStdOutInSession,TempOutput,CallMode=DEFAULT_CALLMODE):
 
+    Command = "'" + GetOpScript(j,ModuleName,OpName,TempStdOutInSession,TempOutput) + "'"
 
     return Command
 
+@tracing.traced
 def MoveToTemp(Creates,IsFast,SsRTStore):
     for f in Creates: 
         temp_name = redirect(f,SsRTStore) 
@@ -668,6 +1353,7 @@ def MoveToTemp(Creates,IsFast,SsRTStore):
             os.rename(f,temp_name)   
                 
 
+@tracing.traced
 def SetupOp(j,CreateList,SsTemp,creates=WORKING_DE.relative_tmp_dir):
     OriginalTimes = {}
     OriginalDirInfo = {}    
@@ -688,6 +1374,17 @@ def SetupOp(j,CreateList,SsTemp,creates=WORKING_DE.relative_tmp_dir):
     return [OriginalTimes,OriginalDirInfo,TempStdOutInSession,TempOutput,TempMetaFile]
     
 
+def GetReads(LinkList):
+    '''
+    Dictionary mapping each operation with DependsOn links in LinkList to the 
+    sorted paths it depends on. 
+    '''
+    ReadDict = {}
+    for l in LinkList[LinkList['LinkType'] == 'DependsOn']:
+        ReadDict.setdefault(l['LinkTarget'],set([])).add(l['SourceFile'])
+    return dict([(j,sorted(R)) for (j,R) in ReadDict.items()])
+
+
 def GetCreatesAndIsFast(RemainingLinkList):
 
     CreateLinks = RemainingLinkList[RemainingLinkList['LinkType'] == 'CreatedBy']
@@ -703,36 +1400,36 @@ def GetCreatesAndIsFast(RemainingLinkList):
     return [CreateDict,IsFastDict]
     
     
-def MakeTouchList(RemainingLinkList,ScriptsToCall,TouchList,TotalNoDiff,NoDiff,Seed,Simple,Pruning,ProtectComputed):
-
+def MakeTouchList(Plan,ScriptsToCall,TouchList,TotalNoDiff,NoDiff):
+    '''
+    Adds to TouchList the scripts that, now that the outputs in NoDiff are 
+    known to be no different from their previous versions, need only have 
+    their outputs touched.   Only the plan downstream of NoDiff is looked at 
+    (see invalidation.PlanGraph). 
+    '''
     if len(NoDiff) > 0:     
         TotalNoDiff.update(NoDiff)
-        RemainingLinkList = RemainingLinkList[[i for i in range(len(RemainingLinkList)) if RemainingLinkList['LinkSource'][i] not in NoDiff.keys()]]    
-        R = RemainingLinkList[RemainingLinkList['LinkType'] != 'Dummy']
-        RemainingLinkListSequence = [ll[ll['Activated']] for ll in PropagateThroughLinkGraphWithTimes(Seed,R, Simple=Simple,Pruning=Pruning,ProtectComputed = ProtectComputed)]     
-        TouchList.update(Union(ScriptsToCall).difference(Union([set(l['UpdateScript']) for l in RemainingLinkListSequence])))
-
-        
-    return RemainingLinkList
+        TouchList.update(Union(ScriptsToCall).intersection(Plan.Unchanged(NoDiff.keys())))
     
 
-def RemoveDownstreamOfFailures(RemainingLinkList,ScriptsToCall,Round,ToRemove,Seed,Simple,Pruning,ProtectComputed):
+def RemoveDownstreamOfFailures(Plan,ScriptsToCall,Round,ToRemove,Pending=None):
+    '''
+    Cancels calls to scripts downstream of the failed scripts in ToRemove.  
+    Cancelled calls are removed from the rounds after Round, or, when a set 
+    of Pending scripts is given (as by DataflowUpdate), from that set.   Only 
+    the plan downstream of the failed scripts is looked at (see 
+    invalidation.PlanGraph). 
+    '''
     if len(ToRemove) > 0:       
-        TTT = numpy.array(ToRemove)
-        TTT.sort()
-        RemainingLinkList = RemainingLinkList[numpy.invert(fastisin(RemainingLinkList['UpdateScript'],TTT))]
-        RemainingLinkListSequence = [ll[ll['Activated']] for ll in PropagateThroughLinkGraphWithTimes(Seed,RemainingLinkList,Simple=Simple,Pruning=Pruning,ProtectComputed = ProtectComputed)]
-        RemainingScripts = Union([set(l['UpdateScript']) for l in RemainingLinkListSequence])
-        ScriptsToRemove = Union(ScriptsToCall).difference(ToRemove).difference(RemainingScripts)
-        for JJ in ScriptsToCall[Round+1:]:
+        ScriptsToRemove = Union(ScriptsToCall).intersection(Plan.Fail(ToRemove)).difference(ToRemove)
+        for JJ in ([Pending] if Pending is not None else ScriptsToCall[Round+1:]):
             for kk in ScriptsToRemove:
                 if kk in JJ:
                     JJ.remove(kk)
                     print 'Removing call to script', kk, 'due to failure of at least one of the scripts:', ToRemove 
-                    
-    return RemainingLinkList
     
     
+@tracing.traced
 def EmailResults(EmailWhenDone,SsName,FileName):
 
     account = WORKING_DE.gmail_account_name
@@ -751,10 +1448,8 @@ def EmailResults(EmailWhenDone,SsName,FileName):
             
 
 def RemoveScriptsToBeCreated(TotalLinkList,ScriptsToCall):
-    TotalLinkList.sort(order=['UpdateScriptFile'])
-    T = TotalLinkList.copy();   T = T[T['LinkType'] == 'CreatedBy'];  T.sort(order=['TargetFile'])
-    [A,B] = getpathalong(T['TargetFile'],TotalLinkList['UpdateScriptFile'])
-    BadLines = ListUnion([range(A[i],B[i]) for i in range(len(A))])
+    T = TotalLinkList[TotalLinkList['LinkType'] == 'CreatedBy']
+    BadLines = PathIndex(TotalLinkList['UpdateScriptFile']).Along(T['TargetFile'])
     BadSeedScripts = list(set(TotalLinkList[BadLines]['UpdateScript']).difference(['None']))                        
     if len(BadSeedScripts) > 0:
         P = PropagateThroughLinkGraph(BadSeedScripts,TotalLinkList)
@@ -12,9 +12,12 @@ import shutil
 import types
 import pickle
 import re
+import hashlib
 
 import numpy
 
+import starflow.logs as logs
+
 from string import Template
 from traceback import print_exc
 from numpy import nan, isnan
@@ -399,6 +402,13 @@ def creates(x):
     
 def uses(x):
     return lambda f: single_annotator(f, '__uses__', x)     
+
+def resources(**x):
+    '''
+    Declares what an operation needs while it runs, 
+    e.g. @resources(threads = 4, memory = '8G') (see starflow.budget)
+    '''
+    return lambda f: add_decorated_attribute(f, '__resources__', x)
     
 def single_annotator(f, attr_name, g):
     '''
@@ -595,27 +605,19 @@ def maximalpathalong(YY,ZZ):
     Fast function for determining indices of elements of YY such that
     they are "path along" some element of ZZ, for numpy arrays YY 
     and ZZ.  When YY[i] is path along several element of ZZ, returns 
-    index of the first occurence of the closest path.  If YY[i] is not 
+    the closest path (see PathIndex.Deepest).  If YY[i] is not 
     path-along any elements of Z, returns ''. 
+    
+    Elements of ZZ are compared as getpathalong compares them, with a 
+    trailing '/', so a directory in ZZ given without its '/' is an ancestor
+    too.   This changes results from earlier versions, which matched such 
+    a directory only when it was spelled with its '/':  e.g. for YY[i] = 
+    '../a-b/c/x' and ZZ containing '../a-b/' and '../a-b/c', the result is 
+    now '../a-b/c' where it used to be '../a-b/'. 
         
     '''
 
-    ZZ = ZZ.copy() ; ZZ.sort()
-#   Y =  numpy.array([y + '/' if y[-1] != '/' else y for y in YY])
-#   Z = numpy.array([y + '/' if y[-1] != '/' else y for y in ZZ])
-    Y = YY
-    Z = ZZ
-    SlashList = numpy.array([len(y.split('/')) - (1 if y[-1] == '/' else 0) for y in Z])
-    Max = max(SlashList) if len(SlashList) > 0 else 0
-    Min = min(SlashList) if len(SlashList) > 0 else 0
-    
-    C = -1*numpy.ones((len(YY),),int)
-    for i in range(Min,Max+1):
-        T = numpy.array(['/'.join(z.split('/')[:i]) + ('/' if len(z.split('/')) > i else '')  for z in Y])
-        [A,B] = fastequalspairs(T,Z)
-        M = (B>A)
-        C[M] = B[M] - 1
-    
+    C = PathIndex(ZZ).Deepest(YY)
     z = numpy.append(ZZ,[''])
     return z[C]
     
@@ -680,15 +682,18 @@ def getpathalong(YY,ZZ):
     
 def getpathalongs(Y,Z):
     '''
-        Returns numpy array of indices i in numpy array Y such that Y[i] is 
-        path-along some path string in Z
+        Returns numpy array of indices i in numpy array Z such that Z[i] is 
+        path-along some path string in Y, in increasing order. 
+        
+        This changes results from earlier versions, which returned the 
+        indices in no particular order, and sorted Z as plain strings before 
+        searching it for intervals keyed with a trailing '/', so missing 
+        paths that sort differently the two ways:  e.g. for Y = ['../a-b'] 
+        and Z = ['../a-b','../a-b-c','../a-b/b/a'], the result is now [0,2] 
+        where it used to be [2]. 
     '''
 
-    s = Z.argsort()
-    Z = Z[s]
-    [A,B] = getpathalong(Y,Z)
-    L = ListUnion([range(A[i],B[i]) for i in range(len(A)) if A[i] < B[i]])
-    return s[L]
+    return PathIndex(Z).Along(Y).nonzero()[0]
 
 
 def getpathstrictlyalong(YY,ZZ):
@@ -699,8 +704,114 @@ def getpathstrictlyalong(YY,ZZ):
     YY =  numpy.array([y + '/' if y[-1] != '/' else y for y in YY])
     ZZ = numpy.array([y + '/' if y[-1] != '/' else y for y in ZZ])  
     [C,D] = fastequalspairs(YY,ZZ)
-    return [D,B]    
-    
+    return [D,B]
+
+
+class PathIndex(object):
+    '''
+    Index of a numpy array of paths, Paths, for "path along" queries.
+
+    Each path is keyed as getpathalong compares it (with a trailing '/'),
+    and the keys are sorted once:  the paths along a path Q are then those
+    whose keys begin with Q's key, an interval of the sorted keys found by
+    binary search, and the paths Q is along are those whose keys are
+    prefixes of Q's key, one per directory level of Q.   All queries take
+    numpy arrays of paths, and are answered for all of them at once.
+
+    E.g. if
+
+    Index = PathIndex(numpy.array(['../Data/', '../Data/a.txt', '../Data/b/', '../Data/b/c.txt']))
+
+    then
+
+    Index.Along(['../Data/b']) = [False, False, True, True]
+    Index.Below(['../Data/','../Data/b/'],Levels = 1) = [[0,0,1],[1,2,3]]
+    Index.Deepest(['../Data/b/c.txt','../Other/']) = [3,-1]
+    '''
+    def __init__(self,Paths):
+        self.Paths = numpy.asarray(Paths)
+        Keys = PathKeys(self.Paths)
+        self.Order = Keys.argsort(kind = 'mergesort')
+        self.Keys = Keys[self.Order]
+        self.Depths = numpy.char.count(self.Keys,'/') if len(self.Keys) > 0 else numpy.zeros((0,),int)
+
+    def Intervals(self,Queries,Strict = False):
+        '''
+        [A,B] where self.Keys[A[i]:B[i]] are the keys of the paths along
+        Queries[i] (strictly along it, if Strict).
+        '''
+        Q = PathKeys(Queries)
+        if len(Q) == 0 or len(self.Keys) == 0:
+            return [numpy.zeros((len(Q),),int),numpy.zeros((len(Q),),int)]
+        A = self.Keys.searchsorted(Q,'right' if Strict else 'left')
+        #keys beginning with q sort below q with its final '/' raised to the next character, '0'
+        B = self.Keys.searchsorted(numpy.array([q[:-1] + '0' for q in Q]),'left')
+        return [A,numpy.maximum(A,B)]
+
+    def Below(self,Queries,Strict = False,Levels = None):
+        '''
+        [P,I] where the paths self.Paths[I[k]] are the paths along
+        Queries[P[k]] (strictly along it, if Strict;  exactly Levels
+        directory levels down from it, if Levels is given), in increasing
+        order of P.
+        '''
+        [A,B] = self.Intervals(Queries,Strict)
+        Counts = B - A
+        P = numpy.repeat(numpy.arange(len(A)),Counts)
+        K = numpy.repeat(A,Counts) + numpy.arange(len(P)) - numpy.repeat(Counts.cumsum() - Counts,Counts)
+        if Levels is not None and len(P) > 0:
+            QDepths = numpy.char.count(PathKeys(Queries),'/')
+            Keep = self.Depths[K] - QDepths[P] == Levels
+            P = P[Keep]; K = K[Keep]
+        return [P,self.Order[K]]
+
+    def Along(self,Queries):
+        '''
+        Boolean array of the paths in self.Paths along some path in Queries.
+        '''
+        [A,B] = self.Intervals(Queries)
+        Marks = numpy.zeros((len(self.Keys) + 1,),int)
+        numpy.add.at(Marks,A,1)
+        numpy.add.at(Marks,B,-1)
+        InSorted = Marks.cumsum()[:-1] > 0
+        Mask = numpy.zeros((len(self.Keys),),bool)
+        Mask[self.Order] = InSorted
+        return Mask
+
+    def Contain(self,Queries):
+        '''
+        Boolean array of the paths in Queries along which some path in
+        self.Paths is.
+        '''
+        [A,B] = self.Intervals(Queries)
+        return B > A
+
+    def Deepest(self,Queries):
+        '''
+        Array of the indices, in self.Paths, of the deepest path that each
+        path in Queries is along (the first such, if several are keyed
+        alike), or -1 for paths along none.
+        '''
+        Q = PathKeys(Queries)
+        Prefixes = [(i,'/'.join(Parts[:j]) + '/') for (i,Parts) in enumerate([q.split('/') for q in Q]) for j in range(1,len(Parts))]
+        D = -1 * numpy.ones((len(Q),),int)
+        if len(Prefixes) > 0 and len(self.Keys) > 0:
+            P = numpy.array([p[0] for p in Prefixes])
+            K = numpy.array([p[1] for p in Prefixes])
+            S = self.Keys.searchsorted(K)
+            Found = (S < len(self.Keys)) & (self.Keys[numpy.minimum(S,len(self.Keys) - 1)] == K)
+            #prefixes come in increasing depth for each query, so the deepest found is written last
+            D[P[Found]] = self.Order[S[Found]]
+        return D
+
+
+def PathKeys(Paths):
+    '''
+    Keys of Paths, as getpathalong compares them:  each path with a
+    trailing '/'.
+    '''
+    return numpy.array([p if p.endswith('/') else p + '/' for p in Paths],str)
+
 
 def fastequalspairs(Y,Z):
     '''
@@ -1138,18 +1249,23 @@ class multicaster():
     its original desired effect and also to print any output to a log file. 
     
     typical Usage:
-        sys.stdout = multicaster(sys.__stdout__,'LogFile.txt')
+        sys.stdout = multicaster('LogFile.txt',sys.__stdout__)
     
     Then, whenever a 'print ' statement is made, output is directed both to
     original stdout as well as to the logfile "LogFile.txt"
+    
+    The log file is written through the process's sink for it (see 
+    starflow.logs), which keeps it open and writes it a line at a time. 
     '''
-    def __init__(self,filename,OldObject,New=False):
+    def __init__(self,filename,OldObject,New=False,MaxBytes=0,Segments=0):
         '''
         ARGUMENTS:
             filename = name of file to write to 
             OldObject = original output stream to multicast
             NEW = boolean which overwrites log file if true; otherwise, 
             output of stream is _appended_ to 'filename'    
+            MaxBytes, Segments = cap on the size of the log file (see 
+            starflow.logs);  0 means no cap
             
         '''
         self.file = filename
@@ -1162,6 +1278,8 @@ class multicaster():
             F.write('------------------------------------------------------------------------------------------------------------------------------------------------------\n\n')
             F.close()
             
+        self.sink = logs.GetSink(filename,MaxBytes,Segments)
+            
     def __getattr__(self,name):
         '''
         This is intended to answer that whenever the stdout is asked to 
@@ -1174,11 +1292,19 @@ class multicaster():
             return self.old.__getattribute__(name)
                     
     def write(self,s):
-        F = open(self.file,'a')
-        F.write(s)
-        F.close()   
+        self.sink.write(s)
         return self.old.write(s)
         
+    def flush(self):
+        self.sink.flush()
+        return self.old.flush()
+        
+    def close(self):
+        '''
+        Closes the log file;  the original stream is left open. 
+        '''
+        self.sink.close()
+        
 
 def DictInvert(D):
     '''
@@ -1204,6 +1330,19 @@ def DictInvert1(D, order=None):
     return dict([(v,uniqify([j for j in order if v in D[j]])) for v in uniqify(ListUnion(D.values()))])
 
 
+def PathFileName(path,Length = 64):
+    '''
+    Name, usable as a single file name, for the data environment path (e.g. 
+    '../Data/x/y.txt'):  the first Length characters of a readable form of 
+    the path ('Data__x__y.txt'), then the digest of the normalized path, so 
+    that distinct paths never share a name (as '../Data/x__y' and 
+    '../Data/x/y' would by their readable forms alone).
+    '''
+    f = os.path.normpath(path)
+    Readable = (f[3:] if f.startswith('../') else f).strip('/').replace('/','__')
+    return Readable[:Length] + '.' + hashlib.sha1(f).hexdigest()
+
+
 def PathExists(ToCheck):
     '''
         convenient name for os function
@@ -0,0 +1,298 @@
+'''
+Watch mode:  continuous incremental updates of a data environment.
+
+WatchUpdate keeps the link graph of the data environment in memory, watches
+the data environment (all of it but its .starflow directory) for changes, and
+after each burst of changes -- once DEBOUNCE seconds pass without a further
+change, or MAX_DELAY seconds after the first -- propagates downstream from
+just the paths that changed and calls the operations that are out of date, as
+FullUpdate would, honoring the same automatic-update filters
+(see linkmanagement.FilterForAutomaticUpdates).
+
+Changes are learned of through inotify where it's available (linux), and
+otherwise by polling the modification times of the data environment every
+POLL_INTERVAL seconds.   The link graph is recomputed (see
+linkmanagement.LinksFromOperations, which recomputes the links of changed
+modules only) only when a python module changes.   Since the watcher knows
+when each path changed, a directory that is a link source is given the time of
+the latest change below it (through the HoldTimes of
+PropagateThroughLinkGraphWithTimes), so a file changed inside a directory
+dependency triggers its consumers even in "simple" mode, where only the
+directory's own modification time would otherwise be looked at.
+
+The changes that an update makes itself -- to the outputs of the operations
+it called -- don't trigger further updates.
+'''
+
+import os
+import time
+import errno
+import struct
+import select
+import ctypes
+import ctypes.util
+
+import starflow.de as de
+import starflow.update as update
+from starflow.utils import PathAlong, ListUnion
+from starflow.linkmanagement import LinksFromOperations, FilterForAutomaticUpdates, PropagateThroughLinkGraphWithTimes
+
+DE_MANAGER = de.DataEnvironmentManager()
+WORKING_DE = DE_MANAGER.working_de
+
+DEBOUNCE = 2                # seconds without changes that end a burst of them
+MAX_DELAY = 30              # longest wait, in seconds, from the first change of a burst to the update
+POLL_INTERVAL = 2           # seconds between scans when inotify isn't available
+EXCLUDED = ['.starflow']    # directories of the data environment root not watched
+
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+EVENT_HEADER = struct.Struct('iIII')
+
+
+def WatchUpdate(Seed = ['../'],AU = None,Exceptions = None,Simple = True,Pruning = True,ProtectComputed = False,EmailWhenDone = None,
+                CallMode = update.DEFAULT_CALLMODE,Jobs = update.DEFAULT_JOBS,Initial = True,Debounce = DEBOUNCE,depends_on = WORKING_DE.relative_root_dir):
+    '''
+    Updates the data environment whenever something in it changes, until
+    interrupted.
+
+    ARGUMENTS:
+    --Seed = paths whose changes trigger updates (default: the whole data
+        environment)
+    --Initial = first bring everything downstream of Seed up to date, as
+        FullUpdate would
+    --Debounce = seconds without changes that end a burst of them
+    --the others as for FullUpdate
+    '''
+    if isinstance(Seed,str):
+        Seed = Seed.split(',')
+    Watcher = GetWatcher(WORKING_DE.root_dir)
+    print 'Watching', WORKING_DE.root_dir, 'for changes (with ' + Watcher.Kind + ') ...'
+    if Initial:
+        update.LinkUpdate(Seed,AU = AU,Exceptions = Exceptions,Simple = Simple,Pruning = Pruning,ProtectComputed = ProtectComputed,EmailWhenDone = EmailWhenDone,CallMode = CallMode,Jobs = Jobs)
+    LinkList = LoadLinks(AU,Exceptions)
+    Carried = {}
+    try:
+        while True:
+            Changes = Collect(Watcher,Debounce,Carried)
+            Carried = {}
+            if Changes is None:
+                print '\nToo many changes to follow one by one;  updating everything downstream of', ','.join(Seed)
+                LinkList = LoadLinks(AU,Exceptions)
+                Changes = dict([(s,time.time()) for s in Seed])
+            Changes = dict([(p,t) for (p,t) in Changes.items() if any([PathAlong(p,s) for s in Seed])])
+            if len(Changes) == 0:
+                continue
+            if any([p.endswith('.py') for p in Changes.keys()]):
+                LinkList = LoadLinks(AU,Exceptions)
+            print '\n' + time.strftime('%c') + ':', len(Changes), 'path(s) changed:', ', '.join(sorted(Changes.keys())[:10]) + (' ...' if len(Changes) > 10 else '')
+            Created = UpdateChanges(Changes,LinkList,AU,Exceptions,Simple,Pruning,ProtectComputed,EmailWhenDone,CallMode,Jobs)
+            if len(Created) > 0:
+                #the changes the update made are waiting to be read:  those to its own outputs are dropped
+                Pending = Watcher.Read(0) or {}
+                Carried = dict([(p,t) for (p,t) in Pending.items() if not any([PathAlong(p,c) for c in Created])])
+    except KeyboardInterrupt:
+        print '\nStopped watching.'
+    finally:
+        Watcher.Close()
+
+
+def LoadLinks(AU,Exceptions):
+    '''
+    The link graph, as FullUpdate sees it.
+    '''
+    LinkList = LinksFromOperations(WORKING_DE.load_live_modules(),AddDummies = True)
+    return FilterForAutomaticUpdates(LinkList,AU = AU,Exceptions = Exceptions)
+
+
+def UpdateChanges(Changes,LinkList,AU,Exceptions,Simple,Pruning,ProtectComputed,EmailWhenDone,CallMode,Jobs):
+    '''
+    Calls the operations made out of date by the changed paths in Changes (a
+    dictionary of the times they changed), and returns the paths the
+    operations called create.
+    '''
+    Seed = sorted(Changes.keys())
+    HoldTimes = {}
+    for s in set(LinkList['SourceFile']) if len(LinkList) > 0 else []:
+        if s.endswith('/'):
+            Times = [t for (p,t) in Changes.items() if PathAlong(p,s)]
+            if len(Times) > 0:
+                HoldTimes[s] = max(Times)
+                Seed.append(s)
+    T = PropagateThroughLinkGraphWithTimes(Seed,LinkList,Simple = Simple,Pruning = Pruning,HoldTimes = HoldTimes,ProtectComputed = ProtectComputed)
+    ActivatedLinkListSequence = [ll[ll['Activated']] for ll in T]
+    Scripts = set(ListUnion([l['UpdateScript'].tolist() for l in ActivatedLinkListSequence])).difference(['None'])
+    if len(Scripts) == 0:
+        print 'Nothing to update.'
+        return []
+    update.UpdateLinks(ActivatedLinkListSequence,Seed,AU = AU,Exceptions = Exceptions,Simple = Simple,Pruning = Pruning,Forced = False,ProtectComputed = ProtectComputed,EmailWhenDone = EmailWhenDone,CallMode = CallMode,Jobs = Jobs)
+    return set(ListUnion([l[l['LinkType'] == 'CreatedBy']['LinkTarget'].tolist() for l in ActivatedLinkListSequence]))
+
+
+def Collect(Watcher,Debounce,Changes = None):
+    '''
+    Waits for a burst of changes and returns the changed paths, with the times
+    they were last seen to change, added to Changes;  or None if the watcher
+    lost track of them.
+    '''
+    Changes = dict(Changes or {})
+    First = time.time() if len(Changes) > 0 else None
+    while True:
+        Timeout = None if First is None else max(min(Debounce,First + MAX_DELAY - time.time()),0)
+        New = Watcher.Read(Timeout)
+        if New is None:
+            return None
+        if len(New) == 0:
+            if First is not None:
+                return Changes
+        else:
+            Changes.update(New)
+            First = First or time.time()
+
+
+def GetWatcher(Root):
+    try:
+        return InotifyWatcher(Root)
+    except (OSError,AttributeError):
+        return PollingWatcher(Root)
+
+
+def Relative(Root,Path,IsDir = False):
+    '''
+    Path of a file of the data environment as the updater names it.
+    '''
+    return '../' + os.path.relpath(Path,Root) + ('/' if IsDir else '')
+
+
+def WatchedDirs(Root,Top = None):
+    '''
+    Directories under Top (default:  Root) that are watched.
+    '''
+    Top = Top or Root
+    Dirs = []
+    for (d,Subdirs,Files) in os.walk(Top):
+        if d == Root:
+            Subdirs[:] = [s for s in Subdirs if s not in EXCLUDED]
+        Dirs.append(d)
+    return Dirs
+
+
+class InotifyWatcher(object):
+    '''
+    Watches the directories under Root with inotify.
+    '''
+    Kind = 'inotify'
+
+    def __init__(self,Root):
+        self.Root = Root
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c'),use_errno = True)
+        self.fd = self.libc.inotify_init()
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(),'inotify_init failed')
+        self.Dirs = {}
+        for d in WatchedDirs(Root):
+            self.AddWatch(d)
+
+    def AddWatch(self,d):
+        wd = self.libc.inotify_add_watch(self.fd,d,WATCH_MASK | IN_ONLYDIR)
+        if wd >= 0:
+            self.Dirs[wd] = d
+
+    def Read(self,Timeout):
+        '''
+        Changes of the next batch of events, waiting up to Timeout seconds for
+        one (forever if None):  a dictionary mapping changed paths to when
+        they were seen to change, or None if events were lost.
+        '''
+        try:
+            Ready = select.select([self.fd],[],[],Timeout)[0]
+        except select.error, e:
+            if e[0] == errno.EINTR:
+                return {}
+            raise
+        if not Ready:
+            return {}
+        Data = os.read(self.fd,2**16)
+        Now = time.time()
+        Changes = {}
+        Lost = False
+        i = 0
+        while i + EVENT_HEADER.size <= len(Data):
+            (wd,Mask,Cookie,Length) = EVENT_HEADER.unpack_from(Data,i)
+            Name = Data[i + EVENT_HEADER.size:i + EVENT_HEADER.size + Length].rstrip('\0')
+            i += EVENT_HEADER.size + Length
+            if Mask & IN_Q_OVERFLOW:
+                Lost = True
+                continue
+            if Mask & IN_IGNORED:
+                self.Dirs.pop(wd,None)
+                continue
+            if wd not in self.Dirs:
+                continue
+            IsDir = bool(Mask & IN_ISDIR)
+            if (not Name or IsDir) and Mask & IN_ATTRIB:
+                #changes to the times of a directory (e.g. as set by the updater) are not changes to its contents, which are watched
+                continue
+            d = self.Dirs[wd]
+            Path = os.path.join(d,Name) if Name else d
+            if IsDir and (d == self.Root and Name in EXCLUDED):
+                continue
+            Changes[Relative(self.Root,Path,IsDir)] = Now
+            if IsDir and Mask & (IN_CREATE | IN_MOVED_TO):
+                #what was put in a new directory before it was watched is changed too
+                for dd in WatchedDirs(self.Root,Path):
+                    self.AddWatch(dd)
+                    for f in os.listdir(dd):
+                        Changes[Relative(self.Root,os.path.join(dd,f),os.path.isdir(os.path.join(dd,f)))] = Now
+        return None if Lost else Changes
+
+    def Close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher(object):
+    '''
+    Watches the files under Root by comparing their modification times every
+    POLL_INTERVAL seconds.
+    '''
+    Kind = 'polling'
+
+    def __init__(self,Root):
+        self.Root = Root
+        self.Times = self.Scan()
+
+    def Scan(self):
+        Times = {}
+        for d in WatchedDirs(self.Root):
+            for f in os.listdir(d):
+                p = os.path.join(d,f)
+                try:
+                    st = os.stat(p)
+                except OSError:
+                    continue
+                Times[Relative(self.Root,p,os.path.isdir(p))] = (st.st_mtime,st.st_size)
+        return Times
+
+    def Read(self,Timeout):
+        Start = time.time()
+        while True:
+            Times = self.Scan()
+            Changed = [p for p in set(Times.keys()).union(self.Times.keys()) if Times.get(p) != self.Times.get(p)]
+            self.Times = Times
+            if len(Changed) > 0 or (Timeout is not None and time.time() - Start >= Timeout):
+                Now = time.time()
+                return dict([(p,Now) for p in Changed])
+            time.sleep(POLL_INTERVAL if Timeout is None else min(POLL_INTERVAL,max(Timeout - (time.time() - Start),0)))
+
+    def Close(self):
+        pass
@@ -0,0 +1,363 @@
+'''
+Warm worker processes for calling operations during automatic updates.
+
+Calling an operation with a fresh "python -c" interpreter means re-importing
+starflow.production (which builds a DataEnvironmentManager, loads the registry
+and installs the i/o override), numpy and the operation's module before any
+work gets done.  For short operations this startup dominates the run.
+
+A warm worker is a long-lived process, forked once, that has done all of this
+already.  It receives operation scripts (as made by update.GetOpScript) over a
+pipe and runs each one in a child forked from itself, so every operation still
+gets its own process -- with the same stdout capture, output pickling and
+i/o protection as the cold path -- but none of the startup cost.   Operation
+modules are imported into the worker the first time they're called, so later
+calls to the same module start warm too.
+
+A worker is recycled after WORKER_MAX_OPS operations, or as soon as the source
+of any data environment module it has imported changes on disk.
+
+Operations are run with the thread count variables they're given (see
+starflow.budget.ApplyThreadEnv), which are put into effect in the child.
+
+Fast operations (see update.FAST_OPS_IN_PROCESS), which usually just write a
+small generated module, can be run in the worker itself instead of a child
+(see RunInWorker), saving the fork as well.   They get the same stdout
+capture, output pickling and i/o protection -- the i/o checks stop at the
+script's own top-level frame either way -- but not their thread count
+variables, and an operation that takes the worker down with it counts as
+failed rather than being tried again.
+
+An operation can be given a timeout (see planning.GetTimeLimits).   An
+operation run in a child of the worker (or, on the cold path, in an
+interpreter of its own, see RunCommand) is then put in a process group of its
+own, and the group is stopped -- SIGTERM, then SIGKILL after KILL_GRACE
+seconds -- once the timeout passes.   One run in the worker itself is
+interrupted by a timer signal instead.   Either way, its exit status is
+TIMEOUT_STATUS.
+'''
+
+import os
+import sys
+import time
+import signal
+import traceback
+import subprocess
+import multiprocessing
+from distutils.spawn import find_executable
+
+import starflow.de as de
+import starflow.locking as locking
+import starflow.budget as budget
+
+DE_MANAGER = de.DataEnvironmentManager()
+WORKER_MAX_OPS = DE_MANAGER.worker_max_ops
+WORKER_PRELOAD = [m.strip() for m in DE_MANAGER.worker_preload.split(',') if m.strip()]
+
+TIMEOUT_STATUS = 124 << 8      # exit status (in the format of os.system) of an operation stopped at its timeout, as timeout(1) gives
+KILL_GRACE = 5                  # seconds an operation stopped at its timeout is given to exit before it is killed
+MAX_WAIT_POLL = .1              # longest time, in seconds, between checks on an operation that has a timeout
+
+WORKER = None       #the warm worker owned by this process, if any
+
+
+def UseWarmWorkers(PathToPython):
+    '''
+    Warm workers are forks of the running interpreter, so they're only used
+    when the configured python executable is the interpreter that's running.
+    '''
+    if WORKER_MAX_OPS <= 0:
+        return False
+    Executable = find_executable(PathToPython) if os.sep not in PathToPython else PathToPython
+    return Executable is not None and os.path.realpath(Executable) == os.path.realpath(sys.executable)
+
+
+def RunOp(OpScript,ModuleName,Env = None,Fork = True,Timeout = None):
+    '''
+    Runs an operation script in this process's warm worker, with the thread
+    count variables in Env, starting (or restarting) the worker as needed.
+    If not Fork, the script is run in the worker itself (see RunInWorker).
+    It is stopped if it runs longer than Timeout seconds.
+
+    Returns the exit status of the operation in the same format as os.system,
+    or None if no worker could be kept alive to run it.
+    '''
+    global WORKER
+    if WORKER is None or WORKER.Owner != os.getpid():
+        WORKER = WarmWorker()
+    return WORKER.Run(OpScript,ModuleName,Env,Fork = Fork,Timeout = Timeout)
+
+
+class WarmWorker(object):
+    '''
+    Handle on a warm worker process, held by the process that started it.
+    '''
+    def __init__(self,MaxOps = None,Preload = None):
+        self.MaxOps = WORKER_MAX_OPS if MaxOps is None else MaxOps
+        self.Preload = WORKER_PRELOAD if Preload is None else Preload
+        self.Owner = os.getpid()
+        self.Start()
+
+    def Start(self):
+        self.Count = 0
+        [self.Conn,WorkerConn] = multiprocessing.Pipe()
+        sys.stdout.flush() ; sys.stderr.flush()
+        self.Pid = os.fork()
+        if self.Pid == 0:
+            self.Conn.close()
+            try:
+                Serve(WorkerConn,self.Preload)
+            finally:
+                os._exit(0)
+        WorkerConn.close()
+
+    def Stop(self):
+        try:
+            self.Conn.send(None)
+        except (IOError,EOFError):
+            pass
+        self.Conn.close()
+        os.waitpid(self.Pid,0)
+
+    def Run(self,OpScript,ModuleName,Env = None,Fork = True,Timeout = None,Attempts = 2):
+        if self.Count >= self.MaxOps:
+            self.Restart()
+        for a in range(Attempts):
+            try:
+                self.Conn.send((OpScript,ModuleName,Env,Fork,Timeout))
+                Status = self.Conn.recv()
+            except (IOError,EOFError):
+                #worker died -- if it was running the operation itself, the operation took it down
+                Status = None if Fork else 1 << 8
+                if not Fork:
+                    self.Restart()
+            if Status is not None:
+                self.Count += 1
+                return Status
+            #worker is stale or gone -- start a new one and try again
+            self.Restart()
+
+    def Restart(self):
+        self.Stop()
+        self.Start()
+
+
+def Serve(Conn,Preload):
+    '''
+    Main loop of a warm worker process.  Replies to each operation request with
+    the operation's exit status, or with None (and exits) if a module it has
+    imported has changed since.
+    '''
+    sys.stdout = sys.__stdout__
+    sys.stderr = sys.__stderr__
+    locking.ForgetInheritedLocks()
+    WarmUp(Preload)
+    Baseline = set(sys.modules.keys())
+    Loaded = {}
+
+    while True:
+        try:
+            Request = Conn.recv()
+        except (IOError,EOFError):
+            break
+        if Request is None:
+            break
+        [OpScript,ModuleName,Env,Fork,Timeout] = Request
+        if IsStale(Loaded):
+            Conn.send(None)
+            break
+        if ModuleName not in sys.modules:
+            PreImport(ModuleName)
+            Loaded.update(GetModuleTimes(set(sys.modules.keys()).difference(Baseline)))
+        Conn.send(RunForked(OpScript,Env,Timeout) if Fork else RunInWorker(OpScript,Timeout))
+
+    Conn.close()
+
+
+def WarmUp(Preload):
+    '''
+    Puts the worker in the state a fresh production interpreter would be in,
+    and imports the preload modules.
+    '''
+    import starflow.production
+    if starflow.production.WORKING_DE.system_mode != 'PRODUCTION':
+        reload(starflow.production)
+    for m in Preload:
+        try:
+            __import__(m)
+        except:
+            print 'Warm worker could not preload', m
+
+
+def PreImport(ModuleName):
+    '''
+    Imports an operation module into the worker.  This is done in a fresh
+    top-level namespace so that the import is subject to exactly the i/o
+    protections it would get in the operation's own process (failures are
+    left for the operation's process to report).
+    '''
+    try:
+        exec 'import ' + ModuleName in {'__name__':'__warmup__'}
+    except:
+        pass
+
+
+def RunForked(OpScript,Env = None,Timeout = None):
+    '''
+    Runs OpScript in a child of the worker, with the thread count variables in
+    Env, and returns its exit status (see WaitForOp).
+    '''
+    sys.stdout.flush() ; sys.stderr.flush()
+    pid = os.fork()
+    if pid == 0:
+        Status = 0
+        try:
+            if Timeout is not None:
+                os.setpgid(0,0)
+            if Env:
+                budget.ApplyThreadEnv(Env)
+            exec OpScript in {'__name__':'__main__'}
+        except SystemExit, e:
+            Status = 0 if e.code is None else (e.code if isinstance(e.code,int) else 1)
+        except:
+            traceback.print_exc()
+            Status = 1
+        try:
+            sys.stdout.flush() ; sys.stderr.flush()
+            sys.__stdout__.flush() ; sys.__stderr__.flush()
+        finally:
+            os._exit(Status)
+    return WaitForOp(pid,Timeout)
+
+
+def RunCommand(CommandLine,Timeout = None):
+    '''
+    Runs an operation's command line in a shell, as os.system does, and
+    returns its exit status (see WaitForOp).
+    '''
+    if Timeout is None:
+        return os.system(CommandLine)
+    sys.stdout.flush() ; sys.stderr.flush()
+    return WaitForOp(subprocess.Popen(CommandLine,shell = True,preexec_fn = os.setpgrp).pid,Timeout)
+
+
+def WaitForOp(pid,Timeout = None):
+    '''
+    Waits for the operation process pid to end and returns its exit status,
+    or, if it runs longer than Timeout seconds, stops its process group (of
+    which it must be the leader) and returns TIMEOUT_STATUS.
+    '''
+    if Timeout is None:
+        return os.waitpid(pid,0)[1]
+    Deadline = time.time() + Timeout
+    Poll = .001
+    try:
+        while True:
+            (p,Status) = os.waitpid(pid,os.WNOHANG)
+            if p == pid:
+                return Status
+            if time.time() >= Deadline:
+                break
+            time.sleep(min(Poll,max(Deadline - time.time(),0)))
+            Poll = min(2 * Poll,MAX_WAIT_POLL)
+    except:
+        #the operation's group doesn't get the interrupts of the terminal, so it goes down with the worker
+        StopGroup(pid)
+        raise
+    print '\nStopping the operation:  it has run past its timeout of', Timeout, 'seconds.'
+    StopGroup(pid)
+    return TIMEOUT_STATUS
+
+
+def StopGroup(pid):
+    '''
+    Stops the process group whose leader is pid, a child of this process:
+    SIGTERM, then, if the leader hasn't ended after KILL_GRACE seconds,
+    SIGKILL.
+    '''
+    for Signal in [signal.SIGTERM,signal.SIGKILL]:
+        try:
+            os.killpg(pid,Signal)
+        except OSError:
+            pass
+        Deadline = time.time() + KILL_GRACE
+        while True:
+            try:
+                if os.waitpid(pid,os.WNOHANG)[0] == pid:
+                    return
+            except OSError:
+                return
+            if Signal == signal.SIGKILL or time.time() >= Deadline:
+                break
+            time.sleep(MAX_WAIT_POLL)
+    try:
+        os.waitpid(pid,0)
+    except OSError:
+        pass
+
+
+class OpTimeout(Exception):
+    pass
+
+
+def RunInWorker(OpScript,Timeout = None):
+    '''
+    Runs OpScript in the worker itself, and returns its exit status in the
+    format of RunForked.   The streams and working directory the script
+    changes are put back afterwards.
+    '''
+    Streams = (sys.stdout,sys.stderr)
+    Cwd = os.getcwd()
+    Status = 0
+    Fired = []
+    if Timeout is not None:
+        def Alarm(Signal,Frame):
+            Fired.append(True)
+            raise OpTimeout()
+        Handler = signal.signal(signal.SIGALRM,Alarm)
+        signal.setitimer(signal.ITIMER_REAL,Timeout)
+    try:
+        exec OpScript in {'__name__':'__main__'}
+    except SystemExit, e:
+        Status = 0 if e.code is None else (e.code if isinstance(e.code,int) else 1)
+    except:
+        traceback.print_exc()
+        Status = 1
+    finally:
+        if Timeout is not None:
+            signal.setitimer(signal.ITIMER_REAL,0)
+            signal.signal(signal.SIGALRM,Handler)
+        if Fired:
+            #whatever the script made of the interruption
+            print '\nStopped the operation:  it ran past its timeout of', Timeout, 'seconds.'
+            Status = TIMEOUT_STATUS >> 8
+        for s in set([sys.stdout,sys.stderr]).difference(Streams):
+            #the op log capture of the script (see update.GetOpScript)
+            s.close()
+        (sys.stdout,sys.stderr) = Streams
+        sys.stdout.flush() ; sys.stderr.flush()
+        os.chdir(Cwd)
+    return (Status & 0xff) << 8
+
+
+def GetModuleTimes(ModuleNames):
+    '''
+    Source modification times of the given modules that live in the data
+    environment.
+    '''
+    Root = os.path.realpath(DE_MANAGER.working_de.root_dir)
+    Times = {}
+    for m in ModuleNames:
+        f = getattr(sys.modules.get(m),'__file__',None)
+        if f:
+            f = os.path.realpath(f[:-1] if f.endswith(('.pyc','.pyo')) else f)
+            if f.startswith(Root + os.sep) and os.path.exists(f):
+                Times[f] = os.path.getmtime(f)
+    return Times
+
+
+def IsStale(Loaded):
+    for f in Loaded.keys():
+        if not os.path.exists(f) or os.path.getmtime(f) != Loaded[f]:
+            return True
+    return False